@@ -0,0 +1,299 @@
+"""
+README:
+Benchmarks for the MOPEX tools.
+startup - time for the GUI to come up in a fresh interpreter, measured as the import time of initil plus, when a display
+          is available, the time until the main window has been drawn. Fails when it exceeds the startup target or
+          when the pandas stack is loaded before a stage is run.
+pipeline - generates a seeded synthetic cohort (see Synthetic_Data.py) and runs HOD_Rank_Compiler, Remove_MOs and
+           Match_Algo on it, collecting the time and peak traced memory of every stage from the scripts' run profiles,
+           and reports how many round 1 choices and HOD ranking entries were pruned as not mutually acceptable.
+           Fails when the match verification finds a blocking pair, capacity, license or invalid match problem.
+           With --match-workers the matching rounds are sharded (see Match_Shards.py) and the speedup of each round is
+           reported, --clusters splits the cohort into specialty clusters so the rounds have independent groups.
+           With --record-events the matching rounds' event log is written as well (see Match_Events.py).
+events - times round 1 deferred acceptance of a synthetic cohort without and with an event recorder, best of the
+         repeats, and reports the cost per recorded event. The cost of the recorder hooks with recording off shows in
+         the pipeline's 'Matching round 1' stage when compared with a baseline.
+Results can be saved as a baseline JSON and later runs compared against it, failing when a stage is slower than the
+baseline by more than the tolerance.
+Usage:
+    python Benchmark.py startup --startup-target 1.0
+    python Benchmark.py pipeline --scale medium --save-baseline baseline.json
+    python Benchmark.py pipeline --scale medium --baseline baseline.json
+    python Benchmark.py pipeline --scale medium --clusters 20 --match-workers 4
+    python Benchmark.py events --scale medium
+"""
+
+# import necessary libraries
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Seconds from interpreter start until the GUI window is up
+startup_target_seconds = 1.0
+
+# Heavy libraries that must not be loaded until a pipeline stage runs
+deferred_modules = ['pandas', 'numpy', 'openpyxl']
+
+# Runs in a fresh interpreter so that nothing is already imported
+startup_probe = '''
+import json, sys, time
+start = time.perf_counter()
+import initil
+import_seconds = time.perf_counter() - start
+window_seconds = None
+try:
+    root = initil.tk.Tk()
+except initil.tk.TclError:
+    root = None
+if root is not None:
+    app = initil.Application(master=root)
+    root.update()
+    window_seconds = time.perf_counter() - start
+    root.destroy()
+print(json.dumps({'import_seconds': import_seconds, 'window_seconds': window_seconds,
+                  'loaded_modules': [name for name in %r if name in sys.modules]}))
+'''
+
+def benchmark_startup(target_seconds=startup_target_seconds, repeats=5):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    probe = startup_probe % (deferred_modules,)
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', probe], cwd=script_dir, capture_output=True, text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    # Best of the repeats, so the first run's cold disk cache does not dominate
+    import_seconds = min(run['import_seconds'] for run in runs)
+    window_runs = [run['window_seconds'] for run in runs if run['window_seconds'] is not None]
+    window_seconds = min(window_runs) if window_runs else None
+    loaded_modules = sorted(set(name for run in runs for name in run['loaded_modules']))
+    startup_seconds = window_seconds if window_seconds is not None else import_seconds
+
+    return {
+        'import_seconds': round(import_seconds, 4),
+        'window_seconds': round(window_seconds, 4) if window_seconds is not None else None,
+        'target_seconds': target_seconds,
+        'loaded_modules': loaded_modules,
+        'passed': startup_seconds <= target_seconds and not loaded_modules,
+    }
+
+def print_startup_results(results):
+    print(f"initil import: {results['import_seconds']:.3f}s")
+    if results['window_seconds'] is None:
+        print("Window: no display available, timed the import only")
+    else:
+        print(f"Window drawn: {results['window_seconds']:.3f}s")
+    if results['loaded_modules']:
+        print(f"Loaded at startup: {', '.join(results['loaded_modules'])}")
+    print(f"Target: {results['target_seconds']:.3f}s - {'PASS' if results['passed'] else 'FAIL'}")
+
+# Run the whole pipeline on a synthetic cohort, timing each reported stage
+def benchmark_pipeline(scale='small', n_officers=None, n_postings=None, min_choices=3, max_choices=10, seed=0, output_formats=('excel',), trace_memory=True,
+                       clusters=1, match_workers=1, record_events=False):
+    import Synthetic_Data
+    import Excel_Cache
+    import HOD_Rank_Compiler
+    import Remove_MOs
+    import Match_Algo
+    import Match_Events
+    import Match_Shards
+    import Ranking_Store
+    import Run_Profile
+
+    size = dict(Synthetic_Data.scales[scale])
+    if n_officers:
+        size['n_officers'] = n_officers
+    if n_postings:
+        size['n_postings'] = n_postings
+
+    with tempfile.TemporaryDirectory() as directory:
+        started_at = time.perf_counter()
+        paths = Synthetic_Data.generate_cohort(directory, min_choices=min_choices, max_choices=max_choices, seed=seed, specialty_clusters=clusters, **size)
+        generate_seconds = time.perf_counter() - started_at
+
+        # Every run parses the Excel files, so results do not depend on the state of the cache
+        # Tracing allocations slows the stages down, so timings are only comparable between runs in the same mode
+        cache_enabled = Excel_Cache.settings['enabled']
+        profile_settings = dict(Run_Profile.settings)
+        shard_settings = dict(Match_Shards.settings)
+        event_settings = dict(Match_Events.settings)
+        Excel_Cache.configure(enabled=False)
+        Run_Profile.configure(trace_memory=trace_memory)
+        Match_Shards.configure(workers=match_workers)
+        Match_Events.configure(enabled=record_events)
+        try:
+            HOD_Rank_Compiler.main(paths['raw_dir'], paths['hod_rankings'], paths['staff_list'])
+            updated_mo_rankings = Remove_MOs.main(paths['mo_rankings'], paths['removed_mos'])
+            store_path = os.path.join(directory, Ranking_Store.store_file_name)
+            output_folder_path = Match_Algo.main(store_path, updated_mo_rankings, paths['gdfm'], output_formats)
+        finally:
+            Excel_Cache.configure(enabled=cache_enabled)
+            Run_Profile.configure(**profile_settings)
+            Match_Shards.configure(**shard_settings)
+            Match_Events.configure(**event_settings)
+
+        # Collect the stage measurements from the profiles the scripts wrote
+        stages = {}
+        for profile_dir, script_name in ((directory, 'HOD_Rank_Compiler'), (directory, 'Remove_MOs'), (output_folder_path, 'Match_Algo')):
+            with open(os.path.join(profile_dir, f'{script_name} profile.json')) as f:
+                for stage in json.load(f)['stages']:
+                    stages[f"{script_name}: {stage['stage']}"] = {'seconds': stage['wall_seconds'], 'peak_mb': stage['traced_peak_mb'], 'rows': stage['rows']}
+
+    return {
+        'cohort': dict(size, min_choices=min_choices, max_choices=max_choices, seed=seed, clusters=clusters),
+        'match_workers': match_workers,
+        'record_events': record_events,
+        'trace_memory': trace_memory,
+        'generate_seconds': round(generate_seconds, 4),
+        'total_seconds': round(sum(stage['seconds'] for stage in stages.values()), 4),
+        'stages': stages,
+        'pruning': stages['Match_Algo: Pruning preference lists']['rows'],
+        'verification': stages['Match_Algo: Verifying matches']['rows'],
+        'sharding': {round_name: stages[f'Match_Algo: Matching {round_name.lower()}']['rows'] for round_name in ('Round 1', 'Round 2')
+                     if 'speedup_percent' in stages[f'Match_Algo: Matching {round_name.lower()}']['rows']},
+    }
+
+def print_pipeline_results(results):
+    cohort = results['cohort']
+    print(f"Cohort: {cohort['n_officers']} officers, {cohort['n_postings']} postings, "
+          f"{cohort['min_choices']}-{cohort['max_choices']} choices, {cohort['clusters']} clusters, seed {cohort['seed']} (generated in {results['generate_seconds']:.1f}s)")
+    for stage, measurement in results['stages'].items():
+        peak = f"{measurement['peak_mb']:9.1f} MB" if measurement['peak_mb'] is not None else ''
+        print(f"  {stage:<60} {measurement['seconds']:9.3f}s {peak}")
+    print(f"  {'Total':<60} {results['total_seconds']:9.3f}s")
+    pruning = results['pruning']
+    print(f"Round 1 pruning: {pruning['pruned_choices']} of {pruning['listed_choices']} choices and "
+          f"{pruning['pruned_ranking_entries']} of {pruning['ranking_entries']} HOD ranking entries not mutually acceptable")
+    for round_name, sharding in results['sharding'].items():
+        print(f"{round_name}: {sharding['components']} components in {sharding['shards']} shards on {results['match_workers']} workers, "
+              f"{sharding['sharded_ms']} ms for {sharding['shard_matching_ms']} ms of matching ({sharding['speedup_percent'] / 100:.2f}x)")
+    if results['record_events']:
+        print(f"Event log: {results['stages']['Match_Algo: Writing outputs']['rows'].get('events', 0)} events recorded")
+    problems = {check: count for check, count in results['verification'].items() if count}
+    print("Match verification: " + (", ".join(f"{count} {check}" for check, count in problems.items()) if problems else "no problems"))
+
+# Time round 1 deferred acceptance of a synthetic cohort without and with an event recorder
+def benchmark_events(scale='small', n_officers=None, n_postings=None, min_choices=3, max_choices=10, seed=0, clusters=1, repeats=5):
+    import contextlib
+    import io
+    import Synthetic_Data
+    import Excel_Cache
+    import Match_Engine
+    import Match_Events
+    import Pipeline
+
+    size = dict(Synthetic_Data.scales[scale])
+    if n_officers:
+        size['n_officers'] = n_officers
+    if n_postings:
+        size['n_postings'] = n_postings
+
+    # Compile the round 1 market of the cohort once, as the pipeline does without writing intermediate files
+    with tempfile.TemporaryDirectory() as directory:
+        paths = Synthetic_Data.generate_cohort(directory, min_choices=min_choices, max_choices=max_choices, seed=seed, specialty_clusters=clusters, **size)
+        cache_enabled = Excel_Cache.settings['enabled']
+        Excel_Cache.configure(enabled=False)
+        try:
+            pipeline = Pipeline.Pipeline(paths['raw_dir'], paths['hod_rankings'], paths['staff_list'], paths['mo_rankings'], paths['removed_mos'], paths['gdfm'])
+            with contextlib.redirect_stdout(io.StringIO()):
+                officer_choices = pipeline.update_officer_rankings()
+                hod_rankings, rankings = pipeline.compile_hod_rankings()
+        finally:
+            Excel_Cache.configure(enabled=cache_enabled)
+    choice_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
+    market = Match_Engine.compile_round_1(hod_rankings[hod_rankings['Vacancies'] > 0], rankings, officer_choices, choice_columns)
+
+    def best_seconds(make_recorder):
+        timings = []
+        for _ in range(repeats):
+            recorder = make_recorder()
+            started_at = time.perf_counter()
+            Match_Engine.run_deferred_acceptance(market, recorder)
+            timings.append(time.perf_counter() - started_at)
+        return min(timings), recorder
+
+    disabled_seconds, _ = best_seconds(lambda: None)
+    enabled_seconds, recorder = best_seconds(Match_Events.EventRecorder)
+    return {
+        'cohort': dict(size, min_choices=min_choices, max_choices=max_choices, seed=seed, clusters=clusters),
+        'events': len(recorder),
+        'disabled_seconds': round(disabled_seconds, 4),
+        'enabled_seconds': round(enabled_seconds, 4),
+        'ns_per_event': round((enabled_seconds - disabled_seconds) / max(len(recorder), 1) * 1e9),
+    }
+
+def print_events_results(results):
+    cohort = results['cohort']
+    print(f"Cohort: {cohort['n_officers']} officers, {cohort['n_postings']} postings, {cohort['clusters']} clusters, seed {cohort['seed']}")
+    print(f"Round 1 without recorder: {results['disabled_seconds']:.3f}s")
+    print(f"Round 1 with recorder:    {results['enabled_seconds']:.3f}s ({results['events']} events, {results['ns_per_event']} ns per event)")
+
+# Stages slower than the baseline by more than the tolerance, ignoring differences below min_seconds
+def compare_with_baseline(results, baseline, tolerance=0.25, min_seconds=0.05):
+    if results['cohort'] != baseline['cohort']:
+        print(f"Warning: the baseline was recorded on a different cohort {baseline['cohort']}")
+    if results['trace_memory'] != baseline.get('trace_memory', True):
+        print("Warning: the baseline was recorded with memory tracing " + ("on" if baseline.get('trace_memory', True) else "off"))
+    regressions = []
+    for stage, measurement in results['stages'].items():
+        if stage not in baseline['stages']:
+            print(f"  {stage}: not in baseline")
+            continue
+        baseline_seconds = baseline['stages'][stage]['seconds']
+        change = measurement['seconds'] - baseline_seconds
+        print(f"  {stage:<60} {baseline_seconds:9.3f}s -> {measurement['seconds']:9.3f}s ({change:+.3f}s)")
+        if change > max(baseline_seconds * tolerance, min_seconds):
+            regressions.append(stage)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the MOPEX tools.")
+    parser.add_argument('benchmark', choices=['startup', 'pipeline', 'events'], help="Benchmark to run")
+    parser.add_argument('--startup-target', type=float, default=startup_target_seconds, help="Maximum GUI startup time in seconds")
+    parser.add_argument('--repeats', type=int, default=5, help="Number of fresh interpreters, or of event benchmark runs, to time")
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small', help="Synthetic cohort size")
+    parser.add_argument('--officers', type=int, help="Number of officers, overrides the scale")
+    parser.add_argument('--postings', type=int, help="Number of postings, overrides the scale")
+    parser.add_argument('--min-choices', type=int, default=3, help="Shortest officer preference list")
+    parser.add_argument('--max-choices', type=int, default=10, help="Longest officer preference list")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the synthetic cohort")
+    parser.add_argument('--clusters', type=int, default=1, help="Number of specialty clusters officers choose within")
+    parser.add_argument('--match-workers', type=int, default=1, help="Number of processes matching independent groups of officers and departments")
+    parser.add_argument('--record-events', action='store_true', help="Record the matching rounds' event log in the pipeline benchmark")
+    parser.add_argument('--no-memory', action='store_true', help="Do not trace peak memory, which slows the stages down")
+    parser.add_argument('--baseline', type=str, help="Baseline JSON to compare the results against")
+    parser.add_argument('--save-baseline', type=str, help="Save the results as a baseline JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown of a stage relative to the baseline")
+    args = parser.parse_args()
+
+    if args.benchmark == 'startup':
+        results = benchmark_startup(args.startup_target, args.repeats)
+        print_startup_results(results)
+        passed = results['passed']
+    elif args.benchmark == 'events':
+        results = benchmark_events(args.scale, args.officers, args.postings, args.min_choices, args.max_choices, args.seed, args.clusters, args.repeats)
+        print_events_results(results)
+        passed = True
+    else:
+        results = benchmark_pipeline(args.scale, args.officers, args.postings, args.min_choices, args.max_choices, args.seed, trace_memory=not args.no_memory,
+                                     clusters=args.clusters, match_workers=args.match_workers, record_events=args.record_events)
+        print_pipeline_results(results)
+        passed = not any(results['verification'].values())
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            print(f"Compared with {args.baseline}:")
+            regressions = compare_with_baseline(results, baseline, args.tolerance)
+            if regressions:
+                print(f"Slower than the baseline: {', '.join(regressions)}")
+            passed = passed and not regressions
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if passed else 1)
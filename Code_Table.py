@@ -0,0 +1,122 @@
+"""
+README:
+Shared lookup table of the Employee IDs and PMS Codes of one matching run.
+Each officer and department gets a dense int32 code once, and the choice grid and the HOD ranking entries of the
+Ranking_Store are encoded to int32 arrays once, so the matching rounds and the verification work on the same integer arrays instead of hashing the strings
+again. Strings are only decoded when the result tables are built.
+Scenario_Runner encodes the base inputs once and derives each scenario's table from that base table.
+As with the dictionaries the matching used before, a later row with the same Employee ID or PMS Code overwrites an
+earlier one.
+"""
+
+# import necessary libraries
+import numpy as np
+import pandas as pd
+
+# Code of a blank cell, or of a value that is not in the table
+missing = -1
+
+class CodeTable:
+    # rankings is the RankingStore of the HOD rankings, None for a table of the choices only
+    def __init__(self, officer_choices, hod_rankings, preference_columns, rankings=None):
+        self.set_ids(officer_choices, hod_rankings, preference_columns)
+
+        # Officer code x choice grid of department codes, choice_values keeps the text of codes not in the table
+        self.choice_values = officer_choices[preference_columns].to_numpy(dtype=object)[self.officer_rows]
+        self.choice_blanks = pd.isna(self.choice_values) | (self.choice_values == '')
+        self.choice_codes = self.encode_departments(self.choice_values)
+        # An officer's list ends at their first blank choice, later choices are ignored
+        n_choices = len(preference_columns)
+        first_blank = np.where(self.choice_blanks.any(axis=1), self.choice_blanks.argmax(axis=1), n_choices)
+        self.choice_listed = np.arange(n_choices) < first_blank[:, None]
+        self.set_rankings(rankings)
+
+    # Codes of the Employee IDs and PMS Codes of the frames, in order of first appearance
+    def set_ids(self, officer_choices, hod_rankings, preference_columns):
+        officer_rows = {officer: row for row, officer in enumerate(officer_choices['Employee ID'].tolist())}
+        department_rows = {department: row for row, department in enumerate(hod_rankings['PMS Code'].tolist())}
+        self.preference_columns = list(preference_columns)
+        self.officer_ids = list(officer_rows)             # officer code -> Employee ID
+        self.department_codes = list(department_rows)     # department code -> PMS Code
+        self.officer_rows = np.fromiter(officer_rows.values(), dtype=np.int64, count=len(officer_rows))
+        self.department_rows = np.fromiter(department_rows.values(), dtype=np.int64, count=len(department_rows))
+        self.officer_index = pd.Index(self.officer_ids, dtype=object)
+        self.department_index = pd.Index(self.department_codes, dtype=object)
+        self.officer_id_values = self.officer_index.to_numpy()
+        self.department_code_values = self.department_index.to_numpy()
+
+    # HOD ranking entries in department code and position order: department code, position and officer code
+    def set_rankings(self, rankings):
+        if rankings is None:
+            departments, positions, employee_ids = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+        else:
+            departments, positions, employee_ids = rankings.select(self.department_code_values)
+        self.ranked_departments = departments.astype(np.int32)
+        self.ranked_positions = positions
+        self.ranked_officers = self.encode_officers(employee_ids)
+
+    # Table of a run on some of this table's officers and departments, e.g. a scenario of Scenario_Runner
+    # officer_choices and hod_rankings hold rows of the frames this table was built from, in the same order, so the
+    # choice grid and the ranking entries are remapped to the new codes instead of being encoded again. Only the
+    # ranking entries of the reranked PMS Codes, which may differ from this table's rankings, are taken from rankings.
+    # Frames that are not such a subset get a table built from scratch
+    def derive(self, officer_choices, hod_rankings, rankings=None, reranked=()):
+        preference_columns = self.preference_columns
+        table = CodeTable.__new__(CodeTable)
+        table.set_ids(officer_choices, hod_rankings, preference_columns)
+        officers = self.encode_officers(table.officer_ids)
+        departments = self.encode_departments(table.department_codes)
+        if (officers < 0).any() or (departments < 0).any() or (np.diff(officers) <= 0).any() or (np.diff(departments) <= 0).any():
+            return CodeTable(officer_choices, hod_rankings, preference_columns, rankings)
+
+        # This table's codes -> the new codes, the extra last entry maps missing codes to missing
+        officer_codes = np.full(len(self.officer_ids) + 1, missing, dtype=np.int32)
+        officer_codes[officers] = np.arange(len(officers))
+        department_codes = np.full(len(self.department_codes) + 1, missing, dtype=np.int32)
+        department_codes[departments] = np.arange(len(departments))
+
+        table.choice_values = self.choice_values[officers]
+        table.choice_blanks = self.choice_blanks[officers]
+        table.choice_codes = department_codes[self.choice_codes[officers]]
+        table.choice_listed = self.choice_listed[officers]
+
+        if rankings is None:
+            table.set_rankings(None)
+            return table
+        # Entries of the departments kept, leaving out the reranked ones, followed by the reranked departments' entries
+        reranked_codes = self.encode_departments(list(reranked))
+        kept = (department_codes[self.ranked_departments] >= 0) & ~np.isin(self.ranked_departments, reranked_codes)
+        reranked_departments = table.encode_departments(list(reranked))
+        reranked_departments = reranked_departments[reranked_departments >= 0]
+        selected, positions, employee_ids = rankings.select(table.department_code_values[reranked_departments])
+        ranked_departments = np.concatenate([department_codes[self.ranked_departments[kept]], reranked_departments[selected]])
+        ranked_positions = np.concatenate([self.ranked_positions[kept], positions])
+        ranked_officers = np.concatenate([officer_codes[self.ranked_officers[kept]], table.encode_officers(employee_ids)])
+        order = np.lexsort((ranked_positions, ranked_departments))
+        table.ranked_departments = ranked_departments[order].astype(np.int32)
+        table.ranked_positions = ranked_positions[order]
+        table.ranked_officers = ranked_officers[order].astype(np.int32)
+        return table
+
+    # Codes of an array of Employee IDs or PMS Codes, missing where not in the table
+    def encode_officers(self, values):
+        values = np.asarray(values, dtype=object)
+        return self.officer_index.get_indexer(pd.Index(values.ravel(), dtype=object)).astype(np.int32).reshape(values.shape)
+
+    def encode_departments(self, values):
+        values = np.asarray(values, dtype=object)
+        return self.department_index.get_indexer(pd.Index(values.ravel(), dtype=object)).astype(np.int32).reshape(values.shape)
+
+    # A frame column in officer or department code order, e.g. each officer's name for decoding results
+    def officer_column(self, frame, column):
+        return frame[column].to_numpy(dtype=object)[self.officer_rows]
+
+    def department_column(self, frame, column):
+        return frame[column].to_numpy(dtype=object)[self.department_rows]
+
+    # Employee IDs and PMS Codes of arrays of codes
+    def decode_officers(self, codes):
+        return self.officer_id_values[codes]
+
+    def decode_departments(self, codes):
+        return self.department_code_values[codes]
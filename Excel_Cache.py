@@ -0,0 +1,135 @@
+"""
+README:
+Shared Excel loader with a local columnar cache.
+Each workbook sheet is fingerprinted by content hash, sheet and read options, so a copied or touched but unchanged
+workbook still hits the cache. Writing a workbook gives new contents even for the same data (the file records when it
+was written), so files a script rewrites on every run are read without the cache, see HOD_Rank_Compiler.
+The parsed frame is stored as Parquet (or a pickle when pyarrow is not installed or the frame does not come back
+from Parquet exactly), so reruns on unchanged inputs skip openpyxl parsing entirely.
+The cache is size-bounded and evicts the least recently used entries first.
+"""
+
+# import necessary libraries
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# Cache settings, changed through configure() or the --no-cache/--clear-cache script flags
+settings = {
+    'enabled': True,
+    'cache_dir': os.environ.get('MOPEX_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.mopex_cache')),
+    'max_bytes': 512 * 1024 * 1024,
+}
+
+def configure(enabled=None, cache_dir=None, max_bytes=None):
+    if enabled is not None:
+        settings['enabled'] = enabled
+    if cache_dir is not None:
+        settings['cache_dir'] = cache_dir
+    if max_bytes is not None:
+        settings['max_bytes'] = max_bytes
+
+# Add the cache flags to a script's argument parser and apply them once parsed
+def add_cache_arguments(parser):
+    parser.add_argument('--no-cache', action='store_true', help="Parse Excel files directly without using the cache")
+    parser.add_argument('--clear-cache', action='store_true', help="Delete all cached Excel data before running")
+
+def apply_cache_arguments(args):
+    if args.clear_cache:
+        clear_cache()
+    configure(enabled=not args.no_cache)
+
+def clear_cache():
+    if os.path.isdir(settings['cache_dir']):
+        shutil.rmtree(settings['cache_dir'])
+
+# Hash of the workbook contents, read in chunks
+def file_content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Cache key of one sheet: content hash plus everything that changes the parsed result
+def sheet_fingerprint(content_hash, sheet_name, read_options):
+    fingerprint = {
+        'content': content_hash,
+        'sheet': sheet_name,
+        'options': {key: repr(value) for key, value in sorted(read_options.items())},
+        'pandas': pd.__version__,
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+# Parquet returns the missing values of object columns as None, they are put back as the NaN read_excel gives
+def read_parquet_frame(cache_path):
+    frame = pd.read_parquet(cache_path)
+    for col in frame.columns[(frame.dtypes == object).to_numpy()]:
+        frame[col] = frame[col].where(frame[col].notna(), np.nan)
+    return frame
+
+def load_cached_frame(key):
+    for extension, reader in (('.parquet', read_parquet_frame), ('.pkl', pd.read_pickle)):
+        cache_path = os.path.join(settings['cache_dir'], key + extension)
+        if os.path.exists(cache_path):
+            try:
+                frame = reader(cache_path)
+            except Exception:
+                os.remove(cache_path)
+                return None
+            os.utime(cache_path)  # Mark as recently used
+            return frame
+    return None
+
+def store_cached_frame(key, frame):
+    os.makedirs(settings['cache_dir'], exist_ok=True)
+    cache_path = os.path.join(settings['cache_dir'], key + '.parquet')
+    try:
+        frame.to_parquet(cache_path)
+        # Only keep the Parquet copy if it reproduces the parsed frame exactly
+        cached = read_parquet_frame(cache_path)
+        if cached.dtypes.equals(frame.dtypes) and cached.equals(frame):
+            return
+        os.remove(cache_path)
+    except Exception:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+    frame.to_pickle(os.path.join(settings['cache_dir'], key + '.pkl'))
+
+# Remove least recently used entries until the cache fits in max_bytes
+def evict_cache():
+    cache_dir = settings['cache_dir']
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    entries = sorted((os.stat(path).st_mtime_ns, os.stat(path).st_size, path) for path in entries if os.path.isfile(path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total_size <= settings['max_bytes']:
+            break
+        os.remove(path)
+        total_size -= size
+
+# Drop-in replacement for pd.read_excel for a single sheet or a list of sheets
+def read_excel(path, sheet_name=0, **read_options):
+    if not settings['enabled'] or sheet_name is None:
+        return pd.read_excel(path, sheet_name=sheet_name, **read_options)
+
+    sheet_names = sheet_name if isinstance(sheet_name, list) else [sheet_name]
+    content_hash = file_content_hash(path)
+    keys = {sheet: sheet_fingerprint(content_hash, sheet, read_options) for sheet in sheet_names}
+    frames = {sheet: load_cached_frame(key) for sheet, key in keys.items()}
+
+    # Parse all missing sheets in one pass over the workbook
+    missing = [sheet for sheet, frame in frames.items() if frame is None]
+    if missing:
+        parsed = pd.read_excel(path, sheet_name=missing, **read_options)
+        for sheet in missing:
+            frames[sheet] = parsed[sheet]
+            store_cached_frame(keys[sheet], parsed[sheet])
+        evict_cache()
+
+    return frames if isinstance(sheet_name, list) else frames[sheet_name]
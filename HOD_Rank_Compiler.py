@@ -2,49 +2,88 @@
 README:
 This code will compile each department's HOD ranking into a consolidated Excel file for matching.
 It assumes that all raw data files are located within the same folder and are labelled correctly based on PMS Code.
+The rankings are also saved as a sparse 'HOD Rankings Store.xlsx' (see Ranking_Store.py) next to the consolidated
+file, which Match_Algo loads without reading the padded Match columns.
 """
 
 # import necessary libraries
 import pandas as pd
+import numpy as np
 import os
 import argparse
+import json
+from copy import copy
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+import Excel_Cache
+import Ranking_Store
+import Run_Profile
 
 # Load the MOPEX 25 Staff List and create MCR to Employee ID mapping
 def load_mcr_to_employee_mapping(staff_list_path):
-    staff_list = pd.read_excel(staff_list_path)
+    staff_list = Excel_Cache.read_excel(staff_list_path)
     mcr_to_employee_id = dict(zip(staff_list['MCR No.'], staff_list['Employee ID']))
     return mcr_to_employee_id
 
 # Load and map MCR/DCR to Employee ID in raw data files
-def load_and_map_data(file_path, mcr_to_employee_id):
-    data = pd.read_excel(file_path)
+# Files that are written back get new workbook contents every run, so they are read without the cache, where their
+# entries would never be hit again
+def load_and_map_data(file_path, mcr_to_employee_id, cached=True):
+    data = Excel_Cache.read_excel(file_path) if cached else pd.read_excel(file_path)
     
     # Map MCR/DCR Number to Employee ID if the column exists
     if 'MCR/DCR Number' in data.columns:
         data['Employee ID'] = data['MCR/DCR Number'].map(mcr_to_employee_id)
     return data
 
-# Process multiple raw data files based on PMS codes and maps MCR to employee ID
-def process_raw_data_files(pms_codes, raw_data_directory, mcr_to_employee_id):
-    processed_data = {}
-    
+# Read, map, sort and (unless write_back is False) write back one department's raw data file, returning its ranked Employee IDs
+def process_department_file(pms_code, raw_data_directory, mcr_to_employee_id, write_back=True):
+    filename = os.path.join(raw_data_directory, f"{pms_code}.xlsx")
+    dept_df = load_and_map_data(filename, mcr_to_employee_id, cached=not write_back)
+    return sort_department_rankings(dept_df, filename if write_back else None)
+
+# Worker process state, set once per worker so the mapping is not sent with every department
+worker_state = {}
+
+def init_worker(raw_data_directory, mcr_to_employee_id, cache_settings, write_back=True):
+    worker_state['raw_data_directory'] = raw_data_directory
+    worker_state['mcr_to_employee_id'] = mcr_to_employee_id
+    worker_state['write_back'] = write_back
+    Excel_Cache.configure(**cache_settings)
+
+def process_department_file_in_worker(pms_code):
+    return process_department_file(pms_code, worker_state['raw_data_directory'], worker_state['mcr_to_employee_id'], worker_state['write_back'])
+
+# Check which PMS Codes have a raw data file, reporting missing files in PMS Code order
+def find_department_files(pms_codes, raw_data_directory):
+    found_pms_codes = []
     for pms_code in pms_codes:
-        file_name = f"{pms_code}.xlsx"
-        file_path = os.path.join(raw_data_directory, file_name)
-        
-        if os.path.exists(file_path):
-            processed_data[pms_code] = load_and_map_data(file_path, mcr_to_employee_id)
+        if os.path.exists(os.path.join(raw_data_directory, f"{pms_code}.xlsx")):
+            found_pms_codes.append(pms_code)
         else:
             print(f"File not found for PMS Code: {pms_code}")
-    
-    return processed_data
+    return found_pms_codes
+
+# Process department files, concurrently in a process pool when more than one worker is requested
+def process_department_files(pms_codes, raw_data_directory, mcr_to_employee_id, workers=1, write_back=True):
+    if workers > 1 and len(pms_codes) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(raw_data_directory, mcr_to_employee_id, dict(Excel_Cache.settings), write_back)) as executor:
+            rankings = list(executor.map(process_department_file_in_worker, pms_codes))
+    else:
+        rankings = [process_department_file(pms_code, raw_data_directory, mcr_to_employee_id, write_back) for pms_code in pms_codes]
+    return dict(zip(pms_codes, rankings))
+
+# Process multiple raw data files based on PMS codes, returning each department's ranked Employee IDs
+def process_raw_data_files(pms_codes, raw_data_directory, mcr_to_employee_id, workers=1, write_back=True):
+    found_pms_codes = find_department_files(pms_codes, raw_data_directory)
+    return process_department_files(found_pms_codes, raw_data_directory, mcr_to_employee_id, workers, write_back)
 
 # Load the consolidated HOD Rankings
 def load_consolidated_hod_rankings(hod_rankings_path):
-    return pd.read_excel(hod_rankings_path)
+    return Excel_Cache.read_excel(hod_rankings_path)
 
-# Process department rankings, sort by HOD and MO rankings, and update the consolidated file
-def process_and_update_rankings(dept_df, consolidated_df, index, filename):
+# Sort department rankings by HOD and MO rankings, save them back (when a filename is given) and return the ranked Employee IDs
+def sort_department_rankings(dept_df, filename):
     # Convert 'HOD Ranking' and 'MO Ranking' to numeric, non-numeric values will be NaN
     dept_df['HOD Ranking'] = pd.to_numeric(dept_df['HOD Ranking'], errors='coerce')
     dept_df['MO Ranking'] = pd.to_numeric(dept_df['MO Ranking'], errors='coerce')
@@ -53,82 +92,266 @@ def process_and_update_rankings(dept_df, consolidated_df, index, filename):
     dept_df = dept_df.sort_values(by=['HOD Ranking', 'MO Ranking', 'Employee ID'], na_position='last')
 
     # Save the sorted data back to the department's file
-    dept_df.to_excel(filename, index=False)
+    if filename is not None:
+        dept_df.to_excel(filename, index=False)
 
     # Filter the DataFrame to include only rows with numerical 'HOD Ranking'
     filtered_dept_df = dept_df.dropna(subset=['HOD Ranking'])
 
-    # Copy the 'Employee ID' from the filtered DataFrame and transpose it
-    employee_ids = filtered_dept_df['Employee ID'].tolist()
+    # Copy the 'Employee ID' from the filtered DataFrame
+    return filtered_dept_df['Employee ID'].tolist()
+
+# Consolidated rankings with the Match 1..N columns of all departments written in one step
+def build_consolidated_rankings(consolidated_df, department_rankings):
+    # Long (PMS Code, Employee ID) frame of every department's ranked officers, positions assigned by cumcount
+    long_df = pd.DataFrame({
+        'PMS Code': [pms_code for pms_code, employee_ids in department_rankings.items() for _ in employee_ids],
+        'Employee ID': pd.Series([employee_id for employee_ids in department_rankings.values() for employee_id in employee_ids], dtype=object),
+    })
+    long_df['Position'] = long_df.groupby('PMS Code', sort=False).cumcount()
+
+    # Rows of the consolidated file for each PMS Code, repeated PMS Codes all receive the department ranking
+    consolidated_rows = pd.DataFrame({'PMS Code': consolidated_df['PMS Code'].values, 'Row': range(len(consolidated_df))})
+    long_df = long_df.merge(consolidated_rows, on='PMS Code')
+    if long_df.empty:
+        return consolidated_df
+
+    # Pivot to the Match i layout in a single allocation, keeping the existing Match cells no ranking is written over
+    n_positions = long_df['Position'].max() + 1
+    match_columns = [f'Match {i+1}' for i in range(n_positions)]
+    existing_columns = [col for col in match_columns if col in consolidated_df.columns]
+    values = np.full((len(consolidated_df), n_positions), np.nan, dtype=object)
+    values[:, [match_columns.index(col) for col in existing_columns]] = consolidated_df[existing_columns].to_numpy(dtype=object)
+    values[long_df['Row'].values, long_df['Position'].values] = long_df['Employee ID'].values
 
-    # Create a dictionary with column keys and corresponding Employee IDs
-    match_columns = {f'Match {i+1}': employee_id for i, employee_id in enumerate(employee_ids)}
+    # Join the Match block to the other columns once, missing Match columns are added after the existing ones
+    block = pd.DataFrame(values, index=consolidated_df.index, columns=match_columns).infer_objects()
+    columns = list(consolidated_df.columns) + [col for col in match_columns if col not in existing_columns]
+    return pd.concat([consolidated_df.drop(columns=existing_columns), block], axis=1)[columns]
 
-    # Add the new columns to the consolidated DataFrame
-    consolidated_df.loc[index, match_columns.keys()] = match_columns.values()
+# Ranking store of the compiled rankings, each department's ranking written over the Match cells already in the
+# consolidated rankings as build_consolidated_rankings does, so it has to be built first
+def build_ranking_store(consolidated_df, department_rankings):
+    return Ranking_Store.store_from_wide(consolidated_df).updated(department_rankings)
 
-# Main function to compile rankings and process raw data
-def compile_rankings(consolidated_df, raw_data_directory, mcr_to_employee_id):
+# Gaps in the rankings of a ranking store, in the layout of find_blank_column_errors: a blank or missing position
+# followed by a ranked officer, reported for every consolidated row of the department
+def find_ranking_gaps(consolidated_df, rankings):
+    ranked = pd.notna(rankings.employee_ids)
+    departments = np.repeat(np.arange(len(rankings.pms_codes)), np.diff(rankings.offsets))[ranked]
+    positions = rankings.positions[ranked]
+    previous = np.concatenate([[-1], positions[:-1]])
+    previous[np.concatenate([[True], departments[1:] != departments[:-1]])] = -1
+    gap = positions - previous > 1
+    gaps = pd.DataFrame({'PMS Code': rankings.pms_codes[departments[gap]], 'Position': positions[gap]})
+
+    consolidated_rows = pd.DataFrame({'PMS Code': consolidated_df['PMS Code'].to_numpy(dtype=object), 'Row': consolidated_df.index})
+    gaps = gaps.merge(consolidated_rows, on='PMS Code').sort_values(['Row', 'Position'], kind='stable')
+    return pd.DataFrame({
+        'Row': gaps['Row'].to_numpy(),
+        'PMS Code': gaps['PMS Code'].to_numpy(dtype=object),
+        'Column': [f'Match {position}' for position in gaps['Position'].tolist()],
+        'Position': gaps['Position'].to_numpy(),
+    })
+
+# Main function to compile rankings and process raw data, returning the consolidated rankings and the ranking store
+# With wide the Match columns of the consolidated rankings are filled in as well, for the consolidated file
+def compile_rankings(consolidated_df, raw_data_directory, mcr_to_employee_id, workers=1, write_back=True, wide=True):
     pms_codes = consolidated_df['PMS Code'].unique()
-    processed_data_files = process_raw_data_files(pms_codes, raw_data_directory, mcr_to_employee_id)
-
-    # Iterate over each row in the consolidated HOD rankings
-    for index, row in consolidated_df.iterrows():
-        pms_code = row['PMS Code']
-        
-        # Check if processed data exists for the current PMS code
-        if pms_code in processed_data_files:
-            dept_df = processed_data_files[pms_code]
-            filename = os.path.join(raw_data_directory, f"{pms_code}.xlsx")
-            
-            # Process and update the department rankings
-            process_and_update_rankings(dept_df, consolidated_df, index, filename)
-
-    return consolidated_df
+    department_rankings = process_raw_data_files(pms_codes, raw_data_directory, mcr_to_employee_id, workers, write_back)
+    rankings = build_ranking_store(consolidated_df, department_rankings)
+    if wide:
+        consolidated_df = build_consolidated_rankings(consolidated_df, department_rankings)
+    return consolidated_df, rankings
+
+# Manifest of the last incremental compile, kept next to the raw data files
+manifest_file_name = '.hod_compile_manifest.json'
+
+def load_manifest(raw_data_directory):
+    manifest_path = os.path.join(raw_data_directory, manifest_file_name)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except ValueError:
+        print("Ignoring unreadable compile manifest, all department files will be reprocessed.")
+        return {}
+
+def save_manifest(raw_data_directory, manifest):
+    with open(os.path.join(raw_data_directory, manifest_file_name), 'w') as f:
+        json.dump(manifest, f)
+
+# Compile rankings, only reprocessing department files that are new or changed since the manifest was written
+# Returns the consolidated rankings, the updated manifest entries, the PMS Codes whose rankings changed and the
+# ranking store
+def compile_rankings_incremental(consolidated_df, raw_data_directory, mcr_to_employee_id, manifest, staff_list_hash, workers=1):
+    # A different staff list changes the MCR mapping of every department
+    previous = manifest.get('departments', {}) if manifest.get('staff_list_hash') == staff_list_hash else {}
+
+    found_pms_codes = find_department_files(consolidated_df['PMS Code'].unique(), raw_data_directory)
+    file_hashes = {pms_code: Excel_Cache.file_content_hash(os.path.join(raw_data_directory, f"{pms_code}.xlsx")) for pms_code in found_pms_codes}
+    changed_pms_codes = [pms_code for pms_code in found_pms_codes if previous.get(pms_code, {}).get('file_hash') != file_hashes[pms_code]]
+
+    department_rankings = {pms_code: previous[pms_code]['rankings'] for pms_code in found_pms_codes if pms_code not in changed_pms_codes}
+    department_rankings.update(process_department_files(changed_pms_codes, raw_data_directory, mcr_to_employee_id, workers))
+    department_rankings = {pms_code: department_rankings[pms_code] for pms_code in found_pms_codes}
+
+    # Reprocessed files were sorted and written back, so record their new contents
+    departments = {}
+    for pms_code in found_pms_codes:
+        if pms_code in changed_pms_codes:
+            file_hashes[pms_code] = Excel_Cache.file_content_hash(os.path.join(raw_data_directory, f"{pms_code}.xlsx"))
+        departments[pms_code] = {'file_hash': file_hashes[pms_code], 'rankings': department_rankings[pms_code]}
+
+    # Departments whose file disappeared also need their row rewritten
+    removed_pms_codes = [pms_code for pms_code in previous if pms_code not in departments]
+    rankings = build_ranking_store(consolidated_df, department_rankings)
+    consolidated_df = build_consolidated_rankings(consolidated_df, department_rankings)
+    return consolidated_df, departments, changed_pms_codes + removed_pms_codes, rankings
+
+# Rewrite only the Match cells of the given PMS Codes in an existing consolidated file
+# Returns False when the file's layout no longer matches and it has to be written in full
+def patch_consolidated_file(consolidated_df, output_path, pms_codes):
+    workbook = openpyxl.load_workbook(output_path)
+    worksheet = workbook.active
+    header = [cell.value for cell in worksheet[1]]
+    columns = list(consolidated_df.columns)
+    if header != columns[:len(header)] or worksheet.max_row != len(consolidated_df) + 1:
+        return False
+
+    # Append header cells for any new Match columns in the same style as the existing header
+    for position in range(len(header), len(columns)):
+        cell = worksheet.cell(row=1, column=position + 1, value=columns[position])
+        cell._style = copy(worksheet.cell(row=1, column=1)._style)
+
+    match_positions = [position for position, col in enumerate(columns) if 'Match' in str(col)]
+    for row in np.flatnonzero(consolidated_df['PMS Code'].isin(pms_codes)):
+        for position in match_positions:
+            value = consolidated_df.iat[row, position]
+            worksheet.cell(row=row + 2, column=position + 1).value = None if pd.isna(value) else value
+    workbook.save(output_path)
+    return True
 
 #Check for blank MCR numbers
+def find_blank_column_errors(df):
+    """
+    Finds blank Match cells that are followed by a non-blank Match cell.
+    Returns a DataFrame with the row index, PMS Code and blank column of each gap.
+    """
+    match_cols = [col for col in df.columns if 'Match' in str(col)]
+    blank = df[match_cols].isna().to_numpy()
+    rows, positions = np.nonzero(blank[:, :-1] & ~blank[:, 1:])
+    return pd.DataFrame({
+        'Row': df.index[rows],
+        'PMS Code': df['PMS Code'].to_numpy()[rows],
+        'Column': [match_cols[position] for position in positions],
+        'Position': positions + 1,
+    })
+
 def check_blank_column_errors(df):
     """
-    Checks for rows where a blank cell is followed by a non-blank cell.
+    Checks for rows where a blank Match cell is followed by a non-blank Match cell.
     Returns a list of indices of rows with such errors.
     """
-    error_rows = []
-    for index, row in df.iterrows():
-        if any(pd.isna(row[i]) and not pd.isna(row[i + 1]) for i in range(len(row) - 1)):
-            error_rows.append(index)
-    return error_rows
+    return find_blank_column_errors(df)['Row'].drop_duplicates().tolist()
+
+# Print the gaps found by find_blank_column_errors, one line per PMS Code
+def report_blank_column_errors(errors):
+    print(f"Error: The following rows contain invalid blank columns: {errors['Row'].drop_duplicates().tolist()}")
+    for pms_code, pms_errors in errors.groupby('PMS Code', sort=False):
+        print(f"  PMS Code {pms_code}: blank {', '.join(pms_errors['Column'])} followed by ranked officers")
+    print("Please ensure the staff listing and raw data files match correctly.")
+
+# Validate an existing consolidated HOD Rankings file without recompiling it
+def validate_consolidated_file(hod_rankings_path):
+    errors = find_blank_column_errors(load_consolidated_hod_rankings(hod_rankings_path))
+    if len(errors):
+        report_blank_column_errors(errors)
+    else:
+        print(f"No invalid blank columns found in {hod_rankings_path}")
+    return errors
+
+# Compile the HOD rankings and save the consolidated file, returning the rows with invalid blank columns
+def main(raw_dir_path, hod_rankings_path, staff_list_path, workers=1, incremental=False, progress=None):
+    with Run_Profile.RunProfile('HOD_Rank_Compiler', progress) as report:
+        output_path = os.path.join(os.path.dirname(hod_rankings_path), "HOD Rankings Consolidated.xlsx")
+        store_path = os.path.join(os.path.dirname(hod_rankings_path), Ranking_Store.store_file_name)
+
+        # Load the MCR to Employee ID mapping
+        report('Loading staff list')
+        mcr_to_employee_id = load_mcr_to_employee_mapping(staff_list_path)
+    
+        # Load the consolidated HOD rankings
+        consolidated_df = load_consolidated_hod_rankings(hod_rankings_path)
+        report.record_rows(staff=len(mcr_to_employee_id), departments=len(consolidated_df))
+    
+        # Compile rankings and process raw data files
+        report('Compiling department rankings')
+        if incremental:
+            manifest = load_manifest(raw_dir_path)
+            staff_list_hash = Excel_Cache.file_content_hash(staff_list_path)
+            template_hash = Excel_Cache.file_content_hash(hod_rankings_path)
+            consolidated_df, departments, changed_pms_codes, rankings = compile_rankings_incremental(consolidated_df, raw_dir_path, mcr_to_employee_id, manifest, staff_list_hash, workers)
+            print(f"Reprocessed {len(changed_pms_codes)} changed department file(s), reused {len(departments) - len(set(changed_pms_codes) & set(departments))}.")
+        else:
+            consolidated_df, rankings = compile_rankings(consolidated_df, raw_dir_path, mcr_to_employee_id, workers)
+        report.record_rows(departments=len(consolidated_df), ranked_officers=pd.notna(rankings.employee_ids).sum())
+
+        # Validate for blank column errors
+        report('Validating consolidated rankings')
+        errors = find_ranking_gaps(consolidated_df, rankings)
+        error_rows = errors['Row'].drop_duplicates().tolist()
+        report.record_rows(error_rows=len(error_rows), blank_cells=len(errors))
+
+        if error_rows:
+            report_blank_column_errors(errors)
+            if incremental:
+                save_manifest(raw_dir_path, {'staff_list_hash': staff_list_hash, 'departments': departments})
+            report.write(os.path.dirname(output_path))
+            return error_rows
+
+        # save the ranking store and the consolidated file, patching only the changed rows of the consolidated file when
+        # the previous output is still current
+        report('Saving consolidated rankings')
+        report.record_rows(rows=len(consolidated_df), rankings=len(rankings))
+        Ranking_Store.save_store(store_path, consolidated_df, rankings)
+        if not incremental:
+            consolidated_df.to_excel(output_path, index=False)
+            report.write(os.path.dirname(output_path))
+            return error_rows
+
+        patched = (manifest.get('template_hash') == template_hash and manifest.get('staff_list_hash') == staff_list_hash
+                   and os.path.exists(output_path) and manifest.get('output_hash') == Excel_Cache.file_content_hash(output_path)
+                   and patch_consolidated_file(consolidated_df, output_path, changed_pms_codes))
+        if not patched:
+            consolidated_df.to_excel(output_path, index=False)
+        save_manifest(raw_dir_path, {'staff_list_hash': staff_list_hash, 'template_hash': template_hash,
+                                     'output_hash': Excel_Cache.file_content_hash(output_path), 'departments': departments})
+        report.write(os.path.dirname(output_path))
+        return error_rows
 
 # Main entry point
 if __name__ == "__main__":
     # Create the parser and add arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('--dir', type=str, required=True, help="The target directory path")
-    parser.add_argument('--HODRankFile', type=str, required=True, help="The file name of consolidated HOD Rankings")
-    parser.add_argument('--MOPEXStaffList', type=str, required=True, help="The file name of MOPEX 25 Staff List")
+    parser.add_argument('--dir', type=str, help="The target directory path")
+    parser.add_argument('--HODRankFile', type=str, help="The file name of consolidated HOD Rankings")
+    parser.add_argument('--MOPEXStaffList', type=str, help="The file name of MOPEX 25 Staff List")
+    parser.add_argument('--validate', type=str, help="Only check an existing consolidated HOD Rankings file for blank columns")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used to read and sort department files")
+    parser.add_argument('--incremental', action='store_true', help="Only reprocess department files changed since the last incremental compile")
+    Excel_Cache.add_cache_arguments(parser)
+    Run_Profile.add_profile_arguments(parser)
     args = parser.parse_args()
-    
-    # Set the directory path and file names
-    raw_dir_path = args.dir
-    hod_rankings_path = args.HODRankFile
-    output_dir_path = os.path.dirname(hod_rankings_path)
-    staff_list_path = args.MOPEXStaffList
-    
-    # Load the MCR to Employee ID mapping
-    mcr_to_employee_id = load_mcr_to_employee_mapping(staff_list_path)
-    
-    # Load the consolidated HOD rankings
-    consolidated_df = load_consolidated_hod_rankings(hod_rankings_path)
-    
-    # Compile rankings and process raw data files
-    processed_data = compile_rankings(consolidated_df, raw_dir_path, mcr_to_employee_id)
+    Excel_Cache.apply_cache_arguments(args)
+    Run_Profile.apply_profile_arguments(args)
 
-    # Validate for blank column errors
-    error_rows = check_blank_column_errors(consolidated_df)
+    if args.validate:
+        exit(1 if len(validate_consolidated_file(args.validate)) else 0)
+    if not (args.dir and args.HODRankFile and args.MOPEXStaffList):
+        parser.error("--dir, --HODRankFile and --MOPEXStaffList are required")
 
+    error_rows = main(args.dir, args.HODRankFile, args.MOPEXStaffList, args.workers, args.incremental)
     if error_rows:
-        print(f"Error: The following rows contain invalid blank columns: {error_rows}")
-        print("Please ensure the staff listing and raw data files match correctly.")
         exit(1)  # Exit the script if errors are found
-
-    # save the consolidated file
-    consolidated_df.to_excel(os.path.join(output_dir_path, "HOD Rankings Consolidated.xlsx"), index=False)
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+README:
+Background job runner for the GUI.
+Pipeline stages run in a worker thread of the GUI process, so the pandas stack is only imported once and stays warm
+between runs. The worker reports stage progress, printed output and the outcome through a queue that the Tk main
+thread polls, and cancellation takes effect at the next stage boundary.
+Printed output is captured per thread: sys.stdout is replaced once by a ThreadOutput that sends the worker thread's
+lines to the job's queue, while other threads, like the Tk main thread, keep writing to the original stdout.
+"""
+
+# import necessary libraries
+import contextlib
+import queue
+import sys
+import threading
+import time
+import traceback
+
+class JobCancelled(Exception):
+    pass
+
+# File-like object that forwards printed lines from the job to the event queue
+class OutputForwarder:
+    def __init__(self, events):
+        self.events = events
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self.events.put(('output', line))
+
+    def flush(self):
+        if self.buffer:
+            self.events.put(('output', self.buffer))
+            self.buffer = ''
+
+# Stand-in for sys.stdout that sends each thread's output to the stream registered for that thread
+# Threads without one write to the original stdout, which is None when the GUI runs under pythonw
+class ThreadOutput:
+    def __init__(self, stream):
+        self.stream = stream
+        self.targets = {}   # thread ident -> stream of that thread's output
+
+    def target(self):
+        return self.targets.get(threading.get_ident(), self.stream)
+
+    def write(self, text):
+        target = self.target()
+        if target is None:
+            return len(text)
+        return target.write(text)
+
+    def flush(self):
+        target = self.target()
+        if target is not None:
+            target.flush()
+
+    # Send the current thread's output to target inside the with block
+    @contextlib.contextmanager
+    def redirect(self, target):
+        thread = threading.get_ident()
+        self.targets[thread] = target
+        try:
+            yield target
+        finally:
+            del self.targets[thread]
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+# Replace sys.stdout by a ThreadOutput, once per process, returning the installed one
+def install_thread_output():
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout = ThreadOutput(sys.stdout)
+    return sys.stdout
+
+class JobRunner:
+    def __init__(self):
+        self.output = install_thread_output()
+        self.events = queue.Queue()
+        self.cancel_requested = threading.Event()
+        self.thread = None
+        self.job_name = None
+        self.started_at = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+
+    # Run target(*args, progress=..., **kwargs) in a worker thread
+    def start(self, job_name, target, *args, **kwargs):
+        if self.is_running():
+            raise RuntimeError(f"{self.job_name} is still running")
+        self.job_name = job_name
+        self.cancel_requested.clear()
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, args=(target, args, kwargs), daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    # Progress callback passed to the pipeline stages, raising JobCancelled once cancellation is requested
+    def report(self, stage):
+        if self.cancel_requested.is_set():
+            raise JobCancelled(f"{self.job_name} was cancelled")
+        self.events.put(('progress', stage))
+
+    def run(self, target, args, kwargs):
+        # Messages printed by the stages go to the GUI log while the job runs, output of other threads is left alone
+        forwarder = OutputForwarder(self.events)
+        try:
+            with self.output.redirect(forwarder):
+                result = target(*args, progress=self.report, **kwargs)
+            forwarder.flush()
+            self.events.put(('done', result))
+        except JobCancelled:
+            forwarder.flush()
+            self.events.put(('cancelled', None))
+        except Exception as error:
+            forwarder.flush()
+            self.events.put(('error', (f"{type(error).__name__}: {error}", traceback.format_exc())))
+
+    # Drain the events posted since the last poll, called from the Tk main thread
+    def poll(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
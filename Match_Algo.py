@@ -2,347 +2,454 @@ import pandas as pd
 import argparse
 import os
 import numpy as np
-
-def gale_shapley_1(hod_rankings, officer_choices, no_vacancies_departments):
-    # Prepare the officers list and departments list
-    officers_list = officer_choices['Employee ID'].tolist()
-    departments_list = hod_rankings['PMS Code'].tolist()
-
-    # Prepare departments vacancies
-    department_vacancies = hod_rankings.set_index('PMS Code')['Vacancies'].to_dict()
-
+import Code_Table
+import Match_Engine
+import Match_Events
+import Match_Shards
+import Match_Verifier
+import Excel_Cache
+import Output_Writer
+import Ranking_Store
+import Run_Profile
+
+def gale_shapley_1(hod_rankings, rankings, officer_choices, table=None, market=None, recorder=None):
     # Prepare officers and departments preferences
     # Replace empty strings with NaN in the preference columns
     preference_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]  # Assuming 'choice' in officers data
     officer_choices[preference_columns] = officer_choices[preference_columns].replace('', np.nan)
 
-    # Create dictionary of Officer Preferences
-    officers_pref = officer_choices.set_index('Employee ID')[preference_columns].to_dict('split')
-    officers_pref = {officer: choices for officer, choices in zip(officers_pref['index'], officers_pref['data'])}
-
-    # Create dictionary of Department Preferences
-    department_pref_columns = [col for col in hod_rankings.columns if 'Match' in col]
-    departments_pref = hod_rankings.set_index('PMS Code')[department_pref_columns].replace(np.nan, '').T.to_dict('list')
-
-    # Create dictionaries to map MCR Number to Employee Name and PMS Code to Posting, add GDFM Bump comments
-    officer_names = officer_choices.set_index('Employee ID')['Employee Name'].to_dict()
-    department_postings = hod_rankings.set_index('PMS Code')['Postings'].to_dict()
-    officer_comments = pd.Series(officer_choices.Comment.values, index=officer_choices['Employee ID']).to_dict()
-
-    # Initialize
-    tentative_matches = {department: [] for department in departments_list}
-    first_unmatched_officers = []
-    
-    exceptions = []  # To track the exceptions
-    
-    while officers_list:
-        officer = officers_list.pop(0)
-        officer_preferences = officers_pref[officer]
-        
-        for department in officer_preferences:
-            if pd.isna(department):  # This exception handles officers who have listed <10 choices
-                first_unmatched_officers.append(officer)
-                break
-            try:
-                department_preferences = departments_pref[department]
-                if officer not in department_preferences:  # If officer not in department preferences, reject and continue to next preference
-                    continue
-                if department_vacancies[department] > len(tentative_matches[department]):
-                    # There's an available vacancy
-                    tentative_matches[department].append(officer)
-                    break
-                else:
-                    # No vacancy available, check if officer is a preferred candidate
-                    current_worst_officer = max(tentative_matches[department], key=department_preferences.index)
-                    
-                    if department_preferences.index(officer) < department_preferences.index(current_worst_officer):
-                        # Officer is a preferred candidate
-                        tentative_matches[department].remove(current_worst_officer)
-                        tentative_matches[department].append(officer)
-                        officers_list.append(current_worst_officer)
-                        break
-
-            #Debugs for unexpected PMS Code i.e. when MO applies for department not available in HOD Ranking List
-            except KeyError:
-                if department not in no_vacancies_departments['PMS Code'].values: #Checks if PMS Code was already flagged up previously as having no vacancy and thus removed
-                    exceptions.append((officer, department))
-                    
-        else:
-            # Officer could not be matched, add to unmatched list
-            first_unmatched_officers.append(officer)
-    
-    # Returns dataframes of unmatched officers, departments with vacancies, and matches to main function for writing
-    first_unmatched_officers_df = officer_choices[officer_choices['Employee ID'].isin(first_unmatched_officers)]
-    departments_with_vacancies = {dept: vacancies - len(tentative_matches[dept]) for dept, vacancies in department_vacancies.items() if vacancies - len(tentative_matches[dept]) > 0}
-    first_departments_with_vacancies_df = pd.DataFrame.from_dict(departments_with_vacancies, orient='index', columns=['Remaining Vacancies'])
-    first_departments_with_vacancies_df.reset_index(inplace=True)
-    first_departments_with_vacancies_df.columns = ['Department', 'Remaining Vacancies']
-    mutualmatch_df = pd.DataFrame([(officer, officer_names[officer], department, department_postings[department], officer_comments[officer]) for department, officers in tentative_matches.items() for officer in officers], columns=['Employee ID', 'Employee Name', 'PMS Code', 'Posting', 'Comment'])
-    return mutualmatch_df, first_unmatched_officers_df, first_departments_with_vacancies_df, exceptions
-
-def gale_shapley_2(first_unmatched_officers_df, first_departments_with_vacancies_df, hod_rankings):
-    officers_list = first_unmatched_officers_df['Employee ID'].tolist()
-    departments_list = first_departments_with_vacancies_df['Department'].tolist()
+    # Compile Employee IDs and PMS Codes to integer codes and prune the lists to mutually acceptable pairs, unless the
+    # compiled market is given, and run the matching, sharded over the matching workers when there are several
+    if market is None:
+        market = Match_Engine.compile_round_1(hod_rankings, rankings, officer_choices, preference_columns, table)
+    # Every proposal goes to the run's event recorder, if any, under the CodeTable codes the round 1 market uses
+    table = market.table
+    if recorder is not None:
+        recorder.start_round(1)
+    state = Match_Shards.run_deferred_acceptance(market, recorder)
+
+    # Matched officers' and departments' codes, decoded to Employee IDs, names, PMS Codes and postings with GDFM Bump comments
+    held = [(department, officer) for department in range(len(market.department_codes)) for officer in state.held_officers(department)]
+    departments, officers = (np.array(codes, dtype=np.int64) for codes in zip(*held)) if held else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    mutualmatch_df = pd.DataFrame({
+        'Employee ID': table.decode_officers(officers),
+        'Employee Name': table.officer_column(officer_choices, 'Employee Name')[officers],
+        'PMS Code': table.decode_departments(departments),
+        'Posting': table.department_column(hod_rankings, 'Postings')[departments],
+        'Comment': table.officer_column(officer_choices, 'Comment')[officers],
+    })
 
-    # Prepare departments vacancies
-    department_vacancies = first_departments_with_vacancies_df.set_index('Department')['Remaining Vacancies'].to_dict()
+    # Returns dataframes of unmatched officers, departments with vacancies, and matches to main function for writing
+    first_unmatched_officers_df = officer_choices[officer_choices['Employee ID'].isin(table.decode_officers(state.unmatched))]
+    remaining_vacancies = np.array(market.vacancies) - np.bincount(departments, minlength=len(market.department_codes))
+    with_vacancies = np.flatnonzero(remaining_vacancies > 0)
+    first_departments_with_vacancies_df = pd.DataFrame({'Department': table.decode_departments(with_vacancies), 'Remaining Vacancies': remaining_vacancies[with_vacancies]})
+    return mutualmatch_df, first_unmatched_officers_df, first_departments_with_vacancies_df
 
+def gale_shapley_2(first_unmatched_officers_df, first_departments_with_vacancies_df, hod_rankings, table=None, market=None, recorder=None):
     # Prepare officers and departments preferences
     # Replace empty strings with NaN in the preference columns
     preference_columns = [col for col in first_unmatched_officers_df.columns if 'choice' in col.lower()]  # Assuming 'choice' in officers data
     first_unmatched_officers_df.loc[:, preference_columns] = first_unmatched_officers_df.loc[:, preference_columns].replace('', np.nan)
-
-    # Create dictionary of Officer Preferences
-    officers_pref = first_unmatched_officers_df.set_index('Employee ID')[preference_columns].to_dict('split')
-    officers_pref = {officer: choices for officer, choices in zip(officers_pref['index'], officers_pref['data'])}
-
-    # Create dictionaries to map MCR Number to Employee Name and PMS Code to Posting, add GDFM Bump comments
-    officer_names = first_unmatched_officers_df.set_index('Employee ID')['Employee Name'].to_dict()
-    department_postings = hod_rankings.set_index('PMS Code')['Postings'].to_dict()
-    officer_comments = pd.Series(first_unmatched_officers_df.Comment.values, index=first_unmatched_officers_df['Employee ID']).to_dict()
-
-    # Initialize
-    tentative_matches = {department: [] for department in departments_list}
-    second_unmatched_officers = []
-
-    while officers_list:
-        officer = officers_list.pop(0)
-        officer_preferences = officers_pref[officer]
-
-        for rank, department in enumerate(officer_preferences):
-            if pd.isna(department):  # This exception handles officers who have listed <10 choices
-                second_unmatched_officers.append(officer)
-                break
-
-            # If department is full, reject and move on
-            if department not in department_vacancies:
-                continue
-
-            #If department has vacancy, add MO in
-            if department_vacancies[department] > len(tentative_matches[department]):
-                tentative_matches[department].append((officer, rank))
-                break
-            else:
-                # No vacancy available, rank the existing MOs and the new MO
-                ranked_officers = sorted(tentative_matches[department] + [(officer, rank)], key=lambda x: (x[1], x[0])) #sorts based on MO preference, then by employee ID
-                if ranked_officers.index((officer, rank)) < department_vacancies[department]:
-                    # MO is accepted, remove the last MO
-                    rejected_officer = ranked_officers.pop(-1)[0]
-                    tentative_matches[department] = ranked_officers
-                    officers_list.append(rejected_officer)
-                    break
-
-        else:
-            # Officer could not be matched, add to unmatched list
-            second_unmatched_officers.append(officer)
-
-    tentative_matches = {department: [officer for officer, _ in officers] for department, officers in tentative_matches.items()}
+    if table is None:
+        table = Code_Table.CodeTable(first_unmatched_officers_df, hod_rankings, preference_columns)
+
+    # Compile to integer indices unless the compiled market is given, departments prioritise by MO preference, then by employee ID
+    if market is None:
+        market = Match_Engine.compile_round_2(first_unmatched_officers_df, first_departments_with_vacancies_df, preference_columns, table)
+    if recorder is not None:
+        recorder.start_round(2)
+    state = Match_Shards.run_deferred_acceptance(market, recorder)
+
+    # Round 2 indices to codes of the shared table, decoded to Employee IDs, names, PMS Codes and postings with GDFM Bump comments
+    officer_codes = table.encode_officers(market.officer_ids)
+    department_codes = table.encode_departments(market.department_codes)
+    if recorder is not None:
+        recorder.translate_round(officer_codes, department_codes)
+    held = [(department, officer) for department in range(len(market.department_codes)) for officer in state.held_officers(department, sort_displaced=True)]
+    departments, officers = (np.array(codes, dtype=np.int64) for codes in zip(*held)) if held else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    matched_ids = table.decode_officers(officer_codes[officers])
+    officer_details = first_unmatched_officers_df.drop_duplicates(subset='Employee ID', keep='last').set_index('Employee ID')
+    second_match_df = pd.DataFrame({
+        'Employee ID': matched_ids,
+        'Employee Name': officer_details['Employee Name'].reindex(matched_ids).to_numpy(dtype=object),
+        'PMS Code': table.decode_departments(department_codes[departments]),
+        'Posting': table.department_column(hod_rankings, 'Postings')[department_codes[departments]],
+        'Comment': officer_details['Comment'].reindex(matched_ids).to_numpy(dtype=object),
+    })
 
     # Returns dataframes of unmatched officers, departments with vacancies, and matches to main function for writing
-    second_unmatched_officers_df = first_unmatched_officers_df[first_unmatched_officers_df['Employee ID'].isin(second_unmatched_officers)]
-    departments_with_vacancies = {dept: vacancies - len(tentative_matches[dept]) for dept, vacancies in department_vacancies.items() if vacancies - len(tentative_matches[dept]) > 0}
-    second_departments_with_vacancies_df = pd.DataFrame.from_dict(departments_with_vacancies, orient='index', columns=['Remaining Vacancies'])
-    second_match_df = pd.DataFrame([(officer, officer_names[officer], department, department_postings[department], officer_comments[officer]) for department, officers in tentative_matches.items() for officer in officers], columns=['Employee ID', 'Employee Name', 'PMS Code', 'Posting', 'Comment'])
+    second_unmatched_officers_df = first_unmatched_officers_df[first_unmatched_officers_df['Employee ID'].isin(table.decode_officers(officer_codes[state.unmatched]))]
+    remaining_vacancies = np.array(market.vacancies) - np.bincount(departments, minlength=len(market.department_codes))
+    with_vacancies = np.flatnonzero(remaining_vacancies > 0)
+    second_departments_with_vacancies_df = pd.DataFrame({'Remaining Vacancies': remaining_vacancies[with_vacancies]}, index=pd.Index(market.department_codes, dtype=object)[with_vacancies])
 
     return second_match_df, second_unmatched_officers_df, second_departments_with_vacancies_df
 
+license_hierarchy = ["Conditional-L1", "Conditional-L2", "Conditional-L3", "Full"]
+
 def license_satisfies_requirement(officer_license, requirement):
-    license_hierarchy = ["Conditional-L1", "Conditional-L2", "Conditional-L3", "Full"]
     return license_hierarchy.index(officer_license) >= license_hierarchy.index(requirement)
 
+# Map licenses to their position in the hierarchy, raising like license_hierarchy.index for unknown values
+def license_levels(licenses):
+    levels = pd.Series(licenses, dtype=object).map({license: level for level, license in enumerate(license_hierarchy)})
+    if levels.isna().any():
+        raise ValueError(f"{licenses[levels.isna().to_numpy().argmax()]!r} is not in list")
+    return levels.to_numpy(dtype=np.int64)
+
 def check_license(officer_choices, posting_license_requirement):
-    # Iterate over each officer's choices
-    for idx, officer in officer_choices.iterrows():
-        for col in officer_choices.columns:
-            if 'choice' in col.lower():  # Assuming 'choice' in officers data
-                department = officer[col]
-                if pd.isna(department):
-                    continue
-                # Check if department has license requirement
-                if department in posting_license_requirement['PMS Code'].values:
-                    requirement = posting_license_requirement[posting_license_requirement['PMS Code'] == department]['Requirement'].values[0]
-                    # Check if officer meets the requirement
-                    if pd.notna(officer['Registration Type']):
-                        if not license_satisfies_requirement(officer['Registration Type'], requirement):
-                            # Officer does not meet the requirement, modify the department code
-                            officer_choices.at[idx, col] = department + '_' + officer['Registration Type']
+    choice_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]  # Assuming 'choice' in officers data
+    if not choice_columns or officer_choices.empty:
+        return officer_choices
+
+    # Melt the choice columns once into a (officer, choice) grid of departments
+    departments = officer_choices[choice_columns].to_numpy(dtype=object)
+    registration = officer_choices['Registration Type'].to_numpy(dtype=object)
+
+    # Look up each department's license requirement, the first listing of a PMS Code applies
+    requirements = posting_license_requirement.dropna(subset=['PMS Code']).drop_duplicates(subset='PMS Code')
+    requirement_index = pd.Index(requirements['PMS Code'], dtype=object)
+    requirement_position = requirement_index.get_indexer(pd.Index(departments.ravel(), dtype=object)).reshape(departments.shape)
+
+    # Only departments with a requirement chosen by officers with a known registration type are checked
+    checked = (requirement_position >= 0) & pd.notna(departments) & pd.notna(registration)[:, None]
+    officer_rows, choice_positions = np.nonzero(checked)
+    if len(officer_rows) == 0:
+        return officer_choices
+    officer_levels = license_levels(registration[officer_rows])
+    requirement_levels = license_levels(requirements['Requirement'].to_numpy(dtype=object)[requirement_position[officer_rows, choice_positions]])
+
+    # Officer does not meet the requirement, modify the department code
+    failed = officer_levels < requirement_levels
+    officer_rows, choice_positions = officer_rows[failed], choice_positions[failed]
+    if len(officer_rows) == 0:
+        return officer_choices
+    departments[officer_rows, choice_positions] = [department + '_' + license for department, license in zip(departments[officer_rows, choice_positions], registration[officer_rows])]
+
+    changed_columns = [choice_columns[position] for position in np.unique(choice_positions)]
+    officer_choices[changed_columns] = pd.DataFrame(departments[:, np.unique(choice_positions)], index=officer_choices.index, columns=changed_columns)
     return officer_choices
 
-def GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings):
+# Status of an officer's choice, every status but Valid is listed in the choice exceptions
+choice_statuses = ['Valid', 'No Vacancy', 'License Requirement', 'Blacklisted', 'Unknown PMS Code', 'After Blank']
+
+# Classify every (officer, choice) cell of the encoded choice grid in one pass, returning the choice exceptions
+# No Vacancy          - PMS Code of a department without vacancies
+# License Requirement - PMS Code suffixed by check_license with the officer's license, which is below the requirement
+# Blacklisted         - PMS Code prefixed by Remove_MOs for a blacklisted (officer, posting) pair
+# Unknown PMS Code    - not in the HOD Rankings
+# After Blank         - a choice after the officer's first blank choice, which ends their list
+def validate_choices(table, officer_choices, no_vacancies_departments, preference_columns):
+    status = np.zeros(table.choice_codes.shape, dtype=np.int8)
+    rows, positions = np.nonzero((table.choice_codes < 0) & ~table.choice_blanks)
+    if len(rows):
+        values = pd.Series(table.choice_values[rows, positions], dtype=object).astype(str)
+        no_vacancy = values.isin(set(no_vacancies_departments['PMS Code'].tolist())).to_numpy()
+        blacklisted = values.str.startswith('Blacklisted-').to_numpy()
+        _, separator, suffix = (values.str.rpartition('_')[part] for part in range(3))
+        license_suffixed = ((separator == '_') & suffix.isin(license_hierarchy)).to_numpy()
+        status[rows, positions] = np.select([no_vacancy, blacklisted, license_suffixed], [1, 3, 2], default=4)
+    status[~table.choice_listed & ~table.choice_blanks] = choice_statuses.index('After Blank')
+
+    rows, positions = np.nonzero(status)
+    return pd.DataFrame({
+        'Employee ID': table.decode_officers(rows),
+        'Employee Name': table.officer_column(officer_choices, 'Employee Name')[rows],
+        'Choice': np.array(preference_columns, dtype=object)[positions],
+        'PMS Code': table.choice_values[rows, positions],
+        'Status': np.array(choice_statuses, dtype=object)[status[rows, positions]],
+    })
+
+polyclinic_postings = ['NHGPlyNHGPly', 'SHSPlySHSPly', 'NUPNUP']
+
+# rankings is the RankingStore of the HOD rankings, returned with the polyclinic rankings reordered
+def GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings, rankings):
 
     officer_choices['Comment'] = ''
-    polyclinic_postings = ['NHGPlyNHGPly', 'SHSPlySHSPly', 'NUPNUP']
 
-    # Initializing priority lists and counters for each polyclinic cluster
+    # Index each officer's original position in the polyclinic HOD rankings
+    polyclinic_rows = {}
+    original_rankings = {}
+    for posting in polyclinic_postings:
+        rows = hod_rankings.index[hod_rankings['PMS Code'] == posting]
+        if len(rows) == 0:
+            continue
+        polyclinic_rows[posting] = rows
+        original_rankings[posting] = {}
+        positions, officers = rankings.ranking(posting)
+        for position, officer in zip(positions.tolist(), officers.tolist()):
+            original_rankings[posting].setdefault(officer, position)
+
+    # Initializing priority lists for each polyclinic cluster
     priority_lists = {posting: [] for posting in polyclinic_postings}
-    priority_counters = {posting: 0 for posting in polyclinic_postings}
+    prioritized_officers = {posting: set() for posting in polyclinic_postings}
     original_positions = {}  # Dictionary to store original positions
 
-    def prioritize_candidates(GDFM, priority_lists, priority_counters, original_positions, posting):
-
-        for _, row in GDFM.iterrows():
-            if row['Eligible for Prioritisation'] == 'Y' and pd.notna(row['Employee ID']):
-                employee_id = row['Employee ID']
-                try:
-                    first_choice = officer_choices.loc[officer_choices['Employee ID'] == employee_id, '1st choice'].values[0]
-                except IndexError:
-                    print(f'Error: Officer {employee_id} was not found in officer_choices. Please check the data.')
-                    continue
-
-                if first_choice == posting:
-                    hod_row = hod_rankings.loc[hod_rankings['PMS Code'] == first_choice]
-                    match_cols = [col for col in hod_rankings.columns if 'Match' in col]
+    # Eligible officers of a GDFM cohort in sheet order, and the candidates among them with their first choice
+    def eligible_officers(GDFM):
+        return GDFM.loc[(GDFM['Eligible for Prioritisation'] == 'Y') & GDFM['Employee ID'].notna(), 'Employee ID']
 
-                    if employee_id in hod_row[match_cols].values:
-                        # Store original position
-                        original_position = hod_row[match_cols].apply(lambda row: next((i for i, col in enumerate(row) if str(col) == str(employee_id)), None), axis=1).values[0]
-                        original_positions[employee_id] = original_position
+    def eligible_candidates(eligible):
+        return eligible.tolist(), eligible.map(first_choices).tolist(), eligible.isin(first_choices.index).tolist()
 
-                        priority_lists[first_choice].append(employee_id)
-                        priority_counters[first_choice] += 1
-
-                        # Remove the prioritized officer from their current position
-                        hod_rankings.loc[hod_row.index, match_cols] = hod_row[match_cols].apply(lambda x: x.replace(str(employee_id), ''))
-        return priority_counters
+    def prioritize_candidates(candidates, posting):
+        for employee_id, first_choice, found in zip(*candidates):
+            if not found:
+                print(f'Error: Officer {employee_id} was not found in officer_choices. Please check the data.')
+                continue
+            # Officers already prioritized have been removed from the HOD ranking
+            if first_choice == posting and str(employee_id) in original_rankings[posting] and employee_id not in prioritized_officers[posting]:
+                original_positions[employee_id] = original_rankings[posting][str(employee_id)]
+                priority_lists[posting].append(employee_id)
+                prioritized_officers[posting].add(employee_id)
 
     # Check for postings with 0 vacancies
     postings_with_vacancies = []
     for posting in polyclinic_postings:
-        try:
-            if hod_rankings.loc[hod_rankings['PMS Code'] == posting, 'Vacancies'].values[0] > 0:
-                postings_with_vacancies.append(posting)
-            else:
-                print(f"Skipping prioritization for {posting} as there are no vacancies.")
-        except IndexError:
+        if posting not in polyclinic_rows:
             print(f"Could not find '{posting}' in HOD Rankings file!")
-            continue
+        elif hod_rankings.loc[polyclinic_rows[posting][0], 'Vacancies'] > 0:
+            postings_with_vacancies.append(posting)
+        else:
+            print(f"Skipping prioritization for {posting} as there are no vacancies.")
+
+    # Officers' first choices are only read when an eligible officer can be prioritised, so MO rankings without a
+    # '1st choice' column still match when no one is
+    GDFM1_eligible, GDFM2_eligible = eligible_officers(GDFM1), eligible_officers(GDFM2)
+    if postings_with_vacancies and (len(GDFM1_eligible) or len(GDFM2_eligible)):
+        first_choices = officer_choices.drop_duplicates(subset='Employee ID').set_index('Employee ID')['1st choice']
+    else:
+        first_choices = pd.Series(dtype=object)
 
     # Prioritize candidates from GDFM cohort 1 only for postings with vacancies
+    GDFM1_candidates = eligible_candidates(GDFM1_eligible)
     for posting in postings_with_vacancies:
-        priority_counters = prioritize_candidates(GDFM1, priority_lists, priority_counters, original_positions, posting)
+        prioritize_candidates(GDFM1_candidates, posting)
 
     #Prioritize candidates from 2nd GDFM cohort if there are still vacancies
+    GDFM2_candidates = eligible_candidates(GDFM2_eligible)
     for posting in postings_with_vacancies:
-        
-        if priority_counters[posting] < hod_rankings.loc[hod_rankings['PMS Code'] == posting, 'Vacancies'].values[0]:
-           priority_counters = prioritize_candidates(GDFM2, priority_lists, priority_counters, original_positions, posting)
+        if len(priority_lists[posting]) < hod_rankings.loc[polyclinic_rows[posting][0], 'Vacancies']:
+            prioritize_candidates(GDFM2_candidates, posting)
+
+    # Sort each priority list based on original HOD ranking
+    def sort_by_hod_ranking(priority_list):
+        return [x for _, x in sorted(zip(map(original_positions.get, priority_list), priority_list))]
 
     # Rearrange the remaining officers and insert the prioritized officers
+    GDFM1_officers = set(GDFM1['Employee ID'].dropna())
+    GDFM2_officers = set(GDFM2['Employee ID'].dropna())
+    GDFM1_bumped = []
+    GDFM2_bumped = []
+    bumped_rankings = {}
     for posting, priority_list in priority_lists.items():
         if priority_list:
-            hod_row = hod_rankings.loc[hod_rankings['PMS Code'] == posting]
-            match_cols = [col for col in hod_rankings.columns if 'Match' in col]
-            remaining_officers = pd.Series(hod_row[match_cols].values.flatten()).replace('', pd.NA).dropna().tolist()
-
-            # Separate priority list into sheet1 and sheet2 lists
-            GDFM1_priority = [officer for officer in priority_list if officer in GDFM1['Employee ID'].values]
-            GDFM2_priority = [officer for officer in priority_list if officer in GDFM2['Employee ID'].values]
-
-            # Sort each priority list based on original HOD ranking
-            def sort_by_hod_ranking(priority_list):
-                return [x for _, x in sorted(zip(map(original_positions.get, priority_list), priority_list))]
-
-            GDFM1_priority = sort_by_hod_ranking(GDFM1_priority)
-            GDFM2_priority = sort_by_hod_ranking(GDFM2_priority)
-
-            # Combine the sorted priority lists
-            final_priority_list = GDFM1_priority + GDFM2_priority
-
-            # Ensure the remaining officers are rearranged to have no gaps
-            specified_rows = hod_rankings[hod_rankings['PMS Code'] == posting].index
-            cols_to_modify = match_cols[len(final_priority_list):len(final_priority_list)+len(remaining_officers)]
-            hod_rankings.loc[specified_rows, cols_to_modify] = remaining_officers
-
-            # Insert the prioritized officers at the top
-            hod_rankings.loc[specified_rows, match_cols[:len(final_priority_list)]] = final_priority_list
-
-            # Add comment to officer_choices
-            officer_choices.loc[officer_choices['Employee ID'].isin(GDFM1_priority), 'Comment'] = 'GDFM Bump Intake 1'
-            officer_choices.loc[officer_choices['Employee ID'].isin(GDFM2_priority), 'Comment'] = 'GDFM Bump Intake 2'
-
-    return hod_rankings, officer_choices
-
-def main(hod_rankings_path, officer_choices_path, GDFM_list_path):
-    # Preparing the output folder
-    output_folder = os.path.dirname(officer_choices_path) 
-    output_folder_path = os.path.join(output_folder, 'output')
-    if not os.path.exists(output_folder_path):
-        os.makedirs(output_folder_path)
-
-    # Input file paths
-    hod_rankings_path = args.HODRankFile
-    officer_choices_path = args.MORankFile
-    GDFM_list_path = args.GDFM
-    posting_license_requirement_path = os.path.join(output_folder, 'Posting License Requirements.xlsx')
-
-    #Output file paths
-    no_choice_officers_path     = os.path.join(output_folder_path, 'no_choice_officers.csv')
-    no_vacancies_departments_path = os.path.join(output_folder_path, 'no_vacancies_departments.csv')
-    mutualmatches_path = os.path.join(output_folder_path, 'mutualmatches.xlsx')
-    exceptions_path = os.path.join(output_folder_path, 'exceptions.txt')
-    second_departments_with_vacancies_path = os.path.join(output_folder_path, 'Departments with vacancies.xlsx')
-    second_unmatched_officers_path = os.path.join(output_folder_path, 'Unmatched officers.xlsx')
-    combined_match_path = os.path.join(output_folder_path, 'Final Matches.xlsx')
-    
+            prioritized = {str(officer) for officer in priority_list}
+            remaining_officers = [officer for officer in rankings.ranking(posting)[1].tolist() if officer not in prioritized]
+
+            # Separate priority list into cohort 1 and cohort 2 lists, sorted by HOD ranking
+            GDFM1_priority = sort_by_hod_ranking([officer for officer in priority_list if officer in GDFM1_officers])
+            GDFM2_priority = sort_by_hod_ranking([officer for officer in priority_list if officer in GDFM2_officers])
+            GDFM1_bumped += GDFM1_priority
+            GDFM2_bumped += GDFM2_priority
+
+            # Prioritized officers at the top, followed by the remaining officers with no gaps
+            bumped_rankings[posting] = GDFM1_priority + GDFM2_priority + remaining_officers
+
+    # Add comment to officer_choices
+    officer_choices.loc[officer_choices['Employee ID'].isin(GDFM1_bumped), 'Comment'] = 'GDFM Bump Intake 1'
+    officer_choices.loc[officer_choices['Employee ID'].isin(GDFM2_bumped), 'Comment'] = 'GDFM Bump Intake 2'
+
+    return rankings.updated(bumped_rankings), officer_choices
+
+# Both matching rounds on the license-checked and GDFM-prioritised inputs, kept so they can be rematched
+def match_rounds(hod_rankings, rankings, officer_choices):
+    preference_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
+    return Match_Engine.match_rounds(hod_rankings, rankings, officer_choices, preference_columns)
+
+# Rematch after late withdrawals, vacancy adjustments or blacklist entries, giving the matches of a full run
+# GDFM prioritisation reorders the polyclinic HOD rankings based on the prioritised officers and the polyclinic
+# vacancies, so changes involving either need a full run
+def rematch(rounds, officer_choices, removed_officers=(), vacancy_changes=None, blacklisted_pairs=()):
+    prioritised_officers = set(officer_choices.loc[officer_choices['Comment'] != '', 'Employee ID'])
+    changed_officers = set(removed_officers) | {officer for officer, _ in blacklisted_pairs}
+    if changed_officers & prioritised_officers or set(vacancy_changes or {}) & set(polyclinic_postings):
+        raise ValueError("The change affects GDFM prioritisation, please rerun the full match")
+    return Match_Engine.rematch_rounds(rounds, removed_officers, vacancy_changes, blacklisted_pairs)
+
+# Split consolidated HOD rankings into the departments and a RankingStore of their Match columns
+# Employee IDs in the store are formatted as strings
+def prepare_hod_rankings(hod_rankings):
+    return Ranking_Store.department_columns(hod_rankings), Ranking_Store.store_from_wide(hod_rankings).text()
+
+# Departments and rankings of either a ranking store or a consolidated file with Match columns
+def load_hod_rankings(hod_rankings_path):
+    if Ranking_Store.is_store_file(hod_rankings_path):
+        return Ranking_Store.load_store(hod_rankings_path)
+    return prepare_hod_rankings(Excel_Cache.read_excel(hod_rankings_path))
+
+def load_license_and_GDFM(posting_license_requirement_path, GDFM_list_path):
+    posting_license_requirement = Excel_Cache.read_excel(posting_license_requirement_path)
+    GDFM_sheets = Excel_Cache.read_excel(GDFM_list_path, sheet_name=[0, 1], header=1, dtype={'Employee ID': str})
+    return posting_license_requirement, GDFM_sheets[0], GDFM_sheets[1]
+
+# Load the input files of a matching run, the license requirements are read from the MO Ranking file's folder
+def load_inputs(hod_rankings_path, officer_choices_path, GDFM_list_path):
+    posting_license_requirement_path = os.path.join(os.path.dirname(officer_choices_path), 'Posting License Requirements.xlsx')
+
     # Load data from Excel files.
-    hod_rankings = pd.read_excel(hod_rankings_path)
-    officer_choices = pd.read_excel(officer_choices_path, dtype={'Employee ID': str})
-    posting_license_requirement = pd.read_excel(posting_license_requirement_path)
-    GDFM1 = pd.read_excel(GDFM_list_path, sheet_name=0, header=1, dtype={'Employee ID': str})
-    GDFM2 = pd.read_excel(GDFM_list_path, sheet_name=1, header=1, dtype={'Employee ID': str})
-
-    #Ensure employee ID data type in HOD Rankings is formatted as string
-    match_cols = [col for col in hod_rankings.columns if 'Match' in col]
-    hod_rankings[match_cols] = hod_rankings[match_cols].astype(str).replace('nan', '')
-    
+    hod_rankings, rankings = load_hod_rankings(hod_rankings_path)
+    officer_choices = Excel_Cache.read_excel(officer_choices_path, dtype={'Employee ID': str})
+    posting_license_requirement, GDFM1, GDFM2 = load_license_and_GDFM(posting_license_requirement_path, GDFM_list_path)
+    return hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2
+
+# Run the license check, GDFM prioritisation and both matching rounds, returning the result tables and exceptions
+# hod_rankings are the departments and rankings the RankingStore of their HOD rankings
+# report is the run's RunProfile, which receives the stages and their row counts
+# recorder is a Match_Events.EventRecorder that logs the matching rounds' proposals, None when not recording
+def run_matching(hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2, report, recorder=None):
+    no_choice_officers, officer_choices = prepare_choices(officer_choices, posting_license_requirement, report)
+    return run_prepared_matching(hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2, report, recorder)
+
+# Split off the officers without choices and check the other officers' choices against the license requirements,
+# returning the officers without choices and the license-checked choices
+# Neither depends on the vacancies or the GDFM list, so Scenario_Runner prepares the choices once for all scenarios
+def prepare_choices(officer_choices, posting_license_requirement, report):
     # Identify choice columns
     choice_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
 
     # Handle officers who didn't rank any departments
     no_choice_columns = ['Employee Name', 'Employee ID'] + choice_columns
     no_choice_officers = officer_choices[officer_choices[choice_columns].isnull().all(axis=1)][no_choice_columns]
-    no_choice_officers.to_csv(no_choice_officers_path, sep=',', index=False)
 
     # Remove officers with no choices from the original DataFrame
     officer_choices = officer_choices[~officer_choices[choice_columns].isnull().all(axis=1)]
 
+    #Filter out based on license requirements
+    report('Checking license requirements')
+    officer_choices['Registration Type'] = officer_choices['Registration Type'].replace(['Provisional'], 'Full') #Assume all Provisional licenses will promote to Full licenses
+    officer_choices = check_license(officer_choices, posting_license_requirement)
+    report.record_rows(officers=len(officer_choices), choices=officer_choices[choice_columns].notna().to_numpy().sum())
+    return no_choice_officers, officer_choices
+
+# GDFM prioritisation and both matching rounds on the choices prepared by prepare_choices
+# base_table is a CodeTable of the prepared choices and all departments to derive this run's table from, instead of
+# encoding the IDs and PMS Codes again, None to build the table here
+def run_prepared_matching(hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2, report, recorder=None, base_table=None):
+    choice_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
+
     # Handle departments with no initial vacancies.
     no_vacancies_columns = ['Postings', 'PMS Code', 'Vacancies']
     no_vacancies_departments = hod_rankings[hod_rankings['Vacancies'] == 0][no_vacancies_columns]
-    no_vacancies_departments.to_csv(no_vacancies_departments_path, sep=',', index=False)
 
     # Remove departments with no vacancies from the original DataFrame.
     hod_rankings = hod_rankings[hod_rankings['Vacancies'] > 0]
 
-    #Filter out based on license requirements
-    officer_choices['Registration Type'] = officer_choices['Registration Type'].replace(['Provisional'], 'Full') #Assume all Provisional licenses will promote to Full licenses
-    officer_choices = check_license(officer_choices, posting_license_requirement)
-
     #Bump selected GDFM candidates
-    hod_rankings, officer_choices = GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings)
+    report('Prioritising GDFM candidates')
+    rankings, officer_choices = GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings, rankings)
+    report.record_rows(prioritised_officers=(officer_choices['Comment'] != '').sum())
+
+    # Encode the Employee IDs, PMS Codes and preference grids once for both rounds and the verification
+    report('Encoding IDs and PMS Codes')
+    if base_table is None:
+        table = Code_Table.CodeTable(officer_choices, hod_rankings, choice_columns, rankings)
+    else:
+        # GDFM prioritisation only reorders the polyclinic rankings, whose entries are encoded again
+        table = base_table.derive(officer_choices, hod_rankings, rankings, polyclinic_postings)
+    report.record_rows(officers=len(table.officer_ids), departments=len(table.department_codes), rankings=len(table.ranked_officers))
+    if recorder is not None:
+        recorder.label(table.officer_id_values, table.department_code_values)
+
+    # Report the choices the matching will skip, instead of finding unknown PMS Codes while matching
+    report('Validating choices')
+    exceptions = validate_choices(table, officer_choices, no_vacancies_departments, choice_columns)
+    status_counts = exceptions['Status'].value_counts()
+    report.record_rows(**{status.lower().replace(' ', '_'): status_counts.get(status, 0) for status in choice_statuses[1:]})
+
+    # Cut the round 1 lists to the pairs that list each other, so the matching skips proposals bound to be rejected
+    report('Pruning preference lists')
+    market = Match_Engine.compile_round_1(hod_rankings, rankings, officer_choices, choice_columns, table)
+    report.record_rows(**market.pruning)
 
     # Call both rounds of matching and combine the final matches
-    mutualmatch_df, first_unmatched_officers_df, first_departments_with_vacancies_df, exceptions = gale_shapley_1(hod_rankings, officer_choices, no_vacancies_departments)
-    second_match_df, second_unmatched_officers_df, second_departments_with_vacancies_df = gale_shapley_2(first_unmatched_officers_df,first_departments_with_vacancies_df, hod_rankings)
+    report('Matching round 1')
+    mutualmatch_df, first_unmatched_officers_df, first_departments_with_vacancies_df = gale_shapley_1(hod_rankings, rankings, officer_choices, table, market, recorder)
+    report.record_rows(officers=len(officer_choices), departments=len(hod_rankings), matches=len(mutualmatch_df), unmatched=len(first_unmatched_officers_df), **(market.sharding or {}))
+    if recorder is not None:
+        report.record_rows(events=len(recorder.round_events()))
+    report('Matching round 2')
+    market_2 = Match_Engine.compile_round_2(first_unmatched_officers_df, first_departments_with_vacancies_df, choice_columns, table)
+    second_match_df, second_unmatched_officers_df, second_departments_with_vacancies_df = gale_shapley_2(first_unmatched_officers_df,first_departments_with_vacancies_df, hod_rankings, table, market_2, recorder)
+    report.record_rows(officers=len(first_unmatched_officers_df), departments=len(first_departments_with_vacancies_df), matches=len(second_match_df), unmatched=len(second_unmatched_officers_df), **(market_2.sharding or {}))
+    if recorder is not None:
+        report.record_rows(events=len(recorder.round_events()))
+    for round_name, round_market in (('Round 1', market), ('Round 2', market_2)):
+        if round_market.sharding:
+            print(Match_Shards.sharding_summary(round_name, round_market.sharding))
     combined_match_df = pd.concat([mutualmatch_df, second_match_df], axis=0)
     #combined_match_df = pd.concat([preallocated_matches_df, combined_match_df], axis=0)
     combined_match_df=combined_match_df.sort_values(by=['PMS Code','Employee ID'])
 
-    # Write the exceptions to a new txt file.
-    with open(exceptions_path, 'w') as f:
-        for officer, department in exceptions:
-            f.write(f"Employee ID: {officer}, Department PMS Code: {department}\n")
-
-    # Write outputs to a new Excel files.
-    mutualmatch_df.to_excel(mutualmatches_path, index=False)
-    second_unmatched_officers_df.to_excel(second_unmatched_officers_path, index=False)
-    second_departments_with_vacancies_df.to_excel(second_departments_with_vacancies_path)
-    combined_match_df.to_excel(combined_match_path, index=False)
+    # Check the final matches for blocking pairs, over-filled departments and license violations
+    report('Verifying matches')
+    verification = Match_Verifier.verify_matching(hod_rankings, rankings, officer_choices, mutualmatch_df, second_match_df, posting_license_requirement, license_hierarchy, table)
+    counts = Match_Verifier.verification_counts(verification)
+    report.record_rows(**{check.lower().replace(' ', '_') + 's': count for check, count in counts.items()})
+    if len(verification):
+        print("Match verification failed: " + ", ".join(f"{count} {check.lower()}(s)" for check, count in counts.items() if count))
+
+    tables = {
+        'No Choice Officers': no_choice_officers,
+        'No Vacancies Departments': no_vacancies_departments,
+        'Mutual Matches': mutualmatch_df,
+        'Unmatched Officers': second_unmatched_officers_df,
+        'Departments with Vacancies': second_departments_with_vacancies_df,
+        'Final Matches': combined_match_df,
+        'Match Verification': verification,
+    }
+    return tables, exceptions
+
+def main(hod_rankings_path, officer_choices_path, GDFM_list_path, output_formats=('excel',), progress=None):
+    with Run_Profile.RunProfile('Match_Algo', progress, cprofile_stages=['Matching round 1', 'Matching round 2']) as report:
+
+        # Preparing the output folder
+        output_folder = os.path.dirname(officer_choices_path) 
+        output_folder_path = os.path.join(output_folder, 'output')
+        if not os.path.exists(output_folder_path):
+            os.makedirs(output_folder_path)
+
+        report('Loading input files')
+        hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2 = load_inputs(hod_rankings_path, officer_choices_path, GDFM_list_path)
+        report.record_rows(hod_rankings=len(hod_rankings), rankings=len(rankings), officer_choices=len(officer_choices), license_requirements=len(posting_license_requirement), GDFM1=len(GDFM1), GDFM2=len(GDFM2))
+
+        recorder = Match_Events.run_recorder()
+        tables, exceptions = run_matching(hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2, report, recorder)
+
+        # Write the outputs and exceptions in the requested formats, and the event log when recording
+        report('Writing outputs')
+        Output_Writer.write_outputs(output_folder_path, tables, exceptions, output_formats)
+        report.record_rows(rows=sum(len(table) for table in tables.values()) + len(exceptions))
+        if recorder is not None:
+            Match_Events.write_events(output_folder_path, recorder.log())
+            report.record_rows(events=len(recorder))
+        report.write(output_folder_path)
+        return output_folder_path
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--HODRankFile', type=str, required=True, help="The file name of HOD Rankings Consolidated")
+    parser.add_argument('--HODRankFile', type=str, required=True, help="The file name of HOD Rankings Consolidated, or of the HOD Rankings Store written next to it")
     parser.add_argument('--MORankFile', type=str, required=True, help="The file name of MO Ranking Consolidated")
     parser.add_argument('--GDFM', type=str, required=True, help="The file name of GDFM List")
+    parser.add_argument('--output-format', nargs='+', default=['excel'], choices=Output_Writer.output_formats, help="Output formats to write, defaults to the separate Excel files")
+    Excel_Cache.add_cache_arguments(parser)
+    Match_Shards.add_shard_arguments(parser)
+    Match_Events.add_event_arguments(parser)
+    Run_Profile.add_profile_arguments(parser)
     args = parser.parse_args()
-    main(args.HODRankFile, args.MORankFile, args.GDFM)
+    Excel_Cache.apply_cache_arguments(args)
+    Match_Shards.apply_shard_arguments(args)
+    Match_Events.apply_event_arguments(args)
+    Run_Profile.apply_profile_arguments(args)
+    main(args.HODRankFile, args.MORankFile, args.GDFM, args.output_format)
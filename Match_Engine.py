@@ -0,0 +1,434 @@
+"""
+README:
+Integer-indexed deferred acceptance engine used by the matching rounds in Match_Algo.
+Employee IDs and PMS Codes are mapped to dense integers once, so the proposal loop only works on
+lists of ints, one rank lookup per department and a bounded worst-first heap of tentative matches.
+Round 1 preference lists and HOD rankings are pruned to the pairs that list each other before matching, so no
+proposal is made that the department is bound to reject.
+"""
+
+# import necessary libraries
+import heapq
+from collections import deque
+import numpy as np
+import pandas as pd
+from Code_Table import CodeTable
+from Match_Events import ACCEPTED, DISPLACED, REJECTED, UNMATCHED
+
+
+# Compiled form of one matching round
+class CompiledMarket:
+    def __init__(self, officer_ids, department_codes, vacancies, prefs, ranks, queue):
+        self.officer_ids = officer_ids            # officer index -> Employee ID
+        self.department_codes = department_codes  # department index -> PMS Code
+        self.vacancies = vacancies                # department index -> vacancies (as given in the input)
+        self.prefs = prefs                        # officer index -> list of department indices
+        self.ranks = ranks                        # department index -> {officer index: priority}, lower is better
+        self.queue = queue                        # officer indices in proposal order
+        self.applicants = None                    # department index -> officers listing it, built by department_applicants
+        self.table = None                         # CodeTable the round 1 market was compiled from
+        self.pruning = None                       # Pruning counts of the round 1 market, see prune_round_1
+        self.sharding = None                      # Sharding counts when the market was matched by Match_Shards
+
+
+# Result of running deferred acceptance on a CompiledMarket
+class MatchState:
+    def __init__(self, tentative, unmatched, displaced, sequence=0):
+        self.tentative = tentative    # department index -> heap of (-priority, sequence, officer index)
+        self.unmatched = unmatched    # officer indices in the order they ran out of choices
+        self.displaced = displaced    # department indices that have rejected a tentative match
+        self.sequence = sequence      # next acceptance sequence number
+
+    def copy(self):
+        return MatchState([list(held) for held in self.tentative], list(self.unmatched), set(self.displaced), self.sequence)
+
+    # Officer index -> department index of every matched officer
+    def assignment(self):
+        return {officer: department for department, held in enumerate(self.tentative) for _, _, officer in held}
+
+    # Matched officer indices of a department, in acceptance order
+    # With sort_displaced, departments that ever displaced an officer are listed by priority instead,
+    # matching round 2 which keeps such departments' lists sorted
+    def held_officers(self, department, sort_displaced=False):
+        held = self.tentative[department]
+        if sort_displaced and department in self.displaced:
+            return [officer for _, _, officer in sorted(held, key=lambda x: -x[0])]
+        return [officer for _, _, officer in sorted(held, key=lambda x: x[1])]
+
+
+# Map each value in labels to its position in codes, -1 when not found
+def index_labels(codes, labels):
+    return pd.Index(codes, dtype=object).get_indexer(pd.Index(labels, dtype=object))
+
+
+# Build the officer preference lists from the encoded choice grid, keeping the choices marked valid in choice order
+def compile_officer_prefs(codes, valid):
+    flat = codes[valid].tolist()
+    ends = np.cumsum(valid.sum(axis=1)).tolist()
+    return [flat[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+# Mask of the keys found in an ascending array of keys
+def sorted_contains(sorted_keys, keys):
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    found = np.searchsorted(sorted_keys, keys)
+    return sorted_keys[np.minimum(found, len(sorted_keys) - 1)] == keys
+
+
+# Prune the round 1 lists to mutually acceptable pairs in one pass over the encoded grids: each officer's choices are
+# cut to the departments whose HOD ranked them, and each department's ranking to the officers who chose it.
+# A proposal to a department that did not rank the officer is always rejected, and a ranked officer who did not choose
+# the department never proposes, so the matching is unchanged while the proposal loop skips those pairs.
+# Choices of PMS Codes not in the market (no vacancy, license requirement, blacklisted, unknown) and choices after the
+# first blank are left out as well, they are reported by Match_Algo.validate_choices before matching.
+# Returns the officer preferences, the department rank lookups and the pruning counts for the run profile
+def prune_round_1(table):
+    n_officers, n_departments = len(table.officer_ids), len(table.department_codes)
+
+    # Listed (department, officer) pairs of the choice cells in choice order
+    listed = (table.choice_codes >= 0) & table.choice_listed
+    officers, positions = np.nonzero(listed)
+    listed_keys = table.choice_codes[officers, positions].astype(np.int64) * n_officers + officers
+
+    # HOD ranking entries of officers who chose the department, the first listing of an officer decides their position
+    known = table.ranked_officers >= 0
+    hod_positions = table.ranked_positions[known]
+    ranked_keys = table.ranked_departments[known].astype(np.int64) * n_officers + table.ranked_officers[known]
+    ranked = sorted_contains(np.sort(listed_keys), ranked_keys)
+    kept_keys, first = np.unique(ranked_keys[ranked], return_index=True)
+    kept_positions = hod_positions[ranked][first].tolist()
+
+    # Choice cells of departments that ranked the officer
+    chosen = sorted_contains(kept_keys, listed_keys)
+    mutual = np.zeros(listed.shape, dtype=bool)
+    mutual[officers[chosen], positions[chosen]] = True
+    prefs = compile_officer_prefs(table.choice_codes, mutual)
+
+    # Department rank lookups of the kept pairs, the keys are in department order
+    kept_officers = (kept_keys % n_officers).tolist()
+    ends = np.cumsum(np.bincount(kept_keys // n_officers, minlength=n_departments)).tolist()
+    ranks = [dict(zip(kept_officers[start:end], kept_positions[start:end])) for start, end in zip([0] + ends[:-1], ends)]
+
+    counts = {
+        'listed_choices': len(listed_keys),
+        'pruned_choices': len(listed_keys) - int(chosen.sum()),
+        'ranking_entries': len(ranked_keys),
+        'pruned_ranking_entries': len(ranked_keys) - int(ranked.sum()),
+    }
+    return prefs, ranks, counts
+
+
+# Compile the round 1 market on the mutually acceptable pairs: officers propose in file order, HOD rankings decide
+# Officers and departments are indexed by their codes in the CodeTable, which is built here unless given
+def compile_round_1(hod_rankings, rankings, officer_choices, preference_columns, table=None):
+    if table is None:
+        table = CodeTable(officer_choices, hod_rankings, preference_columns, rankings)
+    queue = table.encode_officers(officer_choices['Employee ID'].to_numpy(dtype=object)).tolist()
+    vacancies = table.department_column(hod_rankings, 'Vacancies').tolist()
+    prefs, ranks, counts = prune_round_1(table)
+
+    market = CompiledMarket(table.officer_ids, table.department_codes, vacancies, prefs, ranks, queue)
+    market.table = table
+    market.pruning = counts
+    return market
+
+
+# Round 2 preferences and ranks from an encoded choice grid: departments rank by (officer's choice rank, Employee ID)
+def compile_round_2_preferences(officer_ids, codes, blanks, n_departments):
+    # Employee ID order breaks ties between officers who ranked a department equally
+    n_officers = len(officer_ids)
+    id_order = np.empty(n_officers, dtype=np.int64)
+    id_order[sorted(range(n_officers), key=officer_ids.__getitem__)] = np.arange(n_officers)
+
+    # A blank choice ends the list, PMS Codes without remaining vacancies are skipped but still count towards the rank
+    n_choices = codes.shape[1]
+    first_blank = np.where(blanks.any(axis=1), blanks.argmax(axis=1), n_choices)
+    valid = (codes >= 0) & (np.arange(n_choices) < first_blank[:, None])
+    priority = np.arange(n_choices)[None, :] * n_officers + id_order[:, None]
+
+    prefs = [[code for code, keep in zip(row_codes, row_valid) if keep] for row_codes, row_valid in zip(codes.tolist(), valid.tolist())]
+    ranks = [{} for _ in range(n_departments)]
+    officer_idx, choice_idx = np.nonzero(valid)
+    for officer, department, key in zip(officer_idx.tolist(), codes[officer_idx, choice_idx].tolist(), priority[officer_idx, choice_idx].tolist()):
+        ranks[department].setdefault(officer, key)
+    return prefs, ranks
+
+
+# Compile the round 2 market: departments rank by (officer's choice rank, Employee ID)
+# With the round 1 CodeTable, the choices are taken from its encoded grid instead of being looked up again
+def compile_round_2(first_unmatched_officers_df, first_departments_with_vacancies_df, preference_columns, table=None):
+    officer_rows = {officer: row for row, officer in enumerate(first_unmatched_officers_df['Employee ID'].tolist())}
+    officer_ids = list(officer_rows)
+    officer_index = {officer: i for i, officer in enumerate(officer_ids)}
+    queue = [officer_index[officer] for officer in first_unmatched_officers_df['Employee ID'].tolist()]
+
+    department_vacancies = first_departments_with_vacancies_df.set_index('Department')['Remaining Vacancies'].to_dict()
+    department_codes = first_departments_with_vacancies_df['Department'].drop_duplicates().tolist()
+    vacancies = [department_vacancies[department] for department in department_codes]
+
+    if table is None:
+        choice_values = first_unmatched_officers_df[preference_columns].to_numpy(dtype=object)[list(officer_rows.values())]
+        codes = index_labels(department_codes, choice_values.ravel()).reshape(choice_values.shape)
+        blanks = pd.isna(choice_values)
+    else:
+        # Round 1 department code -> round 2 department index, the extra last entry maps missing codes to -1
+        round_2_index = np.full(len(table.department_codes) + 1, -1, dtype=np.int32)
+        round_2_index[table.encode_departments(department_codes)] = np.arange(len(department_codes))
+        officers = table.encode_officers(officer_ids)
+        codes = round_2_index[table.choice_codes[officers]]
+        blanks = table.choice_blanks[officers]
+    prefs, ranks = compile_round_2_preferences(officer_ids, codes, blanks, len(department_codes))
+    return CompiledMarket(officer_ids, department_codes, vacancies, prefs, ranks, queue)
+
+
+# Compile round 2 over every round 1 officer and department, so officers can join or leave round 2 when rematching
+# Only officers unmatched in round 1 propose, and departments without remaining vacancies have no seats
+def compile_round_2_from_round_1(market, state):
+    table = market.table
+    prefs, ranks = compile_round_2_preferences(market.officer_ids, table.choice_codes, table.choice_blanks, len(market.department_codes))
+    vacancies = [max(vacancies - len(held), 0) for vacancies, held in zip(market.vacancies, state.tentative)]
+    unmatched = set(state.unmatched)
+    queue = [officer for officer in market.queue if officer in unmatched]
+    return CompiledMarket(market.officer_ids, market.department_codes, vacancies, prefs, ranks, queue)
+
+
+# Officer-proposing deferred acceptance over a compiled market
+# recorder is a Match_Events.EventRecorder receiving every proposal, None when not recording
+def run_deferred_acceptance(market, recorder=None):
+    state = MatchState([[] for _ in market.department_codes], [], set())
+    return resume_deferred_acceptance(market, state, market.queue, recorder)
+
+
+# Continue deferred acceptance from a state with the given officers proposing, updating the state in place
+def resume_deferred_acceptance(market, state, officers, recorder=None):
+    prefs = market.prefs
+    ranks = market.ranks
+    vacancies = market.vacancies
+    record = recorder.record if recorder is not None else None
+
+    tentative = state.tentative
+    officers_list = deque(officers)
+    unmatched = state.unmatched
+    displaced = state.displaced
+    sequence = state.sequence
+
+    while officers_list:
+        officer = officers_list.popleft()
+
+        # Preferences only list departments that rank the officer
+        for department in prefs[officer]:
+            rank = ranks[department][officer]
+            held = tentative[department]
+            if vacancies[department] > len(held):
+                # There's an available vacancy
+                heapq.heappush(held, (-rank, sequence, officer))
+                sequence += 1
+                if record is not None:
+                    record(officer, department, ACCEPTED)
+                break
+            # No vacancy available, displace the current worst officer if this officer is preferred
+            if held and rank < -held[0][0]:
+                current_worst_officer = heapq.heapreplace(held, (-rank, sequence, officer))[2]
+                sequence += 1
+                displaced.add(department)
+                officers_list.append(current_worst_officer)
+                if record is not None:
+                    record(officer, department, DISPLACED, current_worst_officer)
+                break
+            if record is not None:
+                record(officer, department, REJECTED)
+        else:
+            # Officer could not be matched, add to unmatched list
+            unmatched.append(officer)
+            if record is not None:
+                record(officer, -1, UNMATCHED)
+
+    state.sequence = sequence
+    return state
+
+
+# Rematch a stable matching after a change to the market, returning the updated market and state
+# The result is the matching a from-scratch run on the changed market gives, found in two phases:
+#   A. Fewer vacancies, new officers and the loss of a held seat through a blacklisted pair only justify more
+#      rejections, so the previous state is a valid intermediate state of deferred acceptance and the run simply
+#      resumes with the rejected and new officers proposing.
+#   B. Expansions can only improve officers' matches: seats freed by phase A, added vacancies, and every department a
+#      withdrawn officer or blacklisted pair proposed to, whose earlier rejections that proposal may have caused.
+#      Only departments reachable from an expanded department through officers it rejected can change, so deferred
+#      acceptance is rerun on that closure alone while all other departments keep their matches.
+def rematch(market, state, removed_officers=(), added_officers=(), vacancy_changes=None, removed_pairs=()):
+    state = state.copy()
+    previous_prefs = market.prefs
+    previous_proposers = set(market.queue)
+    previous_vacancies = market.vacancies
+    prefs = list(market.prefs)
+    vacancies = list(market.vacancies)
+    for department, new_vacancies in (vacancy_changes or {}).items():
+        vacancies[department] = new_vacancies
+    removed_officers = set(removed_officers)
+    added_officers = [officer for officer in added_officers if officer not in removed_officers]
+    queue = [officer for officer in market.queue if officer not in removed_officers] + added_officers
+    applicants = market.applicants  # Still a superset of each department's applicants after the change
+    market = CompiledMarket(market.officer_ids, market.department_codes, vacancies, prefs, market.ranks, queue)
+    market.applicants = applicants
+
+    # Take withdrawn officers and unacceptable pairs out of the market and out of the departments holding them
+    # Withdrawn officers keep their preferences but no longer propose, so round 2 can take them back later
+    assignment = state.assignment()
+    freed = {}  # department index -> held officers to take out
+    proposing = []
+    proposed_to = set()  # departments that had a proposal taken out of the market
+    for officer in removed_officers:
+        if officer in assignment:
+            freed.setdefault(assignment[officer], set()).add(officer)
+        proposed_to.update(proposed_departments(previous_prefs, previous_proposers, officer, assignment))
+    for officer, department in removed_pairs:
+        if department in proposed_departments(previous_prefs, previous_proposers, officer, assignment):
+            proposed_to.add(department)
+        prefs[officer] = [code for code in prefs[officer] if code != department]
+        if assignment.get(officer) == department and officer not in removed_officers:
+            freed.setdefault(department, set()).add(officer)
+            proposing.append(officer)
+    state.unmatched = [officer for officer in state.unmatched if officer not in removed_officers]
+
+    # Phase A: a department keeps at most the seats its remaining officers fill, rejecting its worst officers
+    # when its vacancies were cut below that
+    phase_a_vacancies = [min(new_vacancies, old_vacancies) for new_vacancies, old_vacancies in zip(vacancies, previous_vacancies)]
+    for department, removed in freed.items():
+        held = state.tentative[department] = [entry for entry in state.tentative[department] if entry[2] not in removed]
+        heapq.heapify(held)
+        phase_a_vacancies[department] = min(vacancies[department], previous_vacancies[department] - len(removed))
+    for department, held in enumerate(state.tentative):
+        while len(held) > phase_a_vacancies[department]:
+            proposing.append(heapq.heappop(held)[2])
+            state.displaced.add(department)
+    phase_a_market = CompiledMarket(market.officer_ids, market.department_codes, phase_a_vacancies, prefs, market.ranks, queue)
+    resume_deferred_acceptance(phase_a_market, state, proposing + added_officers)
+
+    # Phase B: rerun the closure of the departments with more seats than phase A allowed or a proposal taken out
+    expanded = [department for department in range(len(vacancies)) if vacancies[department] > phase_a_vacancies[department] or department in proposed_to]
+    if expanded:
+        rematch_expansion(market, state, expanded)
+    return market, state
+
+
+# Departments an officer proposed to in a run: their preferences up to their match, or all of them when unmatched,
+# none when they were not one of the proposers
+def proposed_departments(prefs, proposers, officer, assignment):
+    if officer not in proposers:
+        return []
+    officer_prefs = prefs[officer]
+    if officer in assignment:
+        return officer_prefs[:officer_prefs.index(assignment[officer]) + 1]
+    return officer_prefs
+
+
+# Officers listing each department, built once per market and used to find the officers a department rejected
+def department_applicants(market):
+    if market.applicants is None:
+        market.applicants = [[] for _ in market.department_codes]
+        for officer, officer_prefs in enumerate(market.prefs):
+            for department in set(officer_prefs):
+                if department >= 0:
+                    market.applicants[department].append(officer)
+    return market.applicants
+
+
+# Phase B of rematch: rerun deferred acceptance on the departments that can gain from the expanded departments
+def rematch_expansion(market, state, expanded):
+    prefs = market.prefs
+    ranks = market.ranks
+    participants = set(market.queue)
+    assignment = state.assignment()
+    applicants = department_applicants(market)
+
+    # A department can only change if an officer it rejected could leave their current department, so follow
+    # (rejecting department -> rejected officer's department) links from the expanded departments
+    closure = set(expanded)
+    frontier = deque(expanded)
+    rejected_unmatched = set()
+    while frontier:
+        department = frontier.popleft()
+        for officer in applicants[department]:
+            if officer not in participants or officer not in ranks[department] or department not in prefs[officer]:
+                continue
+            current = assignment.get(officer)
+            if current is None:
+                rejected_unmatched.add(officer)
+            elif current not in closure and prefs[officer].index(department) < prefs[officer].index(current):
+                closure.add(current)
+                frontier.append(current)
+
+    # Officers matched in the closure and unmatched officers it rejected propose again, within the closure only
+    officers = sorted(rejected_unmatched.union(*({officer for _, _, officer in state.tentative[department]} for department in closure)))
+    closure_prefs = {officer: [department for department in prefs[officer] if department in closure] for officer in officers}
+    closure_market = CompiledMarket(market.officer_ids, market.department_codes, market.vacancies, closure_prefs, ranks, officers)
+    for department in closure:
+        state.tentative[department] = []
+    state.displaced.update(closure)
+
+    unmatched = state.unmatched
+    state.unmatched = []
+    resume_deferred_acceptance(closure_market, state, officers)
+    still_unmatched = set(state.unmatched)
+    state.unmatched = [officer for officer in unmatched if officer not in rejected_unmatched or officer in still_unmatched]
+    state.unmatched += [officer for officer in officers if officer in still_unmatched and officer not in rejected_unmatched]
+
+
+# Both matching rounds, kept so they can be rematched after small changes to the inputs
+class MatchingRounds:
+    def __init__(self, round_1_market, round_1_state, round_2_market, round_2_state):
+        self.round_1_market = round_1_market
+        self.round_1_state = round_1_state
+        self.round_2_market = round_2_market
+        self.round_2_state = round_2_state
+
+    # Employee ID -> PMS Code of every officer matched in either round
+    def final_matches(self):
+        officer_ids = self.round_1_market.officer_ids
+        department_codes = self.round_1_market.department_codes
+        matches = {officer_ids[officer]: department_codes[department] for officer, department in self.round_1_state.assignment().items()}
+        matches.update({officer_ids[officer]: department_codes[department] for officer, department in self.round_2_state.assignment().items()})
+        return matches
+
+    # Employee IDs of the officers unmatched after round 2
+    def unmatched_officers(self):
+        return sorted({self.round_1_market.officer_ids[officer] for officer in self.round_2_state.unmatched})
+
+
+def match_rounds(hod_rankings, rankings, officer_choices, preference_columns):
+    round_1_market = compile_round_1(hod_rankings, rankings, officer_choices, preference_columns)
+    round_1_state = run_deferred_acceptance(round_1_market)
+    round_2_market = compile_round_2_from_round_1(round_1_market, round_1_state)
+    round_2_state = run_deferred_acceptance(round_2_market)
+    return MatchingRounds(round_1_market, round_1_state, round_2_market, round_2_state)
+
+
+# Rematch both rounds after officers withdraw, vacancies change or (Employee ID, PMS Code) pairs are blacklisted
+# Round 1 is rematched with the change itself, and round 2 with the officers and remaining vacancies round 1 changed
+def rematch_rounds(rounds, removed_officers=(), vacancy_changes=None, blacklisted_pairs=()):
+    officer_index = {officer: i for i, officer in enumerate(rounds.round_1_market.officer_ids)}
+    department_index = {department: i for i, department in enumerate(rounds.round_1_market.department_codes)}
+    for officer in list(removed_officers) + [officer for officer, _ in blacklisted_pairs]:
+        if officer not in officer_index:
+            raise ValueError(f"Officer {officer} is not in the matching")
+    for department in (vacancy_changes or {}):
+        if department not in department_index:
+            raise ValueError(f"PMS Code {department} is not in the round 1 matching, changing its vacancies needs a full run")
+
+    removed = {officer_index[officer] for officer in removed_officers}
+    vacancies = {department_index[department]: value for department, value in (vacancy_changes or {}).items()}
+    pairs = [(officer_index[officer], department_index[department]) for officer, department in blacklisted_pairs if department in department_index]
+    round_1_market, round_1_state = rematch(rounds.round_1_market, rounds.round_1_state, removed, (), vacancies, pairs)
+
+    # Round 2 gains the officers round 1 no longer matches and loses those it now matches
+    previous_unmatched = set(rounds.round_1_state.unmatched)
+    unmatched = set(round_1_state.unmatched)
+    added = list(dict.fromkeys(officer for officer in round_1_market.queue if officer in unmatched and officer not in previous_unmatched))
+    left = (previous_unmatched - unmatched) | (removed & previous_unmatched)
+    remaining_vacancies = [max(vacancies - len(held), 0) for vacancies, held in zip(round_1_market.vacancies, round_1_state.tentative)]
+    round_2_vacancies = {department: value for department, value in enumerate(remaining_vacancies) if value != rounds.round_2_market.vacancies[department]}
+    round_2_market, round_2_state = rematch(rounds.round_2_market, rounds.round_2_state, left, added, round_2_vacancies, pairs)
+
+    return MatchingRounds(round_1_market, round_1_state, round_2_market, round_2_state)
@@ -0,0 +1,211 @@
+"""
+README:
+Optional log of the proposals, displacements and rejections of the matching rounds, so the outcome of a disputed
+posting can be traced back.
+While recording, deferred acceptance adds one record per proposal to a preallocated NumPy structured array:
+    round      - matching round, 1 or 2
+    officer    - code of the proposing officer in the run's CodeTable
+    department - code of the department proposed to, -1 for an officer who ran out of choices
+    event      - Accepted (took a free seat), Displaced (took the seat of the displaced officer), Rejected or Unmatched
+    displaced  - code of the officer who lost their seat, -1 otherwise
+Records are staged as flat ints in a short list and copied into the array in chunks, and the array grows by doubling
+when full. With recording off (the default) the proposal loop only checks that there is no recorder.
+Match_Algo --record-events writes the log as 'Match Events.parquet' in the output folder (a pickle when pyarrow is not
+installed), with the Employee IDs and PMS Codes stored once as categories. The history of one officer or department is
+rebuilt from an index of the log:
+    python Match_Events.py "output/Match Events.parquet" --employee-id 100123
+    python Match_Events.py "output/Match Events.parquet" --pms-code P00042
+"""
+
+# import necessary libraries
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+event_types = ['Accepted', 'Displaced', 'Rejected', 'Unmatched']
+ACCEPTED, DISPLACED, REJECTED, UNMATCHED = range(len(event_types))
+event_dtype = np.dtype([('round', np.int8), ('officer', np.int32), ('department', np.int32), ('event', np.int8), ('displaced', np.int32)])
+events_file_name = 'Match Events.parquet'
+history_columns = ['Round', 'Event', 'Employee ID', 'PMS Code', 'Displaced Employee ID']
+
+# Recording settings, changed through configure() or the --record-events script flag
+settings = {
+    'enabled': False,
+    'capacity': 1 << 16,
+}
+
+def configure(enabled=None, capacity=None):
+    if enabled is not None:
+        settings['enabled'] = enabled
+    if capacity is not None:
+        settings['capacity'] = capacity
+
+# Add the recording flag to a script's argument parser and apply it once parsed
+def add_event_arguments(parser):
+    parser.add_argument('--record-events', action='store_true', help="Write a log of every proposal, displacement and rejection of the matching rounds")
+
+def apply_event_arguments(args):
+    configure(enabled=args.record_events)
+
+# Recorder of a new run when recording is enabled, None otherwise
+def run_recorder():
+    return EventRecorder() if settings['enabled'] else None
+
+class EventRecorder:
+    # chunk_size is the number of staged fields, five per record, copied into the array at a time
+    def __init__(self, capacity=None, chunk_size=1 << 15):
+        self.events = np.zeros(capacity or settings['capacity'], dtype=event_dtype)
+        self.count = 0
+        self.pending = []           # fields of the records not yet copied into events, one after another
+        self.chunk_size = chunk_size
+        self.round = 0
+        self.round_start = 0
+        self.officer_ids = None     # officer code -> Employee ID, set by label
+        self.department_codes = None
+
+    def __len__(self):
+        return self.count + len(self.pending) // len(event_dtype)
+
+    def start_round(self, round_number):
+        self.flush()
+        self.round = round_number
+        self.round_start = self.count
+
+    def record(self, officer, department, event, displaced=-1):
+        pending = self.pending
+        pending += (self.round, officer, department, event, displaced)
+        if len(pending) >= self.chunk_size:
+            self.flush()
+
+    # Copy the staged records into the array, doubling it when they do not fit
+    def flush(self):
+        if not self.pending:
+            return
+        fields = np.array(self.pending, dtype=np.int32).reshape(-1, len(event_dtype))
+        events = np.empty(len(fields), dtype=event_dtype)
+        for column, name in enumerate(event_dtype.names):
+            events[name] = fields[:, column]
+        self.append(events)
+        self.pending = []
+
+    def append(self, events):
+        if self.count + len(events) > len(self.events):
+            grown = np.zeros(max(2 * len(self.events), self.count + len(events)), dtype=event_dtype)
+            grown[:self.count] = self.events[:self.count]
+            self.events = grown
+        self.events[self.count:self.count + len(events)] = events
+        self.count += len(events)
+
+    # Records of the current round, which are renumbered by translate_round
+    def round_events(self):
+        self.flush()
+        return self.events[self.round_start:self.count]
+
+    # Renumber the current round's records from a round market's indices to the codes of the run's CodeTable
+    def translate_round(self, officer_codes, department_codes):
+        events = self.round_events()
+        events['officer'] = officer_codes[events['officer']]
+        for field, codes in (('department', department_codes), ('displaced', officer_codes)):
+            known = events[field] >= 0
+            events[field][known] = codes[events[field][known]]
+
+    # Employee IDs and PMS Codes of the codes the records use
+    def label(self, officer_ids, department_codes):
+        self.officer_ids = officer_ids
+        self.department_codes = department_codes
+
+    def log(self):
+        self.flush()
+        return EventLog(self.events[:self.count], self.officer_ids, self.department_codes)
+
+# Records of a sub-market's recorder renumbered to the market it was cut from, e.g. a shard of Match_Shards
+def translate_events(events, officers, departments):
+    officers, departments = np.asarray(officers, dtype=np.int32), np.asarray(departments, dtype=np.int32)
+    events = events.copy()
+    events['officer'] = officers[events['officer']]
+    for field, codes in (('department', departments), ('displaced', officers)):
+        known = events[field] >= 0
+        events[field][known] = codes[events[field][known]]
+    return events
+
+class EventLog:
+    def __init__(self, events, officer_ids, department_codes):
+        self.events = events
+        self.officer_index = pd.Index(np.asarray(officer_ids, dtype=object).astype(str))
+        self.department_index = pd.Index(np.asarray(department_codes, dtype=object).astype(str))
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    # Record numbers sorted by a field and the first record of each code, built once per field
+    def field_index(self, field, n_codes):
+        if field not in self.indexes:
+            codes = self.events[field]
+            order = np.argsort(codes, kind='stable')
+            starts = np.searchsorted(codes[order], np.arange(n_codes + 1))
+            self.indexes[field] = (order, starts)
+        return self.indexes[field]
+
+    def records_of(self, field, code, n_codes):
+        order, starts = self.field_index(field, n_codes)
+        return order[starts[code]:starts[code + 1]]
+
+    # Records of one officer, proposing or displaced, or of one department, in the order they happened
+    def history(self, employee_id=None, pms_code=None):
+        if employee_id is not None:
+            officer = self.officer_index.get_indexer([str(employee_id)])[0]
+            if officer < 0:
+                raise ValueError(f"Officer {employee_id} is not in the event log")
+            n_officers = len(self.officer_index)
+            records = np.union1d(self.records_of('officer', officer, n_officers), self.records_of('displaced', officer, n_officers))
+        elif pms_code is not None:
+            department = self.department_index.get_indexer([str(pms_code)])[0]
+            if department < 0:
+                raise ValueError(f"PMS Code {pms_code} is not in the event log")
+            records = self.records_of('department', department, len(self.department_index))
+        else:
+            records = np.arange(len(self.events))
+        return self.frame(self.events[records])
+
+    def frame(self, events=None):
+        events = self.events if events is None else events
+        return pd.DataFrame({
+            'Round': events['round'],
+            'Event': pd.Categorical.from_codes(events['event'], categories=event_types),
+            'Employee ID': pd.Categorical.from_codes(events['officer'], categories=self.officer_index),
+            'PMS Code': pd.Categorical.from_codes(events['department'], categories=self.department_index),
+            'Displaced Employee ID': pd.Categorical.from_codes(events['displaced'], categories=self.officer_index),
+        }, columns=history_columns)
+
+# Write the log to the output folder, as Parquet or as a pickle when pyarrow is not installed
+def write_events(output_folder_path, log):
+    path = os.path.join(output_folder_path, events_file_name)
+    try:
+        log.frame().to_parquet(path, index=False)
+    except ImportError:
+        path = os.path.splitext(path)[0] + '.pkl'
+        log.frame().to_pickle(path)
+    return path
+
+def load_events(path):
+    frame = pd.read_pickle(path) if path.endswith('.pkl') else pd.read_parquet(path)
+    events = np.zeros(len(frame), dtype=event_dtype)
+    events['round'] = frame['Round']
+    events['event'] = frame['Event'].cat.codes
+    events['officer'] = frame['Employee ID'].cat.codes
+    events['department'] = frame['PMS Code'].cat.codes
+    # The displaced officers share the officer categories, which the Parquet round trip may reorder
+    events['displaced'] = frame['Displaced Employee ID'].cat.set_categories(frame['Employee ID'].cat.categories).cat.codes
+    return EventLog(events, frame['Employee ID'].cat.categories, frame['PMS Code'].cat.categories)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show the matching events of one officer or department.")
+    parser.add_argument('events', type=str, help="The Match Events file written with --record-events")
+    parser.add_argument('--employee-id', type=str, help="Officer whose proposals and displacements are shown")
+    parser.add_argument('--pms-code', type=str, help="Department whose proposals are shown")
+    args = parser.parse_args()
+
+    history = load_events(args.events).history(args.employee_id, args.pms_code)
+    print(history.to_string(index=False))
@@ -0,0 +1,175 @@
+"""
+README:
+Sharded execution of the matching rounds over a process pool.
+The officers and departments of a round form a bipartite graph with an edge for every pair on an officer's preference
+list (in round 1 only the mutually acceptable pairs, see Match_Engine.prune_round_1). Officers in different connected
+components of that graph never compete for a seat, so each component is matched on its own: the components are
+packed into one shard per worker by number of pairs, deferred acceptance runs on each shard in a worker process and
+the shards' results are merged back into one MatchState.
+Within a component the proposals are made in the same order as in a single run, so every department holds the same
+officers in the same acceptance order and the matching outputs are identical. Only the acceptance sequence numbers
+and the order of the unmatched officers differ, the merged unmatched officers are listed by officer code.
+Each sharded round records its components, shards and the speedup over running the shards one after another in the
+market's sharding counts. When events are recorded (see Match_Events.py) each shard records its own, and they are
+renumbered and appended shard by shard, so each officer's and department's events keep their order.
+"""
+
+# import necessary libraries
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import Match_Engine
+import Match_Events
+
+# Sharding settings, changed through configure() or the --match-workers script flag
+# Rounds with fewer preference pairs than min_pairs are matched in the calling process, where the pool would cost more
+# than it saves
+settings = {
+    'workers': 1,
+    'min_pairs': 20000,
+}
+
+def configure(workers=None, min_pairs=None):
+    if workers is not None:
+        settings['workers'] = workers
+    if min_pairs is not None:
+        settings['min_pairs'] = min_pairs
+
+# Add the sharding flag to a script's argument parser and apply it once parsed
+def add_shard_arguments(parser):
+    parser.add_argument('--match-workers', type=int, default=1, help="Number of processes matching independent groups of officers and departments")
+
+def apply_shard_arguments(args):
+    configure(workers=args.match_workers)
+
+# Preference pairs of the proposing officers as (officer, department) arrays
+def proposal_pairs(market):
+    proposers = list(dict.fromkeys(market.queue))
+    lengths = [len(market.prefs[officer]) for officer in proposers]
+    officers = np.repeat(np.array(proposers, dtype=np.int64), lengths)
+    departments = np.fromiter((department for officer in proposers for department in market.prefs[officer]), dtype=np.int64, count=sum(lengths))
+    return np.array(proposers, dtype=np.int64), officers, departments
+
+# Connected component of every node of the graph, officers are nodes 0..n_officers-1 and departments follow them
+# Each node takes the smallest node of its neighbours' components until nothing changes, jumping to the component of
+# its component on the way
+def connected_components(n_nodes, heads, tails):
+    labels = np.arange(n_nodes, dtype=np.int64)
+    while True:
+        lowest = np.minimum(labels[heads], labels[tails])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, heads, lowest)
+        np.minimum.at(new_labels, tails, lowest)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+# Pack components into at most n_shards shards, largest first onto the least loaded shard
+def pack_components(sizes, n_shards):
+    loads = [(0, shard) for shard in range(min(n_shards, len(sizes)))]
+    shard_of = np.empty(len(sizes), dtype=np.int64)
+    for component in np.argsort(-sizes, kind='stable').tolist():
+        load, shard = heapq.heappop(loads)
+        shard_of[component] = shard
+        heapq.heappush(loads, (load + int(sizes[component]), shard))
+    return shard_of
+
+# Market of one shard's officers and departments, renumbered from 0 in their market order
+def shard_market(market, officers, departments):
+    officer_index = dict(zip(officers, range(len(officers))))
+    department_index = dict(zip(departments, range(len(departments))))
+    prefs = [[department_index[department] for department in market.prefs[officer]] for officer in officers]
+    ranks = [{officer_index[officer]: rank for officer, rank in market.ranks[department].items() if officer in officer_index} for department in departments]
+    queue = [officer_index[officer] for officer in market.queue if officer in officer_index]
+    return Match_Engine.CompiledMarket([market.officer_ids[officer] for officer in officers], [market.department_codes[department] for department in departments],
+                                       [market.vacancies[department] for department in departments], prefs, ranks, queue)
+
+# Worker task: match one shard, returning its state, the seconds the matching took and, when a round number is
+# given, the shard's events
+def run_shard(market, round_number=None):
+    started_at = time.perf_counter()
+    recorder = None
+    if round_number is not None:
+        recorder = Match_Events.EventRecorder()
+        recorder.start_round(round_number)
+    state = Match_Engine.run_deferred_acceptance(market, recorder)
+    seconds = time.perf_counter() - started_at
+    return state, seconds, recorder.round_events() if recorder is not None else None
+
+# Merge the shards' states into one state of the whole market
+# Acceptance sequence numbers are offset per shard, which keeps their order within every department
+def merge_states(n_departments, shards, states):
+    merged = Match_Engine.MatchState([[] for _ in range(n_departments)], [], set())
+    unmatched = []
+    for (officers, departments), state in zip(shards, states):
+        for department, held in zip(departments, state.tentative):
+            merged.tentative[department] = [(priority, sequence + merged.sequence, officers[officer]) for priority, sequence, officer in held]
+        merged.displaced.update(departments[department] for department in state.displaced)
+        unmatched += [officers[officer] for officer in state.unmatched]
+        merged.sequence += state.sequence
+    merged.unmatched = sorted(unmatched)
+    return merged
+
+# Match the market's connected components on a pool of workers, recording the sharding counts on the market
+def run_sharded(market, workers, recorder=None):
+    started_at = time.perf_counter()
+    n_officers, n_departments = len(market.officer_ids), len(market.department_codes)
+    proposers, officers, departments = proposal_pairs(market)
+    labels = connected_components(n_officers + n_departments, officers, departments + n_officers)
+
+    # Components of the proposing officers, packed by their pairs plus one per officer so officers without choices count too
+    components, officer_components = np.unique(labels[proposers], return_inverse=True)
+    pairs = np.bincount(officer_components, weights=[len(market.prefs[officer]) for officer in proposers.tolist()]).astype(np.int64)
+    shard_of = pack_components(pairs + np.bincount(officer_components), workers)
+    market.sharding = {'components': len(components), 'shards': int(shard_of.max()) + 1, 'largest_component_pairs': int(pairs.max())}
+
+    # With the pairs all in one component there is nothing to split, and the market is matched in this process
+    if np.count_nonzero(pairs) < 2:
+        market.sharding['shards'] = 1
+        matching_started_at = time.perf_counter()
+        state = Match_Engine.run_deferred_acceptance(market, recorder)
+        record_speedup(market.sharding, time.perf_counter() - matching_started_at, time.perf_counter() - started_at)
+        return state
+
+    # Each shard's officers and the departments they list, in market order
+    officer_shards = shard_of[officer_components]
+    listed = np.unique(departments)
+    department_shards = shard_of[np.searchsorted(components, labels[listed + n_officers])]
+    shards = [(np.sort(proposers[officer_shards == shard]).tolist(), listed[department_shards == shard].tolist()) for shard in range(shard_of.max() + 1)]
+    shard_markets = [shard_market(market, shard_officers, shard_departments) for shard_officers, shard_departments in shards]
+
+    round_number = recorder.round if recorder is not None else None
+    with ProcessPoolExecutor(max_workers=len(shard_markets)) as executor:
+        results = list(executor.map(run_shard, shard_markets, repeat(round_number)))
+    state = merge_states(n_departments, shards, [shard_state for shard_state, _, _ in results])
+    if recorder is not None:
+        recorder.flush()
+        for (shard_officers, shard_departments), (_, _, events) in zip(shards, results):
+            recorder.append(Match_Events.translate_events(events, shard_officers, shard_departments))
+
+    record_speedup(market.sharding, sum(seconds for _, seconds, _ in results), time.perf_counter() - started_at)
+    return state
+
+# Time spent matching the shards, the wall time of the sharded round including the components and the pool, and the
+# speedup of the sharded round over matching the shards one after another
+def record_speedup(sharding, matching_seconds, sharded_seconds):
+    sharding['shard_matching_ms'] = round(matching_seconds * 1000)
+    sharding['sharded_ms'] = round(sharded_seconds * 1000)
+    sharding['speedup_percent'] = round(100 * matching_seconds / sharded_seconds)
+
+# Deferred acceptance over a compiled market, sharded when more than one worker is configured and the market is
+# large enough, recorder is the run's Match_Events.EventRecorder or None
+def run_deferred_acceptance(market, recorder=None):
+    n_pairs = sum(len(market.prefs[officer]) for officer in set(market.queue))
+    if settings['workers'] <= 1 or n_pairs == 0 or n_pairs < settings['min_pairs']:
+        return Match_Engine.run_deferred_acceptance(market, recorder)
+    return run_sharded(market, settings['workers'], recorder)
+
+# One line summary of a sharded round for the run output
+def sharding_summary(round_name, sharding):
+    return (f"{round_name} sharded into {sharding['shards']} shard(s) of {sharding['components']} components: "
+            f"{sharding['sharded_ms']} ms for {sharding['shard_matching_ms']} ms of matching, "
+            f"{sharding['speedup_percent'] / 100:.2f}x the speed of matching the shards one after another")
@@ -0,0 +1,161 @@
+"""
+README:
+Verification of a finished match, run after both matching rounds.
+Every (officer, department) pair is checked at once on integer rank arrays:
+    Blocking Pairs      - an officer prefers a department to the one they got, and the department has a free seat or
+                          holds someone it ranks below them (HOD ranking in round 1, choice rank then Employee ID in round 2)
+    Capacity Violations - a department has more matches than vacancies
+    License Violations  - an officer is matched to a posting whose license requirement they do not meet
+    Invalid Matches     - an officer is matched to a department they did not choose or that did not rank them in round 1,
+                          or is matched more than once
+The checks use the preferences the rounds ran on, i.e. after the license check and GDFM prioritisation.
+"""
+
+# import necessary libraries
+import numpy as np
+import pandas as pd
+from Code_Table import CodeTable
+
+verification_columns = ['Check', 'Round', 'Employee ID', 'PMS Code', 'Detail']
+
+# Mask of the first occurrence of each key
+def first_occurrence(keys):
+    mask = np.zeros(len(keys), dtype=bool)
+    mask[np.unique(keys, return_index=True)[1]] = True
+    return mask
+
+# (officer, department, choice position) of every listed department before the officer's first blank choice,
+# keeping an officer's first listing of a department
+def listed_pairs(codes, listed, n_departments):
+    officers, positions = np.nonzero((codes >= 0) & listed)
+    departments = codes[officers, positions].astype(np.int64)
+    keep = first_occurrence(officers * n_departments + departments)
+    return officers[keep], departments[keep], positions[keep]
+
+# Department code of each officer's match, -1 for the unmatched
+def assigned_departments(matches, table):
+    assigned = np.full(len(table.officer_ids), -1, dtype=np.int64)
+    officers = table.encode_officers(matches['Employee ID'].to_numpy(dtype=object))
+    departments = table.encode_departments(matches['PMS Code'].to_numpy(dtype=object))
+    found = officers >= 0
+    assigned[officers[found]] = departments[found]
+    return assigned
+
+# Blocking pairs and unacceptable matches of one round
+# priorities are the department's priority of each pair (lower is better), -1 for pairs the department does not rank
+def check_round(round_number, officers, departments, positions, priorities, assigned, vacancies, officer_ids, department_codes):
+    n_departments = len(department_codes)
+    acceptable = priorities >= 0
+    assigned_pair = assigned[officers] == departments
+
+    # Position of each officer's match in their list, past the end of every list when unmatched
+    assigned_position = np.full(len(officer_ids), np.iinfo(np.int64).max, dtype=np.int64)
+    assigned_position[officers[assigned_pair]] = positions[assigned_pair]
+    held = np.bincount(assigned[assigned >= 0], minlength=n_departments)
+    worst = np.full(n_departments, -1, dtype=np.int64)
+    np.maximum.at(worst, departments[assigned_pair & acceptable], priorities[assigned_pair & acceptable])
+
+    blocking = acceptable & (positions < assigned_position[officers]) & ((held[departments] < vacancies[departments]) | (priorities < worst[departments]))
+    rows = [pd.DataFrame({
+        'Check': 'Blocking Pair',
+        'Round': round_number,
+        'Employee ID': officer_ids[officers[blocking]],
+        'PMS Code': department_codes[departments[blocking]],
+        'Detail': [f"Choice {position + 1} preferred to their match" for position in positions[blocking].tolist()],
+    }, columns=verification_columns)]
+
+    # Matches to a department the officer did not list, or (in round 1) that did not rank them
+    matched = np.flatnonzero(assigned >= 0)
+    valid_match = np.zeros(len(officer_ids), dtype=bool)
+    valid_match[officers[assigned_pair & acceptable]] = True
+    invalid = matched[~valid_match[matched]]
+    rows.append(pd.DataFrame({
+        'Check': 'Invalid Match',
+        'Round': round_number,
+        'Employee ID': officer_ids[invalid],
+        'PMS Code': department_codes[assigned[invalid]],
+        'Detail': 'Department not chosen by the officer' if round_number == 2 else 'Pair not ranked by both the officer and the HOD',
+    }, columns=verification_columns))
+    return rows
+
+# Check the matches of both rounds against the round 1 inputs, returning one row per problem found
+# rankings is the RankingStore of the HOD rankings and table the CodeTable the rounds ran on, built here when not given
+def verify_matching(hod_rankings, rankings, officer_choices, round_1_matches, round_2_matches, posting_license_requirement, license_hierarchy, table=None):
+    if table is None:
+        preference_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
+        table = CodeTable(officer_choices, hod_rankings, preference_columns, rankings)
+    officer_ids = table.officer_id_values
+    department_codes = table.department_code_values
+    vacancies = table.department_column(hod_rankings, 'Vacancies').astype(np.int64)
+    n_officers, n_departments = len(officer_ids), len(department_codes)
+
+    officers, departments, positions = listed_pairs(table.choice_codes, table.choice_listed, n_departments)
+
+    # Round 1: departments prioritise by the position of the officer's first listing in their HOD ranking
+    known = table.ranked_officers >= 0
+    hod_positions = table.ranked_positions[known]
+    ranked_keys = table.ranked_departments[known].astype(np.int64) * n_officers + table.ranked_officers[known]
+    keep = first_occurrence(ranked_keys)
+    ranked_index = pd.Index(ranked_keys[keep])
+    ranked_pair = ranked_index.get_indexer(departments * n_officers + officers)
+    hod_priorities = np.where(ranked_pair >= 0, hod_positions[keep][ranked_pair], -1)
+
+    assigned_1 = assigned_departments(round_1_matches, table)
+    rows = check_round(1, officers, departments, positions, hod_priorities, assigned_1, vacancies, officer_ids, department_codes)
+
+    # Round 2: officers unmatched in round 1 and departments with remaining vacancies, departments prioritise by the
+    # officer's choice position and then by Employee ID
+    remaining = vacancies - np.bincount(assigned_1[assigned_1 >= 0], minlength=n_departments)
+    in_round_2 = (assigned_1[officers] < 0) & (remaining[departments] > 0)
+    id_order = np.empty(n_officers, dtype=np.int64)
+    id_order[np.argsort(officer_ids, kind='stable')] = np.arange(n_officers)
+    round_2_officers, round_2_departments, round_2_positions = officers[in_round_2], departments[in_round_2], positions[in_round_2]
+    choice_priorities = round_2_positions * n_officers + id_order[round_2_officers]
+
+    assigned_2 = assigned_departments(round_2_matches, table)
+    rows += check_round(2, round_2_officers, round_2_departments, round_2_positions, choice_priorities, assigned_2, np.maximum(remaining, 0), officer_ids, department_codes)
+
+    # Capacity, counting every match including those to departments without vacancies
+    final_matches = pd.concat([round_1_matches[['Employee ID', 'PMS Code']], round_2_matches[['Employee ID', 'PMS Code']]], axis=0)
+    matched = final_matches['PMS Code'].value_counts()
+    capacity = pd.Series(vacancies, index=department_codes).reindex(matched.index, fill_value=0)
+    over = matched[matched > capacity]
+    rows.append(pd.DataFrame({
+        'Check': 'Capacity Violation',
+        'Round': None,
+        'Employee ID': None,
+        'PMS Code': over.index.to_numpy(dtype=object),
+        'Detail': [f"{count} matches for {vacancies} vacancies" for count, vacancies in zip(over.tolist(), capacity[over.index].tolist())],
+    }, columns=verification_columns))
+
+    repeated = final_matches['Employee ID'].value_counts()
+    repeated = repeated[repeated > 1]
+    rows.append(pd.DataFrame({
+        'Check': 'Invalid Match',
+        'Round': None,
+        'Employee ID': repeated.index.to_numpy(dtype=object),
+        'PMS Code': None,
+        'Detail': [f"Matched {count} times" for count in repeated.tolist()],
+    }, columns=verification_columns))
+
+    # License requirements, the first listing of a PMS Code applies and officers without a registration type are skipped
+    requirements = posting_license_requirement.dropna(subset=['PMS Code']).drop_duplicates(subset='PMS Code').set_index('PMS Code')['Requirement']
+    levels = {license: level for level, license in enumerate(license_hierarchy)}
+    registration = pd.Series(table.officer_column(officer_choices, 'Registration Type'), index=table.officer_index)
+    licensed = final_matches.assign(Requirement=final_matches['PMS Code'].map(requirements), License=final_matches['Employee ID'].map(registration))
+    licensed = licensed.dropna(subset=['Requirement', 'License'])
+    violations = licensed[licensed['License'].map(levels) < licensed['Requirement'].map(levels)]
+    rows.append(pd.DataFrame({
+        'Check': 'License Violation',
+        'Round': None,
+        'Employee ID': violations['Employee ID'].to_numpy(dtype=object),
+        'PMS Code': violations['PMS Code'].to_numpy(dtype=object),
+        'Detail': [f"{license} does not meet {requirement}" for license, requirement in zip(violations['License'], violations['Requirement'])],
+    }, columns=verification_columns))
+
+    return pd.concat([frame for frame in rows if len(frame)] or [pd.DataFrame(columns=verification_columns)], ignore_index=True)
+
+# Number of problems of each check, e.g. for a run summary
+def verification_counts(verification):
+    counts = verification['Check'].value_counts()
+    return {check: int(counts.get(check, 0)) for check in ['Blocking Pair', 'Capacity Violation', 'License Violation', 'Invalid Match']}
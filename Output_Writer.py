@@ -0,0 +1,111 @@
+"""
+README:
+Output subsystem for Match_Algo.
+Every result table is serialized once per requested format, and the writes run concurrently on a thread pool.
+Formats:
+    excel    - the separate workbooks and CSVs that Match_Algo has always produced, the choice exceptions and the match
+               verification
+    workbook - a single multi-sheet 'Match Results.xlsx' written row by row with a streaming (constant memory) engine
+    parquet  - one Parquet file per table, for downstream tooling
+    csv      - one CSV file per table
+"""
+
+# import necessary libraries
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+output_formats = ['excel', 'workbook', 'parquet', 'csv']
+
+# Legacy file name of each table in the 'excel' format, and whether the index is written
+legacy_files = {
+    'No Choice Officers': ('no_choice_officers.csv', False),
+    'No Vacancies Departments': ('no_vacancies_departments.csv', False),
+    'Mutual Matches': ('mutualmatches.xlsx', False),
+    'Unmatched Officers': ('Unmatched officers.xlsx', False),
+    'Departments with Vacancies': ('Departments with vacancies.xlsx', True),
+    'Final Matches': ('Final Matches.xlsx', False),
+    'Match Verification': ('Match Verification.xlsx', False),
+}
+
+# Tables keep their index only where the legacy outputs did, e.g. the Department index of remaining vacancies
+def table_frame(name, frame):
+    if legacy_files.get(name, ('', False))[1]:
+        return frame.rename_axis(frame.index.name or 'Department').reset_index()
+    return frame
+
+# Cell values as plain Python objects, with blanks as None
+def table_rows(frame):
+    for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None):
+        yield row
+
+# Write all tables to one workbook without holding the workbook in memory
+def write_streaming_workbook(path, tables):
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        for name, frame in tables.items():
+            worksheet = workbook.add_worksheet(name[:31])
+            worksheet.write_row(0, 0, [str(col) for col in frame.columns])
+            for row_number, row in enumerate(table_rows(frame), start=1):
+                worksheet.write_row(row_number, 0, row)
+        workbook.close()
+    else:
+        import openpyxl
+        workbook = openpyxl.Workbook(write_only=True)
+        for name, frame in tables.items():
+            worksheet = workbook.create_sheet(name[:31])
+            worksheet.append([str(col) for col in frame.columns])
+            for row in table_rows(frame):
+                worksheet.append(row)
+        workbook.save(path)
+
+# Write jobs for each format, as callables that can run concurrently
+# exceptions is the choice exceptions table of Match_Algo.validate_choices
+def excel_jobs(output_folder_path, tables, exceptions):
+    jobs = [lambda: exceptions.to_excel(os.path.join(output_folder_path, 'Choice Exceptions.xlsx'), index=False)]
+    for name, (file_name, index) in legacy_files.items():
+        if name not in tables:
+            continue
+        path = os.path.join(output_folder_path, file_name)
+        if file_name.endswith('.csv'):
+            jobs.append(lambda frame=tables[name], path=path, index=index: frame.to_csv(path, sep=',', index=index))
+        else:
+            jobs.append(lambda frame=tables[name], path=path, index=index: frame.to_excel(path, index=index))
+    return jobs
+
+def workbook_jobs(output_folder_path, tables, exceptions):
+    sheets = {name: table_frame(name, frame) for name, frame in tables.items()}
+    sheets['Choice Exceptions'] = exceptions
+    return [lambda: write_streaming_workbook(os.path.join(output_folder_path, 'Match Results.xlsx'), sheets)]
+
+def parquet_jobs(output_folder_path, tables, exceptions):
+    frames = {name: table_frame(name, frame) for name, frame in tables.items()}
+    frames['Choice Exceptions'] = exceptions
+    return [lambda frame=frame, path=os.path.join(output_folder_path, f'{name}.parquet'): frame.to_parquet(path, index=False)
+            for name, frame in frames.items()]
+
+def csv_jobs(output_folder_path, tables, exceptions):
+    frames = {name: table_frame(name, frame) for name, frame in tables.items()}
+    frames['Choice Exceptions'] = exceptions
+    return [lambda frame=frame, path=os.path.join(output_folder_path, f'{name}.csv'): frame.to_csv(path, index=False)
+            for name, frame in frames.items()]
+
+format_jobs = {'excel': excel_jobs, 'workbook': workbook_jobs, 'parquet': parquet_jobs, 'csv': csv_jobs}
+
+# Write the result tables in every requested format, overlapping the writes on a thread pool
+def write_outputs(output_folder_path, tables, exceptions, formats=('excel',), max_workers=4):
+    jobs = []
+    for output_format in formats:
+        if output_format not in format_jobs:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of {output_formats}")
+        jobs += format_jobs[output_format](output_folder_path, tables, exceptions)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(job) for job in jobs]
+        for future in futures:
+            future.result()  # Re-raise the first write error, if any
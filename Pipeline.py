@@ -0,0 +1,153 @@
+"""
+README:
+Runs the whole posting exercise in one process on in-memory frames:
+remove excluded officers and apply the posting blacklist -> compile the HOD rankings -> license check ->
+GDFM prioritisation -> matching round 1 -> matching round 2.
+The stages hand their frames to each other directly, so the updated MO rankings and the HOD rankings are not written
+to Excel and parsed again between the scripts, and the department raw data files are not rewritten. The HOD rankings
+are kept as a RankingStore (see Ranking_Store.py) and the padded Match columns are not built.
+With write_intermediates the same intermediate files as the separate scripts are written as well.
+The matching outputs are written to the output folder next to the MO Ranking file, as Match_Algo does.
+Usage:
+    python Pipeline.py --dir <raw data folder> --HODRankFile "HOD Rankings.xlsx" --MOPEXStaffList <staff list>
+                       --MORankFile "MO Ranking Consolidated.xlsx" --RemovedMOFile "Removed MOs.xlsx" --GDFM "GDFM List.xlsx"
+"""
+
+# import necessary libraries
+import argparse
+import os
+from datetime import datetime
+import numpy as np
+import Excel_Cache
+import HOD_Rank_Compiler
+import Match_Algo
+import Match_Events
+import Match_Shards
+import Output_Writer
+import Ranking_Store
+import Remove_MOs
+import Run_Profile
+
+class BlankColumnErrors(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"The consolidated HOD rankings have blank columns in rows {errors['Row'].drop_duplicates().tolist()}")
+
+class Pipeline:
+    def __init__(self, raw_dir_path, hod_rankings_path, staff_list_path, officer_rankings_path, removed_officers_path, GDFM_list_path,
+                 posting_license_requirement_path=None, workers=1, write_intermediates=False, output_formats=('excel',)):
+        self.raw_dir_path = raw_dir_path
+        self.hod_rankings_path = hod_rankings_path
+        self.staff_list_path = staff_list_path
+        self.officer_rankings_path = officer_rankings_path
+        self.removed_officers_path = removed_officers_path
+        self.GDFM_list_path = GDFM_list_path
+        # The license requirements are read from the MO Ranking file's folder unless given
+        self.posting_license_requirement_path = posting_license_requirement_path or os.path.join(os.path.dirname(officer_rankings_path), 'Posting License Requirements.xlsx')
+        self.workers = workers
+        self.write_intermediates = write_intermediates
+        self.output_formats = output_formats
+        self.output_folder_path = os.path.join(os.path.dirname(officer_rankings_path), 'output')
+
+        # Frames produced by the stages, kept for callers that want to inspect them
+        self.officer_choices = None
+        self.hod_rankings = None
+        self.rankings = None
+        self.tables = None
+        self.exceptions = None
+        self.events = None
+
+    # Excluded officers removed and the posting blacklist applied, with Employee IDs as text as Match_Algo reads them
+    def update_officer_rankings(self):
+        officer_rankings = Excel_Cache.read_excel(self.officer_rankings_path)
+        officer_choices = Remove_MOs.update_mo_rankings(officer_rankings, self.removed_officers_path)
+        officer_choices['Employee ID'] = Ranking_Store.employee_id_text(officer_choices['Employee ID']).replace('', np.nan)
+
+        if self.write_intermediates:
+            date_string = datetime.today().strftime('%d-%m-%Y')
+            officer_choices.to_excel(os.path.join(os.path.dirname(self.officer_rankings_path), f'Updated MO Ranking Consolidated {date_string}.xlsx'), index=False)
+        self.officer_choices = officer_choices
+        return officer_choices
+
+    # Departments and ranking store of the HOD rankings, raising BlankColumnErrors when a department's rankings have gaps
+    def compile_hod_rankings(self):
+        mcr_to_employee_id = HOD_Rank_Compiler.load_mcr_to_employee_mapping(self.staff_list_path)
+        consolidated_df = HOD_Rank_Compiler.load_consolidated_hod_rankings(self.hod_rankings_path)
+        consolidated_df, rankings = HOD_Rank_Compiler.compile_rankings(consolidated_df, self.raw_dir_path, mcr_to_employee_id, self.workers,
+                                                                        write_back=self.write_intermediates, wide=self.write_intermediates)
+
+        errors = HOD_Rank_Compiler.find_ranking_gaps(consolidated_df, rankings)
+        if len(errors):
+            HOD_Rank_Compiler.report_blank_column_errors(errors)
+            raise BlankColumnErrors(errors)
+
+        if self.write_intermediates:
+            output_folder = os.path.dirname(self.hod_rankings_path)
+            Ranking_Store.save_store(os.path.join(output_folder, Ranking_Store.store_file_name), consolidated_df, rankings)
+            consolidated_df.to_excel(os.path.join(output_folder, "HOD Rankings Consolidated.xlsx"), index=False)
+        self.hod_rankings = Ranking_Store.department_columns(consolidated_df)
+        self.rankings = rankings.text()
+        return self.hod_rankings, self.rankings
+
+    def run(self, progress=None):
+        with Run_Profile.RunProfile('Pipeline', progress, cprofile_stages=['Matching round 1', 'Matching round 2']) as report:
+            if not os.path.exists(self.output_folder_path):
+                os.makedirs(self.output_folder_path)
+
+            report('Removing officers and applying blacklist')
+            officer_choices = self.update_officer_rankings()
+            report.record_rows(officers=len(officer_choices))
+
+            report('Compiling department rankings')
+            try:
+                hod_rankings, rankings = self.compile_hod_rankings()
+            except BlankColumnErrors as error:
+                report.record_rows(error_rows=error.errors['Row'].nunique(), blank_cells=len(error.errors))
+                report.write(self.output_folder_path)
+                raise
+            report.record_rows(departments=len(hod_rankings), ranked_officers=len(rankings))
+
+            report('Loading license requirements and GDFM list')
+            posting_license_requirement, GDFM1, GDFM2 = Match_Algo.load_license_and_GDFM(self.posting_license_requirement_path, self.GDFM_list_path)
+            report.record_rows(license_requirements=len(posting_license_requirement), GDFM1=len(GDFM1), GDFM2=len(GDFM2))
+
+            recorder = Match_Events.run_recorder()
+            self.tables, self.exceptions = Match_Algo.run_matching(hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2, report, recorder)
+
+            report('Writing outputs')
+            Output_Writer.write_outputs(self.output_folder_path, self.tables, self.exceptions, self.output_formats)
+            report.record_rows(rows=sum(len(table) for table in self.tables.values()) + len(self.exceptions))
+            if recorder is not None:
+                self.events = recorder.log()
+                Match_Events.write_events(self.output_folder_path, self.events)
+                report.record_rows(events=len(self.events))
+            report.write(self.output_folder_path)
+            return self.tables
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the whole MOPEX pipeline without intermediate files.")
+    parser.add_argument('--dir', type=str, required=True, help="The target directory path")
+    parser.add_argument('--HODRankFile', type=str, required=True, help="The file name of consolidated HOD Rankings")
+    parser.add_argument('--MOPEXStaffList', type=str, required=True, help="The file name of MOPEX 25 Staff List")
+    parser.add_argument('--MORankFile', type=str, required=True, help="The file name of MO Ranking Consolidated")
+    parser.add_argument('--RemovedMOFile', type=str, required=True, help="The file name of Removed MOs")
+    parser.add_argument('--GDFM', type=str, required=True, help="The file name of GDFM List")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used to read and sort department files")
+    parser.add_argument('--write-intermediates', action='store_true', help="Also write the updated MO rankings, the HOD rankings store and consolidated file and the sorted department files")
+    parser.add_argument('--output-format', nargs='+', default=['excel'], choices=Output_Writer.output_formats, help="Output formats to write, defaults to the separate Excel files")
+    Excel_Cache.add_cache_arguments(parser)
+    Match_Shards.add_shard_arguments(parser)
+    Match_Events.add_event_arguments(parser)
+    Run_Profile.add_profile_arguments(parser)
+    args = parser.parse_args()
+    Excel_Cache.apply_cache_arguments(args)
+    Match_Shards.apply_shard_arguments(args)
+    Match_Events.apply_event_arguments(args)
+    Run_Profile.apply_profile_arguments(args)
+
+    pipeline = Pipeline(args.dir, args.HODRankFile, args.MOPEXStaffList, args.MORankFile, args.RemovedMOFile, args.GDFM,
+                        workers=args.workers, write_intermediates=args.write_intermediates, output_formats=args.output_format)
+    try:
+        pipeline.run()
+    except BlankColumnErrors:
+        exit(1)
@@ -0,0 +1,142 @@
+"""
+README:
+Sparse long-format store of the HOD rankings, the form the rankings are kept in between HOD_Rank_Compiler and the
+matching instead of the padded Match 1..N columns.
+Every ranked officer is one (PMS Code, position, Employee ID) entry. The entries are grouped by department in
+position order, and each department's entries are found through an offsets index, so memory and load time scale with
+the number of rankings instead of departments x the longest ranking.
+On disk the store is a workbook with a 'Departments' sheet (the consolidated file without its Match columns) and a
+'Rankings' sheet of the entries, with positions counted from 1 as in the Match column names. HOD_Rank_Compiler writes
+it next to the consolidated file, which keeps the wide layout for people to read.
+"""
+
+# import necessary libraries
+import numpy as np
+import pandas as pd
+import Excel_Cache
+
+store_file_name = 'HOD Rankings Store.xlsx'
+store_sheets = ['Departments', 'Rankings']
+
+# Employee IDs as text, blank cells as ''
+# Whole numbers read from a column with blank cells come back as floats, and are written without the '.0'
+def employee_id_text(column):
+    if column.dtype.kind == 'f':
+        whole = column.notna() & (column % 1 == 0)
+        text = column.astype(str)
+        text[whole] = column[whole].astype(np.int64).astype(str)
+        return text.replace('nan', '')
+    if column.dtype.kind in 'iu':
+        return column.astype(str)
+    return column.map(lambda value: str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)).replace('nan', '')
+
+class RankingStore:
+    def __init__(self, pms_codes, offsets, positions, employee_ids):
+        self.pms_codes = pms_codes          # department -> PMS Code
+        self.offsets = offsets              # department -> first entry, with the number of entries last
+        self.positions = positions          # entry -> position in the department's HOD ranking, from 0
+        self.employee_ids = employee_ids    # entry -> ranked Employee ID
+        self.index = pd.Index(pms_codes, dtype=object)
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+    def copy(self):
+        return RankingStore(self.pms_codes.copy(), self.offsets.copy(), self.positions.copy(), self.employee_ids.copy())
+
+    # PMS Code of every entry
+    def entry_pms_codes(self):
+        return np.repeat(self.pms_codes, np.diff(self.offsets))
+
+    # Positions and Employee IDs of one department's ranking, empty when it has none
+    def ranking(self, pms_code):
+        department = self.index.get_indexer([pms_code])[0]
+        if department < 0:
+            return self.positions[:0], self.employee_ids[:0]
+        start, end = self.offsets[department], self.offsets[department + 1]
+        return self.positions[start:end], self.employee_ids[start:end]
+
+    # Entries of the given PMS Codes in their order: the index of each entry's PMS Code, its position and Employee ID
+    def select(self, pms_codes):
+        departments = self.index.get_indexer(pd.Index(pms_codes, dtype=object))
+        found = departments >= 0
+        starts = np.where(found, self.offsets[departments], 0)
+        lengths = np.where(found, self.offsets[departments + 1], 0) - starts
+        selected = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.repeat(np.arange(len(departments)), lengths), self.positions[selected], self.employee_ids[selected]
+
+    # Long frame of the entries, positions counted from 1 as in the Match column names
+    def entries(self):
+        return pd.DataFrame({'PMS Code': self.entry_pms_codes(), 'Position': self.positions + 1, 'Employee ID': self.employee_ids})
+
+    # Store with the given departments' rankings written over the first positions of their current rankings
+    # Entries past the end of a new ranking are kept, as when a shorter ranking is written over Match columns
+    def updated(self, department_rankings):
+        new = store_from_rankings(department_rankings)
+        new_lengths = np.diff(new.offsets)
+        departments = new.index.get_indexer(pd.Index(self.entry_pms_codes(), dtype=object))
+        # Length of the new ranking over each entry's department, 0 for departments without one
+        overwritten = np.zeros(len(departments), dtype=np.int64)
+        found = departments >= 0
+        overwritten[found] = new_lengths[departments[found]]
+        keep = self.positions >= overwritten
+        return store_from_entries(
+            np.concatenate([self.entry_pms_codes()[keep], new.entry_pms_codes()]),
+            np.concatenate([self.positions[keep], new.positions]),
+            np.concatenate([self.employee_ids[keep], new.employee_ids]),
+        )
+
+    # Store with the Employee IDs as text, leaving out blank entries
+    def text(self):
+        employee_ids = employee_id_text(pd.Series(self.employee_ids, dtype=object).infer_objects()).to_numpy(dtype=object)
+        ranked = employee_ids != ''
+        return store_from_entries(self.entry_pms_codes()[ranked], self.positions[ranked], employee_ids[ranked])
+
+# Build a store from (PMS Code, position, Employee ID) entries, departments are kept in order of first appearance
+# and each department's entries are sorted by position
+def store_from_entries(pms_codes, positions, employee_ids):
+    departments, unique_pms_codes = pd.factorize(pd.Series(pms_codes, dtype=object), use_na_sentinel=False)
+    positions = np.asarray(positions, dtype=np.int64)
+    order = np.lexsort((positions, departments))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(departments, minlength=len(unique_pms_codes)))]).astype(np.int64)
+    return RankingStore(np.asarray(unique_pms_codes, dtype=object), offsets, positions[order], np.asarray(employee_ids, dtype=object)[order])
+
+# Build a store from each department's ranked Employee IDs in ranking order
+def store_from_rankings(department_rankings):
+    return store_from_entries(
+        [pms_code for pms_code, employee_ids in department_rankings.items() for _ in employee_ids],
+        [position for employee_ids in department_rankings.values() for position in range(len(employee_ids))],
+        [employee_id for employee_ids in department_rankings.values() for employee_id in employee_ids],
+    )
+
+# Build a store from the Match 1..N columns of a consolidated HOD rankings frame, skipping blank cells
+# As in the matching, a later row with the same PMS Code replaces an earlier one
+def store_from_wide(hod_rankings):
+    match_cols = [col for col in hod_rankings.columns if 'Match' in str(col)]
+    rows = hod_rankings.drop_duplicates(subset='PMS Code', keep='last')
+    values = rows[match_cols].to_numpy(dtype=object)
+    row_index, positions = np.nonzero(pd.notna(values))
+    return store_from_entries(rows['PMS Code'].to_numpy(dtype=object)[row_index], positions, values[row_index, positions])
+
+# Columns of the consolidated rankings other than the Match columns
+def department_columns(hod_rankings):
+    return hod_rankings[[col for col in hod_rankings.columns if 'Match' not in str(col)]]
+
+# Whether a workbook is a store written by save_store, rather than a consolidated file with Match columns
+def is_store_file(path):
+    with pd.ExcelFile(path) as workbook:
+        return set(store_sheets) <= set(workbook.sheet_names)
+
+def save_store(path, hod_rankings, rankings):
+    with pd.ExcelWriter(path) as writer:
+        department_columns(hod_rankings).to_excel(writer, sheet_name='Departments', index=False)
+        rankings.entries().to_excel(writer, sheet_name='Rankings', index=False)
+
+# Departments frame and store of a saved store, with the Employee IDs as text
+def load_store(path):
+    sheets = Excel_Cache.read_excel(path, sheet_name=store_sheets)
+    entries = sheets['Rankings']
+    employee_ids = employee_id_text(entries['Employee ID']).to_numpy(dtype=object)
+    ranked = employee_ids != ''
+    rankings = store_from_entries(entries['PMS Code'].to_numpy(dtype=object)[ranked], entries['Position'].to_numpy()[ranked] - 1, employee_ids[ranked])
+    return sheets['Departments'], rankings
@@ -1,63 +1,86 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import argparse
 import os
+import Excel_Cache
+import Run_Profile
 
-def remove_resigned_officers(officer_rankings, removed_officers_path):
-    removed_officers = pd.read_excel(removed_officers_path, sheet_name="Exclude from MOPEX")
+# Load the "Exclude from MOPEX" and "Posting Blacklist" sheets in one pass over the workbook
+def load_removed_officers_file(removed_officers_path):
+    sheets = Excel_Cache.read_excel(removed_officers_path, sheet_name=["Exclude from MOPEX", "Posting Blacklist"])
+    return sheets["Exclude from MOPEX"], sheets["Posting Blacklist"]
+
+def remove_resigned_officers(officer_rankings, removed_officers):
     removed_Employee_ID = removed_officers['Employee ID'].tolist()
     officer_rankings = officer_rankings[~officer_rankings['Employee ID'].isin(removed_Employee_ID)]
     return officer_rankings
 
 def posting_blacklist(mo_ranking_data, posting_blacklist_data):
-    # Create a dictionary mapping each Employee ID to a set of their blacklisted PMS Codes.
-    blacklist_dict = posting_blacklist_data.groupby('Employee ID')['PMS Code'].apply(set).to_dict()
-
     choice_columns = [col for col in mo_ranking_data.columns if "choice" in col]
 
-    # Iterate over each officer in the main DataFrame.
-    for index, officer_row in mo_ranking_data.iterrows():
-        employee_id = officer_row['Employee ID']
-
-        # Check if the current officer has any blacklist entries.
-        if employee_id in blacklist_dict:
-            pms_codes_to_blacklist = blacklist_dict[employee_id]
-
-            # Iterate through each of the officer's choices.
-            for col in choice_columns:
-                # If a choice is in the set of blacklisted codes, modify it.
-                if officer_row[col] in pms_codes_to_blacklist:
-                    # Use .at for direct, fast, label-based modification.
-                    mo_ranking_data.at[index, col] = "Blacklisted-" + str(officer_row[col])
-    
+    # Set of blacklisted (Employee ID, PMS Code) pairs
+    blacklisted_pairs = pd.MultiIndex.from_frame(posting_blacklist_data[['Employee ID', 'PMS Code']].dropna().drop_duplicates())
+    if not choice_columns or blacklisted_pairs.empty:
+        return mo_ranking_data
+
+    # Test every (officer, choice) cell against the blacklist at once
+    choices = mo_ranking_data[choice_columns].to_numpy(dtype=object)
+    employee_ids = np.repeat(mo_ranking_data['Employee ID'].to_numpy(dtype=object), len(choice_columns))
+    blacklisted = pd.MultiIndex.from_arrays([employee_ids, choices.ravel()]).isin(blacklisted_pairs).reshape(choices.shape)
+    if not blacklisted.any():
+        return mo_ranking_data
+
+    # Prefix the blacklisted choices and write the affected columns back in one assignment
+    choices[blacklisted] = ["Blacklisted-" + str(choice) for choice in choices[blacklisted]]
+    changed = np.flatnonzero(blacklisted.any(axis=0))
+    changed_columns = [choice_columns[position] for position in changed]
+    mo_ranking_data[changed_columns] = pd.DataFrame(choices[:, changed], index=mo_ranking_data.index, columns=changed_columns)
     return mo_ranking_data
 
+# Remove excluded officers and apply the posting blacklist, returning the updated MO rankings
+def update_mo_rankings(officer_rankings, removed_officers_path):
+    removed_officers, posting_blacklist_data = load_removed_officers_file(removed_officers_path)
+    officer_rankings = remove_resigned_officers(officer_rankings, removed_officers)
+    return posting_blacklist(officer_rankings.copy(), posting_blacklist_data)
+
+# Update the MO rankings file and save it next to the original, returning the new file name
+def main(officer_rankings_path, removed_officers_path, progress=None):
+    with Run_Profile.RunProfile('Remove_MOs', progress) as report:
+        report('Loading MO rankings')
+        if os.path.exists(officer_rankings_path):
+            officer_rankings = Excel_Cache.read_excel(officer_rankings_path)
+            report.record_rows(officers=len(officer_rankings))
+        else:
+            print(f"No file found at: {officer_rankings_path}")
+            return None
+
+        # Removing resigned officers and applying posting blacklist
+        report('Removing officers and applying blacklist')
+        updated_mo_ranking_data = update_mo_rankings(officer_rankings, removed_officers_path)
+        report.record_rows(officers=len(updated_mo_ranking_data), removed=len(officer_rankings) - len(updated_mo_ranking_data))
+
+        # Extract directory from MORankFile path
+        output_dir = os.path.dirname(officer_rankings_path) 
+
+        # Save the updated rankings to a new file in the same directory
+        report('Saving updated MO rankings')
+        date_string = datetime.today().strftime('%d-%m-%Y')
+        output_filename = os.path.join(output_dir, f'Updated MO Ranking Consolidated {date_string}.xlsx')
+        updated_mo_ranking_data.to_excel(output_filename, index=False) 
+        report.record_rows(rows=len(updated_mo_ranking_data))
+        report.write(output_dir)
+        return output_filename
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--MORankFile', type=str, required=True, help="The file name of MO Ranking Consolidated")
     parser.add_argument('--RemovedMOFile', type=str, required=True, help="The file name of Removed MOs") 
+    Excel_Cache.add_cache_arguments(parser)
+    Run_Profile.add_profile_arguments(parser)
     args = parser.parse_args()
-    
-    officer_rankings_path = args.MORankFile
-    removed_officers_path = args.RemovedMOFile 
-
-    if os.path.exists(officer_rankings_path):
-        officer_rankings = pd.read_excel(officer_rankings_path)
-    else:
-        print(f"No file found at: {officer_rankings_path}")
-        exit()
+    Excel_Cache.apply_cache_arguments(args)
+    Run_Profile.apply_profile_arguments(args)
 
-    # Removing resigned officers
-    officer_rankings = remove_resigned_officers(officer_rankings, removed_officers_path)
-    
-    # Applying posting blacklist
-    posting_blacklist_data = pd.read_excel(removed_officers_path, sheet_name="Posting Blacklist")
-    updated_mo_ranking_data = posting_blacklist(officer_rankings, posting_blacklist_data)
-
-    # Extract directory from MORankFile path
-    output_dir = os.path.dirname(officer_rankings_path) 
-
-    # Save the updated rankings to a new file in the same directory
-    date_string = datetime.today().strftime('%d-%m-%Y')
-    output_filename = os.path.join(output_dir, f'Updated MO Ranking Consolidated {date_string}.xlsx')
-    updated_mo_ranking_data.to_excel(output_filename, index=False) 
+    if main(args.MORankFile, args.RemovedMOFile) is None:
+        exit()
@@ -0,0 +1,157 @@
+"""
+README:
+Per-stage run profiles for HOD_Rank_Compiler, Remove_MOs and Match_Algo.
+A RunProfile wraps a script's progress callback, so every stage the script reports is measured for wall time, CPU
+time, traced memory (when tracemalloc is running) and the row counts the script records. The operating system only
+reports the peak RSS of the whole process, so each stage records the process peak so far and how much the stage raised
+it, a stage that stays below an earlier peak shows no growth. The profile is written as JSON next to the script's
+outputs.
+With --profile the stages are also run under cProfile and the statistics are dumped to a .pstats file, which can be
+read with `python -m pstats <file>`.
+"""
+
+# import necessary libraries
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# resource is not available on Windows, where peak RSS is not recorded
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Profile settings, changed through configure() or the --profile/--trace-memory script flags
+settings = {
+    'cprofile': False,
+    'trace_memory': False,
+}
+
+def configure(cprofile=None, trace_memory=None):
+    if cprofile is not None:
+        settings['cprofile'] = cprofile
+    if trace_memory is not None:
+        settings['trace_memory'] = trace_memory
+
+# Add the profile flags to a script's argument parser and apply them once parsed
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', action='store_true', help="Also write a cProfile statistics file of the profiled stages")
+    parser.add_argument('--trace-memory', action='store_true', help="Trace Python memory allocations of each stage, slows the run down")
+
+def apply_profile_arguments(args):
+    configure(cprofile=args.profile, trace_memory=args.trace_memory)
+
+# Peak resident set size of the process so far in MB, ru_maxrss is in bytes on macOS and KB elsewhere
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+# Used as a context manager around a script's run, so tracemalloc and cProfile are stopped however the run ends
+class RunProfile:
+    # progress is the caller's callback, which still receives every stage
+    # cprofile_stages limits cProfile to the named stages, e.g. the matching loops, None profiles every stage
+    def __init__(self, script_name, progress=None, cprofile_stages=None):
+        self.script_name = script_name
+        self.progress = progress
+        self.cprofile_stages = cprofile_stages
+        self.profiler = cProfile.Profile() if settings['cprofile'] else None
+        self.started_tracing = settings['trace_memory'] and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.started_at = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.stages = []
+        self.current_stage = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Stop the profiler and the memory tracing this profile started, also when the run returned early or failed
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    # Progress callback marking the start of a stage, which ends the previous one
+    def __call__(self, stage):
+        self.end_stage()
+        if self.progress is not None:
+            self.progress(stage)
+
+        rss = peak_rss_mb()
+        self.current_stage = {'stage': stage, 'rows': {}, 'start_rss_mb': rss,
+                              'started_at': time.perf_counter(), 'started_cpu': time.process_time()}
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.current_stage['start_traced_mb'] = tracemalloc.get_traced_memory()[0] / 2**20
+        if self.profiler is not None and (self.cprofile_stages is None or stage in self.cprofile_stages):
+            self.profiler.enable()
+
+    # Record row counts of the current stage, e.g. record_rows(officers=len(officer_choices))
+    def record_rows(self, **counts):
+        if self.current_stage is not None:
+            self.current_stage['rows'].update({name: int(count) for name, count in counts.items()})
+
+    def end_stage(self):
+        stage = self.current_stage
+        if stage is None:
+            return
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        rss = peak_rss_mb()
+        start_traced_mb = stage.pop('start_traced_mb', None)
+        self.stages.append({
+            'stage': stage['stage'],
+            'wall_seconds': round(time.perf_counter() - stage.pop('started_at'), 4),
+            'cpu_seconds': round(time.process_time() - stage.pop('started_cpu'), 4),
+            'process_peak_rss_mb': round(rss, 1) if rss is not None else None,
+            'process_peak_growth_mb': round(rss - stage.pop('start_rss_mb'), 1) if rss is not None else None,
+            'traced_peak_mb': round(tracemalloc.get_traced_memory()[1] / 2**20 - start_traced_mb, 2) if start_traced_mb is not None and tracemalloc.is_tracing() else None,
+            'rows': stage['rows'],
+        })
+        self.current_stage = None
+
+    # End the last stage and write the JSON profile (and the cProfile statistics) to output_dir
+    def write(self, output_dir):
+        self.end_stage()
+        self.close()
+
+        profile_path = os.path.join(output_dir, f'{self.script_name} profile.json')
+        pstats_path = None
+        if self.profiler is not None:
+            pstats_path = os.path.join(output_dir, f'{self.script_name}.pstats')
+            self.profiler.dump_stats(pstats_path)
+
+        rss = peak_rss_mb()
+        with open(profile_path, 'w') as f:
+            json.dump({
+                'script': self.script_name,
+                'started': self.started,
+                'wall_seconds': round(time.perf_counter() - self.started_at, 4),
+                'cpu_seconds': round(time.process_time() - self.started_cpu, 4),
+                'process_peak_rss_mb': round(rss, 1) if rss is not None else None,
+                'pstats': pstats_path,
+                'stages': self.stages,
+            }, f, indent=2)
+        return profile_path
+
+# Stand-in for a RunProfile where a run is not profiled, e.g. each scenario of a batch
+class NoProfile:
+    def __call__(self, stage):
+        pass
+
+    def record_rows(self, **counts):
+        pass
@@ -0,0 +1,207 @@
+"""
+README:
+Runs what-if scenarios of Match_Algo in one batch.
+The base input files are parsed once, and the steps no override changes are run once on them: the officers without
+choices are split off, the choices are checked against the license requirements and the IDs and PMS Codes are encoded
+to a Code_Table. These prepared inputs are handed to each worker process when it starts, and every scenario applies
+its overrides to a copy of them before GDFM prioritisation and both matching rounds, deriving its code table from the
+base table.
+Scenarios file (Excel or CSV), one override per row:
+    Scenario    - name of the scenario, rows with the same name are applied together
+    Action      - 'Set Vacancies', 'Drop Officer' or 'Set GDFM Eligibility'
+    PMS Code    - department of 'Set Vacancies'
+    Employee ID - officer of 'Drop Officer' and 'Set GDFM Eligibility'
+    Value       - new vacancies, or Y/N for the GDFM eligibility
+A 'Base' scenario without overrides is always run first, so no scenario in the file may be named 'Base'.
+'Scenario Comparison.xlsx' in the output folder compares the scenarios' matches, unmatched officers and department
+fill rates, including how many officers' postings differ from the base run.
+"""
+
+# import necessary libraries
+import argparse
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import Code_Table
+import Excel_Cache
+import Match_Algo
+import Run_Profile
+
+scenario_actions = ['Set Vacancies', 'Drop Officer', 'Set GDFM Eligibility']
+base_scenario = 'Base'
+
+def load_scenarios(scenarios_path):
+    if scenarios_path.lower().endswith('.csv'):
+        scenarios = pd.read_csv(scenarios_path, dtype={'Employee ID': str, 'PMS Code': str})
+    else:
+        scenarios = Excel_Cache.read_excel(scenarios_path, dtype={'Employee ID': str, 'PMS Code': str})
+    unknown_actions = sorted(set(scenarios['Action']) - set(scenario_actions))
+    if unknown_actions:
+        raise ValueError(f"Unknown scenario actions {unknown_actions}, expected one of {scenario_actions}")
+
+    # The base run is compared against every scenario, so a scenario of the same name would change the comparison
+    if (scenarios['Scenario'].astype(str) == base_scenario).any():
+        raise ValueError(f"'{base_scenario}' is the name of the run without overrides, please rename that scenario")
+
+    # Overrides of each scenario, keeping the order of the scenarios file
+    overrides = {base_scenario: []}
+    for scenario, rows in scenarios.groupby('Scenario', sort=False):
+        overrides.setdefault(str(scenario), []).extend(rows[['Action', 'PMS Code', 'Employee ID', 'Value']].to_dict('records'))
+    return overrides
+
+# Split off the officers without choices, check the license requirements and encode the IDs and PMS Codes of the base
+# inputs, none of which depend on a scenario's overrides
+# The base code table covers every department, also those without vacancies, which a scenario may give vacancies
+def prepare_inputs(base_inputs, report):
+    hod_rankings, rankings, officer_choices, posting_license_requirement, GDFM1, GDFM2 = base_inputs
+    no_choice_officers, officer_choices = Match_Algo.prepare_choices(officer_choices.copy(), posting_license_requirement, report)
+
+    report('Encoding IDs and PMS Codes')
+    choice_columns = [col for col in officer_choices.columns if 'choice' in col.lower()]
+    table = Code_Table.CodeTable(officer_choices, hod_rankings, choice_columns, rankings)
+    report.record_rows(officers=len(table.officer_ids), departments=len(table.department_codes), rankings=len(table.ranked_officers))
+    return hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2, table
+
+# Apply a scenario's overrides to copies of the prepared inputs
+def apply_overrides(prepared_inputs, overrides):
+    *frames, table = prepared_inputs
+    hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2 = (frame.copy() for frame in frames)
+
+    for override in overrides:
+        if override['Action'] == 'Set Vacancies':
+            rows = hod_rankings['PMS Code'] == override['PMS Code']
+            if not rows.any():
+                raise ValueError(f"PMS Code {override['PMS Code']} is not in the HOD Rankings")
+            hod_rankings.loc[rows, 'Vacancies'] = int(override['Value'])
+        elif override['Action'] == 'Drop Officer':
+            rows = officer_choices['Employee ID'] == override['Employee ID']
+            no_choice_rows = no_choice_officers['Employee ID'] == override['Employee ID']
+            if not rows.any() and not no_choice_rows.any():
+                raise ValueError(f"Officer {override['Employee ID']} is not in the MO Rankings")
+            officer_choices = officer_choices[~rows]
+            no_choice_officers = no_choice_officers[~no_choice_rows]
+        elif override['Action'] == 'Set GDFM Eligibility':
+            found = False
+            for GDFM in (GDFM1, GDFM2):
+                rows = GDFM['Employee ID'] == override['Employee ID']
+                GDFM.loc[rows, 'Eligible for Prioritisation'] = override['Value']
+                found = found or rows.any()
+            if not found:
+                raise ValueError(f"Officer {override['Employee ID']} is not in the GDFM List")
+
+    return hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2, table
+
+# Run one scenario on the prepared inputs, returning its counts, each department's matches and each officer's final posting
+def run_scenario(prepared_inputs, scenario, overrides):
+    started_at = time.perf_counter()
+    hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement, GDFM1, GDFM2, table = apply_overrides(prepared_inputs, overrides)
+
+    # GDFM messages are the same for every scenario, so they are not repeated for each one
+    with contextlib.redirect_stdout(io.StringIO()):
+        tables, exceptions = Match_Algo.run_prepared_matching(hod_rankings, rankings, no_choice_officers, officer_choices, posting_license_requirement,
+                                                              GDFM1, GDFM2, Run_Profile.NoProfile(), base_table=table)
+
+    final_matches = tables['Final Matches']
+    return {
+        'summary': {
+            'Scenario': scenario,
+            'Overrides': len(overrides),
+            'Officers': len(officer_choices) + len(no_choice_officers),
+            'Vacancies': int(hod_rankings['Vacancies'].sum()),
+            'Round 1 Matches': len(tables['Mutual Matches']),
+            'Total Matches': len(final_matches),
+            'Unmatched Officers': len(tables['Unmatched Officers']),
+            'No Choice Officers': len(tables['No Choice Officers']),
+            'Exceptions': len(exceptions),
+            'Verification Problems': len(tables['Match Verification']),
+            'Seconds': round(time.perf_counter() - started_at, 3),
+        },
+        'vacancies': hod_rankings.groupby('PMS Code')['Vacancies'].sum().to_dict(),
+        'department_matches': final_matches['PMS Code'].value_counts().to_dict(),
+        'postings': dict(zip(final_matches['Employee ID'], final_matches['PMS Code'])),
+    }
+
+# Worker process state, the prepared inputs are sent once per worker instead of with every scenario
+worker_state = {}
+
+def init_worker(prepared_inputs, cache_settings):
+    worker_state['prepared_inputs'] = prepared_inputs
+    Excel_Cache.configure(**cache_settings)
+
+def run_scenario_in_worker(scenario_overrides):
+    scenario, overrides = scenario_overrides
+    return run_scenario(worker_state['prepared_inputs'], scenario, overrides)
+
+# Comparison of the scenarios, and the fill rate of every department in each scenario
+def compare_scenarios(results):
+    base = results[0]
+    summary = pd.DataFrame([result['summary'] for result in results])
+    summary['Fill Rate'] = (summary['Total Matches'] / summary['Vacancies'].where(summary['Vacancies'] > 0)).round(4)
+    summary['Changed Postings'] = [
+        sum(1 for officer in set(base['postings']) | set(result['postings']) if base['postings'].get(officer) != result['postings'].get(officer))
+        for result in results
+    ]
+
+    fill_rates = pd.DataFrame({
+        result['summary']['Scenario']: {
+            department: round(result['department_matches'].get(department, 0) / vacancies, 4) if vacancies > 0 else None
+            for department, vacancies in result['vacancies'].items()
+        }
+        for result in results
+    })
+    fill_rates.index.name = 'PMS Code'
+    return summary, fill_rates.reset_index()
+
+# Run all scenarios on a process pool when more than one worker is requested
+def run_scenarios(prepared_inputs, scenarios, workers=1):
+    items = list(scenarios.items())
+    if workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(prepared_inputs, dict(Excel_Cache.settings))) as executor:
+            return list(executor.map(run_scenario_in_worker, items))
+    return [run_scenario(prepared_inputs, scenario, overrides) for scenario, overrides in items]
+
+def main(hod_rankings_path, officer_choices_path, GDFM_list_path, scenarios_path, workers=1, progress=None):
+    with Run_Profile.RunProfile('Scenario_Runner', progress) as report:
+
+        output_folder_path = os.path.join(os.path.dirname(officer_choices_path), 'output')
+        if not os.path.exists(output_folder_path):
+            os.makedirs(output_folder_path)
+
+        # Parse the base inputs and the scenarios once
+        report('Loading input files')
+        base_inputs = Match_Algo.load_inputs(hod_rankings_path, officer_choices_path, GDFM_list_path)
+        scenarios = load_scenarios(scenarios_path)
+        report.record_rows(officer_choices=len(base_inputs[2]), scenarios=len(scenarios))
+
+        # Run the steps no override changes once for all scenarios
+        prepared_inputs = prepare_inputs(base_inputs, report)
+
+        report('Running scenarios')
+        results = run_scenarios(prepared_inputs, scenarios, workers)
+
+        report('Writing comparison')
+        summary, fill_rates = compare_scenarios(results)
+        with pd.ExcelWriter(os.path.join(output_folder_path, 'Scenario Comparison.xlsx')) as writer:
+            summary.to_excel(writer, sheet_name='Summary', index=False)
+            fill_rates.to_excel(writer, sheet_name='Department Fill Rates', index=False)
+        report.write(output_folder_path)
+        return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--HODRankFile', type=str, required=True, help="The file name of HOD Rankings Consolidated, or of the HOD Rankings Store written next to it")
+    parser.add_argument('--MORankFile', type=str, required=True, help="The file name of MO Ranking Consolidated")
+    parser.add_argument('--GDFM', type=str, required=True, help="The file name of GDFM List")
+    parser.add_argument('--Scenarios', type=str, required=True, help="Excel or CSV file of scenario overrides")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes running scenarios")
+    Excel_Cache.add_cache_arguments(parser)
+    Run_Profile.add_profile_arguments(parser)
+    args = parser.parse_args()
+    Excel_Cache.apply_cache_arguments(args)
+    Run_Profile.apply_profile_arguments(args)
+
+    summary = main(args.HODRankFile, args.MORankFile, args.GDFM, args.Scenarios, args.workers)
+    print(summary.to_string(index=False))
@@ -0,0 +1,180 @@
+"""
+README:
+Seeded generator of a synthetic MOPEX cohort, used for benchmarking the pipeline at realistic scales.
+It writes the same input files the scripts read:
+    MOPEX Staff List.xlsx               - MCR No. to Employee ID mapping
+    raw/<PMS Code>.xlsx                 - each department's HOD raw data file
+    HOD Rankings.xlsx                   - consolidated HOD rankings template with the vacancies
+    MO Ranking Consolidated.xlsx        - officers' choices and registration types
+    Posting License Requirements.xlsx   - license requirement of some postings
+    GDFM List.xlsx                      - the two GDFM cohort sheets
+    Removed MOs.xlsx                    - the "Exclude from MOPEX" and "Posting Blacklist" sheets
+Posting popularity is skewed, so a few postings are heavily oversubscribed as in a real posting cycle.
+With specialty_clusters the postings are split into that many specialty clusters and every officer only chooses
+postings of one cluster, so the matching splits into independent groups as the specialties do in a real cycle.
+"""
+
+# import necessary libraries
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+polyclinic_postings = ['NHGPlyNHGPly', 'SHSPlySHSPly', 'NUPNUP']
+license_hierarchy = ["Conditional-L1", "Conditional-L2", "Conditional-L3", "Full"]
+
+# Named cohort sizes used by the benchmarks
+scales = {
+    'small': {'n_officers': 1000, 'n_postings': 50},
+    'medium': {'n_officers': 10000, 'n_postings': 500},
+    'large': {'n_officers': 100000, 'n_postings': 5000},
+}
+
+# Column name of the n-th choice, e.g. '1st choice', '12th choice'
+def choice_column(n):
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix} choice'
+
+# Each officer's choices as posting indices, drawn without replacement in order of posting popularity
+# Uses the Gumbel top-k trick in chunks so large cohorts do not need one draw per officer
+# With officer and posting clusters, postings of other clusters are drawn last and left out by the caller
+def draw_choices(rng, n_officers, popularity, max_choices, officer_clusters=None, posting_clusters=None, chunk_size=2000):
+    log_popularity = np.log(popularity)
+    choices = np.empty((n_officers, max_choices), dtype=np.int64)
+    for start in range(0, n_officers, chunk_size):
+        keys = log_popularity + rng.gumbel(size=(min(chunk_size, n_officers - start), len(popularity)))
+        if officer_clusters is not None:
+            keys[posting_clusters[None, :] != officer_clusters[start:start + len(keys), None]] = -np.inf
+        top = np.argpartition(-keys, max_choices - 1, axis=1)[:, :max_choices]
+        order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+        choices[start:start + len(keys)] = np.take_along_axis(top, order, axis=1)
+    return choices
+
+def generate_cohort(directory, n_officers=1000, n_postings=50, min_choices=3, max_choices=10, seed=0,
+                    vacancy_ratio=0.9, popularity_skew=0.8, hod_ranked_ratio=0.8, licensed_posting_ratio=0.2,
+                    gdfm_ratio=0.02, excluded_ratio=0.01, blacklisted_ratio=0.005, specialty_clusters=1):
+    rng = np.random.default_rng(seed)
+    max_choices = min(max_choices, n_postings)
+    min_choices = min(min_choices, max_choices)
+    os.makedirs(os.path.join(directory, 'raw'), exist_ok=True)
+
+    # Officers, with Employee IDs stored as text as in the staff list
+    employee_ids = np.array([str(100000 + i) for i in range(n_officers)], dtype=object)
+    mcr_numbers = np.array([f'M{i:06d}' for i in range(n_officers)], dtype=object)
+    registration_types = rng.choice(['Full', 'Provisional'] + license_hierarchy[:3], size=n_officers, p=[0.65, 0.1, 0.1, 0.08, 0.07])
+
+    # Postings, the polyclinic clusters first so GDFM prioritisation has something to do
+    pms_codes = polyclinic_postings[:n_postings] + [f'P{j:05d}' for j in range(n_postings - len(polyclinic_postings[:n_postings]))]
+    popularity = rng.permutation(1.0 / np.arange(1, n_postings + 1) ** popularity_skew)
+    mean_vacancies = n_officers * vacancy_ratio / n_postings
+    vacancies = np.maximum(rng.poisson(mean_vacancies * popularity / popularity.mean()), 0)
+    vacancies[rng.random(n_postings) < 0.05] = 0  # Some postings have no vacancy this cycle
+
+    # Postings are dealt to the specialty clusters in turn and officers join a cluster in proportion to its vacancies
+    posting_clusters = np.arange(n_postings) % specialty_clusters
+    officer_clusters = None
+    if specialty_clusters > 1:
+        cluster_vacancies = np.bincount(posting_clusters, weights=vacancies + 1, minlength=specialty_clusters)
+        officer_clusters = rng.choice(specialty_clusters, size=n_officers, p=cluster_vacancies / cluster_vacancies.sum())
+
+    # Officers' choices, with preference list lengths varying between min_choices and max_choices, and shorter lists
+    # where an officer's cluster has fewer postings
+    choices = draw_choices(rng, n_officers, popularity, max_choices, officer_clusters, posting_clusters)
+    list_lengths = rng.integers(min_choices, max_choices + 1, size=n_officers)
+    chosen = np.arange(max_choices)[None, :] < list_lengths[:, None]
+    if officer_clusters is not None:
+        chosen &= posting_clusters[choices] == officer_clusters[:, None]
+    choice_codes = np.where(chosen, np.array(pms_codes, dtype=object)[choices], np.nan)
+    choice_codes[rng.random(n_officers) < 0.005] = np.nan  # A few officers submit no choices
+
+    # Staff list
+    pd.DataFrame({'MCR No.': mcr_numbers, 'Employee ID': employee_ids}).to_excel(os.path.join(directory, 'MOPEX Staff List.xlsx'), index=False)
+
+    # HOD raw data files: each department ranks most officers who chose it, the MO Ranking is the officer's choice position
+    officer_rows, positions = np.nonzero(chosen & pd.notna(choice_codes))
+    applications = pd.DataFrame({'Posting': choices[officer_rows, positions], 'Officer': officer_rows, 'MO Ranking': positions + 1})
+    applications = applications.sample(frac=1, random_state=seed).sort_values('Posting', kind='stable')
+    for posting, group in applications.groupby('Posting', sort=True):
+        ranked = rng.random(len(group)) < hod_ranked_ratio
+        hod_ranking = np.full(len(group), 'NA', dtype=object)
+        hod_ranking[ranked] = np.arange(1, ranked.sum() + 1)
+        pd.DataFrame({
+            'MCR/DCR Number': mcr_numbers[group['Officer'].values],
+            'Name': [f'Officer {officer}' for officer in group['Officer'].values],
+            'HOD Ranking': hod_ranking,
+            'MO Ranking': group['MO Ranking'].values,
+        }).to_excel(os.path.join(directory, 'raw', f'{pms_codes[posting]}.xlsx'), index=False)
+
+    # Consolidated HOD rankings template
+    pd.DataFrame({'Postings': [f'Posting {code}' for code in pms_codes], 'PMS Code': pms_codes, 'Vacancies': vacancies}).to_excel(os.path.join(directory, 'HOD Rankings.xlsx'), index=False)
+
+    # MO rankings
+    mo_rankings = pd.DataFrame({'Employee Name': [f'Officer {i}' for i in range(n_officers)], 'Employee ID': employee_ids})
+    for position in range(max_choices):
+        mo_rankings[choice_column(position + 1)] = choice_codes[:, position]
+    mo_rankings['Registration Type'] = registration_types
+    mo_rankings.to_excel(os.path.join(directory, 'MO Ranking Consolidated.xlsx'), index=False)
+
+    # License requirements of a sample of postings
+    licensed = rng.random(n_postings) < licensed_posting_ratio
+    pd.DataFrame({
+        'PMS Code': np.array(pms_codes, dtype=object)[licensed],
+        'Requirement': rng.choice(license_hierarchy, size=licensed.sum(), p=[0.1, 0.2, 0.3, 0.4]),
+    }).to_excel(os.path.join(directory, 'Posting License Requirements.xlsx'), index=False)
+
+    # GDFM cohorts drawn from officers whose first choice is a polyclinic cluster, no officer is in both cohorts
+    polyclinic_first = np.flatnonzero(np.isin(choice_codes[:, 0].astype(str), polyclinic_postings))
+    n_gdfm = min(len(polyclinic_first), int(round(n_officers * gdfm_ratio)))
+    gdfm_officers = rng.choice(polyclinic_first, size=n_gdfm, replace=False)
+    with pd.ExcelWriter(os.path.join(directory, 'GDFM List.xlsx')) as writer:
+        for cohort, officers in enumerate(np.array_split(gdfm_officers, 2), start=1):
+            sheet_name = f'GDFM Intake {cohort}'
+            pd.DataFrame({
+                'Employee ID': employee_ids[officers],
+                'Eligible for Prioritisation': rng.choice(['Y', 'N'], size=len(officers), p=[0.85, 0.15]),
+            }).to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
+            writer.sheets[sheet_name].cell(row=1, column=1, value=f'GDFM Intake {cohort}')
+
+    # Officers excluded from MOPEX, and blacklisted (officer, posting) pairs taken from officers' choices
+    excluded = rng.choice(n_officers, size=int(round(n_officers * excluded_ratio)), replace=False)
+    blacklisted = rng.choice(len(officer_rows), size=min(len(officer_rows), int(round(n_officers * blacklisted_ratio))), replace=False)
+    with pd.ExcelWriter(os.path.join(directory, 'Removed MOs.xlsx')) as writer:
+        pd.DataFrame({'Employee ID': employee_ids[excluded]}).to_excel(writer, sheet_name='Exclude from MOPEX', index=False)
+        pd.DataFrame({
+            'Employee ID': employee_ids[officer_rows[blacklisted]],
+            'PMS Code': choice_codes[officer_rows[blacklisted], positions[blacklisted]],
+        }).to_excel(writer, sheet_name='Posting Blacklist', index=False)
+
+    return cohort_paths(directory)
+
+# Paths of the files written by generate_cohort
+def cohort_paths(directory):
+    return {
+        'raw_dir': os.path.join(directory, 'raw'),
+        'hod_rankings': os.path.join(directory, 'HOD Rankings.xlsx'),
+        'staff_list': os.path.join(directory, 'MOPEX Staff List.xlsx'),
+        'mo_rankings': os.path.join(directory, 'MO Ranking Consolidated.xlsx'),
+        'license_requirements': os.path.join(directory, 'Posting License Requirements.xlsx'),
+        'gdfm': os.path.join(directory, 'GDFM List.xlsx'),
+        'removed_mos': os.path.join(directory, 'Removed MOs.xlsx'),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic MOPEX cohort.")
+    parser.add_argument('--dir', type=str, required=True, help="Directory to write the cohort files to")
+    parser.add_argument('--scale', choices=list(scales), help="Named cohort size, overridden by --officers and --postings")
+    parser.add_argument('--officers', type=int, help="Number of officers")
+    parser.add_argument('--postings', type=int, help="Number of postings")
+    parser.add_argument('--min-choices', type=int, default=3, help="Shortest officer preference list")
+    parser.add_argument('--max-choices', type=int, default=10, help="Longest officer preference list")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--clusters', type=int, default=1, help="Number of specialty clusters officers choose within")
+    args = parser.parse_args()
+
+    size = dict(scales[args.scale or 'small'])
+    if args.officers:
+        size['n_officers'] = args.officers
+    if args.postings:
+        size['n_postings'] = args.postings
+    generate_cohort(args.dir, min_choices=args.min_choices, max_choices=args.max_choices, seed=args.seed, specialty_clusters=args.clusters, **size)
+    print(f"Wrote a cohort of {size['n_officers']} officers and {size['n_postings']} postings to {args.dir}")
@@ -1,40 +1,36 @@
+import importlib
+import importlib.util
 import subprocess
 import sys
-
-# Check if a python library is installed
-def is_module_installed(module_name):
-    try:
-        __import__(module_name)
-        return True
-    except ImportError:
-        return False
-
-# Install a python library using pip
-def install_module(module_name):
-    subprocess.check_call([sys.executable, "-m", "pip", "install", module_name])
-
-# Check and install pandas if not present
-if not is_module_installed("pandas"):
-    install_module("pandas")
-
-# Check and install openpyxl if not present
-if not is_module_installed("openpyxl"):
-    install_module("openpyxl")
-
-# Check and install tkinter if not present
-if not is_module_installed("tkinter"):
-    install_module("tkinter")
-
 import tkinter as tk
 from tkinter import font
 from tkinter import filedialog
 import tkinter.messagebox as msg
+from Job_Runner import JobRunner
+
+# Libraries needed by the pipeline stages, which are only imported when a stage is first run
+required_modules = ["pandas", "openpyxl"]
+
+# Check if a python library is installed by looking up its metadata, without importing it
+def is_module_installed(module_name):
+    return importlib.util.find_spec(module_name) is not None
+
+# Install python libraries using pip
+def install_modules(module_names, progress=None):
+    for module_name in module_names:
+        if progress is not None:
+            progress(f"Installing {module_name}")
+        result = subprocess.run([sys.executable, "-m", "pip", "install", module_name], capture_output=True, text=True)
+        print(result.stdout + result.stderr)
+        result.check_returncode()
+    importlib.invalidate_caches()
+    return module_names
 
 class Application(tk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
-        self.master.geometry("500x300")
+        self.master.geometry("700x600")
         self.pack()
 
         self.font = font.Font(size=20)
@@ -47,8 +43,16 @@ class Application(tk.Frame):
         self.gdfm_file = ""
         self.removed_mo_file = ""
 
+        # Background job running the pipeline stages in this process
+        self.job_runner = JobRunner()
+        self.current_stage = ""
+        self.on_job_done = None
+
         self.create_widgets()
 
+        # Check the pipeline libraries once the window is showing
+        self.after_idle(self.check_dependencies)
+
     def create_widgets(self):
         #Creating buttons to open up subwindows
         self.hod_rank_compiler_button = tk.Button(self, text="Compile HOD Ranking", command=self.open_hod_rank_compiler_window, font=self.font)
@@ -60,6 +64,14 @@ class Application(tk.Frame):
         self.remove_mos_button = tk.Button(self, text="Remove MOs + Blacklist", command=self.open_remove_mos_window, font=self.font)
         self.remove_mos_button.pack(pady=20)
 
+        # Job status, cancel button and log of stage progress and messages
+        self.status_label = tk.Label(self, text="Idle", font=self.font)
+        self.status_label.pack()
+        self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel_job, font=self.font, state=tk.DISABLED)
+        self.cancel_button.pack(pady=10)
+        self.log_text = tk.Text(self, height=8, width=70)
+        self.log_text.pack()
+
         #Formatting to center buttons and text
         self.columnconfigure(0, weight=1)
 
@@ -118,11 +130,12 @@ class Application(tk.Frame):
         elif not self.mopex_staff_listing:
             msg.showerror("Error, MOPEX staff listing file is required!")
         else:
-            try:
-                subprocess.check_call(["python", "HOD_Rank_Compiler.py", "--dir", self.dir_path, "--HODRankFile", self.hod_rank_file, "--MOPEXStaffList", self.mopex_staff_listing])
-                msg.showinfo("Success", "The script has completed successfully!")
-            except subprocess.CalledProcessError:
-                msg.showerror("Error", "An error has occurred, please recheck the files again.")
+            def on_done(error_rows):
+                if error_rows:
+                    msg.showerror("Error", "Invalid blank columns were found in the consolidated HOD rankings, see the log for the affected PMS Codes.")
+                else:
+                    msg.showinfo("Success", "The script has completed successfully!")
+            self.start_job("Compile HOD Ranking", "HOD_Rank_Compiler", on_done, self.dir_path, self.hod_rank_file, self.mopex_staff_listing)
     
     def open_match_algo_window(self):
         self.match_algo_window = tk.Toplevel(self.master)
@@ -179,14 +192,9 @@ class Application(tk.Frame):
         elif not self.gdfm_file:
             msg.showerror("Error", "GDFM Intake file is required!")
         else:
-            try:
-                subprocess.check_call(["python", "Match_Algo.py", 
-                                      "--HODRankFile", self.hod_rank_file, 
-                                      "--MORankFile", self.mo_rank_file, 
-                                      "--GDFM", self.gdfm_file])
-                msg.showinfo("Success", "The script has completed successfully!")
-            except subprocess.CalledProcessError:
-                msg.showerror("Error", "An error has occurred, please recheck the files again.")
+            def on_done(output_folder_path):
+                msg.showinfo("Success", f"The script has completed successfully!\nOutputs were saved to {output_folder_path}")
+            self.start_job("Generate Match", "Match_Algo", on_done, self.hod_rank_file, self.mo_rank_file, self.gdfm_file)
 
     def open_remove_mos_window(self):
         self.remove_mos_window = tk.Toplevel(self.master)
@@ -228,14 +236,85 @@ class Application(tk.Frame):
         elif not self.removed_mo_file:
             msg.showerror("Error", "Remove MOs file is required!")
         else:
-            try:
-                subprocess.check_call(["python", "Remove_MOs.py",
-                                      "--MORankFile", self.mo_rank_file,
-                                      "--RemovedMOFile", self.removed_mo_file])
-                msg.showinfo("Success", "The script has completed successfully!")
-            except subprocess.CalledProcessError:
-                msg.showerror("Error", "An error has occurred, please recheck the files again.")
-
-root = tk.Tk()
-app = Application(master=root)
-app.mainloop()
\ No newline at end of file
+            def on_done(output_filename):
+                if output_filename is None:
+                    msg.showerror("Error", f"No file found at: {self.mo_rank_file}")
+                else:
+                    msg.showinfo("Success", f"The script has completed successfully!\nSaved {output_filename}")
+            self.start_job("Remove MOs + Blacklist", "Remove_MOs", on_done, self.mo_rank_file, self.removed_mo_file)
+
+    # Run a script's main function in the background job runner, importing the script on first use
+    def start_job(self, job_name, module_name, on_done, *args):
+        def run_script(*script_args, progress):
+            return importlib.import_module(module_name).main(*script_args, progress=progress)
+
+        self.run_job(job_name, run_script, on_done, *args)
+
+    # Run target(*args, progress=...) in the background and call on_done with its result
+    def run_job(self, job_name, target, on_done, *args):
+        if self.job_runner.is_running():
+            msg.showerror("Error", f"{self.job_runner.job_name} is still running, please wait for it to finish or cancel it.")
+            return
+
+        self.on_job_done = on_done
+        self.current_stage = "Starting"
+        self.log_text.delete("1.0", tk.END)
+        self.job_runner.start(job_name, target, *args)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.after(100, self.poll_job)
+
+    # Offer to install missing libraries in the background instead of blocking startup
+    def check_dependencies(self):
+        missing_modules = [module_name for module_name in required_modules if not is_module_installed(module_name)]
+        if not missing_modules:
+            return
+        if msg.askyesno("Missing libraries", f"The following libraries are not installed: {', '.join(missing_modules)}.\nInstall them now?"):
+            def on_done(installed_modules):
+                msg.showinfo("Success", f"Installed {', '.join(installed_modules)}.")
+            self.run_job("Install libraries", install_modules, on_done, missing_modules)
+
+    def cancel_job(self):
+        self.job_runner.cancel()
+        self.current_stage = "Cancelling after the current stage"
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def append_log(self, line):
+        self.log_text.insert(tk.END, line + "\n")
+        self.log_text.see(tk.END)
+
+    # Show the job's progress and outcome, polled from the Tk main loop
+    def poll_job(self):
+        job_name = self.job_runner.job_name
+        elapsed = self.job_runner.elapsed()
+        finished = False
+
+        for event, value in self.job_runner.poll():
+            if event == 'progress':
+                self.current_stage = value
+                self.append_log(f"[{elapsed:6.1f}s] {value}")
+            elif event == 'output':
+                self.append_log(value)
+            elif event == 'done':
+                finished = True
+                self.status_label.config(text=f"{job_name}: completed in {elapsed:.1f}s")
+                self.on_job_done(value)
+            elif event == 'cancelled':
+                finished = True
+                self.status_label.config(text=f"{job_name}: cancelled after {elapsed:.1f}s")
+            elif event == 'error':
+                finished = True
+                error_text, error_traceback = value
+                self.append_log(error_traceback)
+                self.status_label.config(text=f"{job_name}: failed after {elapsed:.1f}s")
+                msg.showerror("Error", f"{job_name} failed:\n{error_text}")
+
+        if finished:
+            self.cancel_button.config(state=tk.DISABLED)
+        else:
+            self.status_label.config(text=f"{job_name}: {self.current_stage} ({elapsed:.1f}s)")
+            self.after(100, self.poll_job)
+
+if __name__ == '__main__':
+    root = tk.Tk()
+    app = Application(master=root)
+    app.mainloop()
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+README:
+Checks the vectorised Match_Algo.check_license against the original row-by-row check in baseline.py on small random
+fixtures, including officers without a registration type, PMS Codes listed twice and inputs with nothing to check.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import baseline
+import Match_Algo
+
+licenses = Match_Algo.license_hierarchy
+
+# Officers of random registration types with random choices, and requirements of some of the departments
+def fixture(seed, n_officers=10, n_departments=6, n_choices=3):
+    rng = np.random.default_rng(seed)
+    pms_codes = [f'D{department}' for department in range(n_departments)]
+    choices = rng.choice(pms_codes + [''], size=(n_officers, n_choices)).astype(object)
+    choices[choices == ''] = np.nan
+    officer_choices = pd.DataFrame(choices, columns=[f'{position + 1} choice' for position in range(n_choices)])
+    officer_choices.insert(0, 'Employee ID', [str(100001 + officer) for officer in range(n_officers)])
+    registration = rng.choice(licenses + [''], size=n_officers).astype(object)
+    registration[registration == ''] = np.nan
+    officer_choices['Registration Type'] = registration
+    # The first listing of a PMS Code applies, D0 is listed twice
+    required = list(rng.choice(pms_codes, size=rng.integers(0, n_departments + 1), replace=False))
+    posting_license_requirement = pd.DataFrame({'PMS Code': required + ['D0'], 'Requirement': list(rng.choice(licenses, size=len(required) + 1))})
+    return officer_choices, posting_license_requirement
+
+def fixtures():
+    yield from (fixture(seed) for seed in range(30))
+    officer_choices, posting_license_requirement = fixture(0)
+    yield officer_choices[:0], posting_license_requirement
+    yield officer_choices, posting_license_requirement[:0]
+    yield officer_choices.drop(columns=[col for col in officer_choices.columns if 'choice' in col]), posting_license_requirement
+    yield officer_choices.assign(**{'Registration Type': np.nan}), posting_license_requirement
+
+@pytest.mark.parametrize('inputs', list(fixtures()))
+def test_check_license_matches_baseline(inputs):
+    officer_choices, posting_license_requirement = inputs
+    expected = baseline.check_license(officer_choices.copy(), posting_license_requirement)
+    pd.testing.assert_frame_equal(Match_Algo.check_license(officer_choices.copy(), posting_license_requirement), expected)
+
+# As before, a registration type or requirement outside the license hierarchy is an error
+def test_unknown_license_raises():
+    officer_choices = pd.DataFrame({'Employee ID': ['101'], '1st choice': ['D1'], 'Registration Type': ['Provisional']})
+    posting_license_requirement = pd.DataFrame({'PMS Code': ['D1'], 'Requirement': ['Full']})
+    with pytest.raises(ValueError):
+        baseline.check_license(officer_choices.copy(), posting_license_requirement)
+    with pytest.raises(ValueError):
+        Match_Algo.check_license(officer_choices.copy(), posting_license_requirement)
@@ -0,0 +1,79 @@
+"""
+README:
+Checks that CodeTable.derive gives the same table as encoding a scenario's choices and HOD rankings from scratch, for
+row subsets of the base frames as Scenario_Runner's overrides leave them and with reranked departments.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Code_Table
+import Ranking_Store
+
+choice_columns = ['1st choice', '2nd choice', '3rd choice']
+table_arrays = ['officer_rows', 'department_rows', 'choice_codes', 'choice_blanks', 'choice_listed',
+                'ranked_departments', 'ranked_positions', 'ranked_officers']
+
+# Officers with up to three choices, some blank or not in the HOD rankings, and departments ranking some officers
+def fixture(seed):
+    rng = np.random.default_rng(seed)
+    pms_codes = [f'D{department}' for department in range(8)]
+    employee_ids = [str(100001 + officer) for officer in range(20)]
+    choices = rng.choice(pms_codes + ['Unknown', np.nan], size=(len(employee_ids), len(choice_columns)))
+    officer_choices = pd.DataFrame(choices, columns=choice_columns, dtype=object).replace('nan', np.nan)
+    officer_choices.insert(0, 'Employee ID', employee_ids)
+    hod_rankings = pd.DataFrame({'PMS Code': pms_codes, 'Vacancies': rng.integers(0, 3, len(pms_codes))})
+    rankings = Ranking_Store.store_from_rankings({
+        pms_code: list(rng.choice(employee_ids + ['Unknown'], size=rng.integers(0, 6), replace=False)) for pms_code in pms_codes
+    })
+    return rng, officer_choices, hod_rankings, rankings
+
+def assert_same_table(derived, fresh):
+    assert derived.officer_ids == fresh.officer_ids
+    assert derived.department_codes == fresh.department_codes
+    assert derived.preference_columns == fresh.preference_columns
+    for name in table_arrays:
+        np.testing.assert_array_equal(getattr(derived, name), getattr(fresh, name), err_msg=name)
+    np.testing.assert_array_equal(pd.isna(derived.choice_values), pd.isna(fresh.choice_values))
+    np.testing.assert_array_equal(derived.choice_values[~pd.isna(fresh.choice_values)], fresh.choice_values[~pd.isna(fresh.choice_values)])
+
+@pytest.mark.parametrize('seed', range(20))
+def test_derive_matches_fresh_table_of_row_subsets(seed):
+    rng, officer_choices, hod_rankings, rankings = fixture(seed)
+    base = Code_Table.CodeTable(officer_choices, hod_rankings, choice_columns, rankings)
+
+    # Drop some officers and the departments without vacancies, and rerank some departments as GDFM prioritisation does
+    scenario_choices = officer_choices[rng.random(len(officer_choices)) < 0.7]
+    scenario_rankings = hod_rankings[hod_rankings['Vacancies'] > 0]
+    reranked = ['D0', 'D1', 'Unknown']
+    scenario_store = rankings.updated({
+        pms_code: list(rng.permutation(scenario_choices['Employee ID'].to_numpy())[:3]) for pms_code in reranked[:2]
+    })
+
+    derived = base.derive(scenario_choices, scenario_rankings, scenario_store, reranked)
+    fresh = Code_Table.CodeTable(scenario_choices, scenario_rankings, choice_columns, scenario_store)
+    assert_same_table(derived, fresh)
+
+def test_derive_of_empty_frames_and_without_rankings():
+    _, officer_choices, hod_rankings, rankings = fixture(0)
+    base = Code_Table.CodeTable(officer_choices, hod_rankings, choice_columns, rankings)
+
+    assert_same_table(base.derive(officer_choices[:0], hod_rankings[:0], rankings, ['D0']),
+                      Code_Table.CodeTable(officer_choices[:0], hod_rankings[:0], choice_columns, rankings))
+    assert_same_table(base.derive(officer_choices, hod_rankings),
+                      Code_Table.CodeTable(officer_choices, hod_rankings, choice_columns))
+
+# Frames that are not an order-preserving subset of the base frames are encoded from scratch
+def test_derive_of_other_frames_builds_fresh_table():
+    _, officer_choices, hod_rankings, rankings = fixture(1)
+    base = Code_Table.CodeTable(officer_choices[:10], hod_rankings, choice_columns, rankings)
+
+    for scenario_choices in (officer_choices, officer_choices[::-1]):
+        assert_same_table(base.derive(scenario_choices, hod_rankings, rankings),
+                          Code_Table.CodeTable(scenario_choices, hod_rankings, choice_columns, rankings))
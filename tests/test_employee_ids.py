@@ -0,0 +1,51 @@
+"""
+README:
+Regression tests of the Employee IDs read from the Match columns of a consolidated HOD rankings file.
+A Match column with blank cells is read as floats, and astype(str) turned its IDs into '100002.0', which never equals
+an officer's Employee ID, so those rankings were ignored. Ranking_Store.employee_id_text writes them as '100002'.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Match_Algo
+import Ranking_Store
+
+@pytest.mark.parametrize('column, expected', [
+    (pd.Series([100001.0, np.nan, 100003.0]), ['100001', '', '100003']),
+    (pd.Series([100001, 100002]), ['100001', '100002']),
+    (pd.Series(['100001', 100002.0, np.nan, 'M1234'], dtype=object), ['100001', '100002', '', 'M1234']),
+    (pd.Series([100001.5, np.nan]), ['100001.5', '']),
+])
+def test_employee_id_text(column, expected):
+    assert Ranking_Store.employee_id_text(column).tolist() == expected
+
+# Department A ranks both officers, its 'Match 2' column has a blank cell in department B's row
+def consolidated_file(path):
+    hod_rankings = pd.DataFrame({'Postings': ['Posting A', 'Posting B'], 'PMS Code': ['A', 'B'], 'Vacancies': [2, 1],
+                                 'Match 1': [100001, 100003], 'Match 2': [100002, np.nan]})
+    hod_rankings.to_excel(path, index=False)
+    return path
+
+def test_match_column_with_blank_cells_keeps_whole_ids(tmp_path):
+    path = consolidated_file(tmp_path / 'HOD Rankings Consolidated.xlsx')
+    assert pd.read_excel(path)['Match 2'].astype(str).tolist() == ['100002.0', 'nan']
+
+    hod_rankings, rankings = Match_Algo.load_hod_rankings(path)
+    assert rankings.ranking('A')[1].tolist() == ['100001', '100002']
+    assert rankings.ranking('B')[1].tolist() == ['100003']
+
+# Both officers are mutual matches with A, the baseline left officer 100002 unmatched in the first round
+def test_officer_ranked_in_match_column_with_blank_cells_is_matched(tmp_path):
+    hod_rankings, rankings = Match_Algo.load_hod_rankings(consolidated_file(tmp_path / 'HOD Rankings Consolidated.xlsx'))
+    officer_choices = pd.DataFrame({'Employee Name': ['X', 'Y'], 'Employee ID': ['100001', '100002'], '1st choice': ['A', 'A'], 'Comment': ''})
+
+    mutualmatch_df, first_unmatched_officers_df, _ = Match_Algo.gale_shapley_1(hod_rankings, rankings, officer_choices)
+    assert dict(zip(mutualmatch_df['Employee ID'], mutualmatch_df['PMS Code'])) == {'100001': 'A', '100002': 'A'}
+    assert first_unmatched_officers_df.empty
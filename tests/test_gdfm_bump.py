@@ -0,0 +1,99 @@
+"""
+README:
+Checks Match_Algo.GDFM_bump on small fixtures, including cycles in which no officer is prioritised, and against the
+original GDFM_bump on the Match columns in baseline.py.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import baseline
+import Match_Algo
+import Ranking_Store
+
+polyclinic = Match_Algo.polyclinic_postings[0]
+
+def fixture(polyclinic_vacancies=2, eligible='Y', with_polyclinic=True):
+    codes = ([polyclinic] if with_polyclinic else []) + ['D1']
+    hod_rankings = pd.DataFrame({'Postings': [f'Posting {code}' for code in codes], 'PMS Code': codes,
+                                 'Vacancies': ([polyclinic_vacancies] if with_polyclinic else []) + [1]})
+    rankings = Ranking_Store.store_from_rankings({code: ['101', '102', '103', '104'] for code in codes})
+    officer_choices = pd.DataFrame({
+        'Employee Name': ['A', 'B', 'C', 'D'],
+        'Employee ID': ['101', '102', '103', '104'],
+        '1st choice': [codes[0], codes[0], 'D1', codes[0]],
+        '2nd choice': ['D1', 'D1', codes[0], np.nan],
+    })
+    GDFM1 = pd.DataFrame({'Employee ID': ['104'], 'Eligible for Prioritisation': [eligible]})
+    GDFM2 = pd.DataFrame({'Employee ID': ['102', '103'], 'Eligible for Prioritisation': [eligible, eligible]})
+    return GDFM1, GDFM2, officer_choices, hod_rankings, rankings
+
+def ranking(rankings, pms_code):
+    return rankings.ranking(pms_code)[1].tolist()
+
+@pytest.mark.parametrize('options', [{'eligible': 'N'}, {'polyclinic_vacancies': 0}, {'with_polyclinic': False}])
+def test_no_bump_leaves_rankings_unchanged(options, capsys):
+    GDFM1, GDFM2, officer_choices, hod_rankings, rankings = fixture(**options)
+    bumped, officer_choices = Match_Algo.GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings, rankings)
+    for pms_code in hod_rankings['PMS Code']:
+        assert ranking(bumped, pms_code) == ranking(rankings, pms_code)
+    assert (officer_choices['Comment'] == '').all()
+
+def test_bump_moves_prioritised_officers_to_the_top():
+    bumped, officer_choices = Match_Algo.GDFM_bump(*fixture())
+    assert ranking(bumped, polyclinic) == ['104', '102', '101', '103']
+    assert officer_choices.set_index('Employee ID')['Comment'].to_dict() == {'101': '', '102': 'GDFM Bump Intake 2', '103': '', '104': 'GDFM Bump Intake 1'}
+
+def test_first_choice_column_only_needed_with_eligible_officers():
+    GDFM1, GDFM2, officer_choices, hod_rankings, rankings = fixture(eligible='N')
+    officer_choices = officer_choices.rename(columns={'1st choice': 'First Pick'})
+    bumped, officer_choices = Match_Algo.GDFM_bump(GDFM1, GDFM2, officer_choices, hod_rankings, rankings)
+    assert ranking(bumped, polyclinic) == ranking(rankings, polyclinic)
+
+# Officers choosing polyclinics first, random GDFM cohorts and random polyclinic rankings
+# Some cohort officers are not eligible, not in the MO rankings or have no Employee ID
+def random_fixture(seed, n_officers=16):
+    rng = np.random.default_rng(seed)
+    codes = Match_Algo.polyclinic_postings + ['D1']
+    employee_ids = [str(100001 + officer) for officer in range(n_officers)]
+    hod_rankings = pd.DataFrame({'Postings': [f'Posting {code}' for code in codes], 'PMS Code': codes, 'Vacancies': rng.integers(0, 4, len(codes))})
+    rankings = Ranking_Store.store_from_rankings({
+        code: list(rng.choice(employee_ids, size=rng.integers(0, n_officers + 1), replace=False)) for code in codes
+    })
+    officer_choices = pd.DataFrame({
+        'Employee Name': [f'Officer {employee_id}' for employee_id in employee_ids],
+        'Employee ID': employee_ids,
+        '1st choice': rng.choice(codes, size=n_officers),
+        '2nd choice': rng.choice(codes, size=n_officers),
+    })
+    cohorts = rng.permutation(employee_ids + ['999999', np.nan])
+    GDFM1, GDFM2 = (pd.DataFrame({'Employee ID': list(cohort), 'Eligible for Prioritisation': rng.choice(['Y', 'Y', 'N'], size=len(cohort))})
+                    for cohort in (cohorts[:6], cohorts[6:12]))
+    return GDFM1, GDFM2, officer_choices, hod_rankings, rankings
+
+def random_fixtures():
+    yield from (random_fixture(seed) for seed in range(30))
+    GDFM1, GDFM2, officer_choices, hod_rankings, rankings = random_fixture(0)
+    yield GDFM1.assign(**{'Eligible for Prioritisation': 'N'}), GDFM2.assign(**{'Eligible for Prioritisation': 'N'}), officer_choices, hod_rankings, rankings
+    yield GDFM1[:0], GDFM2[:0], officer_choices, hod_rankings, rankings
+    yield GDFM1, GDFM2, officer_choices, hod_rankings.assign(Vacancies=0), rankings
+    yield GDFM1, GDFM2, officer_choices, hod_rankings[hod_rankings['PMS Code'] == 'D1'], rankings
+    yield GDFM1, GDFM2, officer_choices, hod_rankings, Ranking_Store.store_from_rankings({})
+
+@pytest.mark.parametrize('inputs', list(random_fixtures()))
+def test_gdfm_bump_matches_baseline(inputs, capsys):
+    GDFM1, GDFM2, officer_choices, hod_rankings, rankings = inputs
+    expected_rankings, expected_choices = baseline.GDFM_bump(GDFM1, GDFM2, officer_choices.copy(), baseline.wide_rankings(hod_rankings, rankings))
+    expected_messages = capsys.readouterr().out
+    bumped, officer_choices = Match_Algo.GDFM_bump(GDFM1, GDFM2, officer_choices.copy(), hod_rankings, rankings)
+
+    for pms_code in hod_rankings['PMS Code']:
+        assert ranking(bumped, pms_code) == baseline.wide_ranking(expected_rankings, pms_code)
+    pd.testing.assert_frame_equal(officer_choices, expected_choices)
+    assert set(capsys.readouterr().out.splitlines()) == set(expected_messages.splitlines())
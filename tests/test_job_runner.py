@@ -0,0 +1,53 @@
+"""
+README:
+Checks that a JobRunner job's printed output goes to the job's events while output of other threads, like the Tk main
+thread, still goes to the original stdout.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Job_Runner
+
+def test_job_output_is_forwarded_without_capturing_other_threads(monkeypatch):
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', stdout)
+    runner = Job_Runner.JobRunner()
+    job_printing, main_printed = threading.Event(), threading.Event()
+
+    # The job prints, waits while the main thread prints, then prints again
+    def job(progress):
+        print('job line 1')
+        job_printing.set()
+        main_printed.wait(5)
+        print('job line 2')
+        return 'result'
+
+    runner.start('Job', job)
+    assert job_printing.wait(5)
+    print('main thread line')
+    main_printed.set()
+    runner.thread.join(5)
+
+    assert runner.poll() == [('output', 'job line 1'), ('output', 'job line 2'), ('done', 'result')]
+    assert stdout.getvalue() == 'main thread line\n'
+
+def test_thread_output_is_installed_once(monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', io.StringIO())
+    output = Job_Runner.install_thread_output()
+    assert Job_Runner.JobRunner().output is output
+    assert Job_Runner.install_thread_output() is output
+
+# Under pythonw there is no stdout, output of threads without a job is dropped
+def test_thread_output_without_stdout(monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', None)
+    runner = Job_Runner.JobRunner()
+    print('dropped')
+    runner.start('Job', lambda progress: print('job line'))
+    runner.thread.join(5)
+    assert runner.poll() == [('output', 'job line'), ('done', None)]
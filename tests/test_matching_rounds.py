@@ -0,0 +1,82 @@
+"""
+README:
+Checks the integer-indexed matching rounds of Match_Algo against the original dictionary-based rounds in baseline.py
+on small random fixtures, including fixtures without officers, without rankings and with blank or unknown choices.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import baseline
+import Match_Algo
+import Ranking_Store
+
+# Officers with random choices, some blank or not in the HOD rankings, and departments ranking random officers
+def fixture(seed, n_officers=12, n_departments=5, n_choices=4):
+    rng = np.random.default_rng(seed)
+    pms_codes = [f'D{department}' for department in range(n_departments)]
+    employee_ids = [str(100001 + officer) for officer in range(n_officers)]
+    choices = rng.choice(pms_codes + ['Unknown', ''], size=(n_officers, n_choices)).astype(object)
+    choices[choices == ''] = np.nan
+    officer_choices = pd.DataFrame(choices, columns=[f'Choice {position + 1}' for position in range(n_choices)])
+    officer_choices.insert(0, 'Employee ID', employee_ids)
+    officer_choices.insert(0, 'Employee Name', [f'Officer {employee_id}' for employee_id in employee_ids])
+    officer_choices['Comment'] = ''
+    hod_rankings = pd.DataFrame({'Postings': [f'Posting {pms_code}' for pms_code in pms_codes], 'PMS Code': pms_codes,
+                                 'Vacancies': rng.integers(1, 3, n_departments)})
+    rankings = Ranking_Store.store_from_rankings({
+        pms_code: list(rng.choice(employee_ids, size=rng.integers(0, n_officers + 1), replace=False)) for pms_code in pms_codes
+    })
+    return officer_choices, hod_rankings, rankings
+
+def fixtures():
+    yield from (fixture(seed) for seed in range(30))
+    yield fixture(0, n_officers=0)
+    yield fixture(1, n_departments=0)
+    officer_choices, hod_rankings, rankings = fixture(2)
+    yield officer_choices, hod_rankings, Ranking_Store.store_from_rankings({})
+
+# Matches in PMS Code and Employee ID order, the rounds list them in a different order
+def sorted_matches(matches):
+    return matches.sort_values(['PMS Code', 'Employee ID']).reset_index(drop=True)
+
+@pytest.mark.parametrize('inputs', list(fixtures()))
+def test_gale_shapley_1_matches_baseline(inputs):
+    officer_choices, hod_rankings, rankings = inputs
+    expected = baseline.gale_shapley_1(baseline.wide_rankings(hod_rankings, rankings), officer_choices.copy(), hod_rankings[:0])
+    mutualmatch_df, first_unmatched_officers_df, first_departments_with_vacancies_df = Match_Algo.gale_shapley_1(hod_rankings, rankings, officer_choices.copy())
+
+    pd.testing.assert_frame_equal(sorted_matches(mutualmatch_df), sorted_matches(expected[0]))
+    pd.testing.assert_frame_equal(first_unmatched_officers_df, expected[1])
+    pd.testing.assert_frame_equal(first_departments_with_vacancies_df, expected[2], check_dtype=False, check_index_type=False)
+
+# Round 2 runs on the officers and vacancies the original round 1 left
+@pytest.mark.parametrize('inputs', list(fixtures()))
+def test_gale_shapley_2_matches_baseline(inputs):
+    officer_choices, hod_rankings, rankings = inputs
+    _, first_unmatched_officers_df, first_departments_with_vacancies_df, _ = baseline.gale_shapley_1(baseline.wide_rankings(hod_rankings, rankings), officer_choices.copy(), hod_rankings[:0])
+    expected = baseline.gale_shapley_2(first_unmatched_officers_df.copy(), first_departments_with_vacancies_df.copy(), hod_rankings)
+    second_match_df, second_unmatched_officers_df, second_departments_with_vacancies_df = Match_Algo.gale_shapley_2(
+        first_unmatched_officers_df.copy(), first_departments_with_vacancies_df.copy(), hod_rankings)
+
+    pd.testing.assert_frame_equal(sorted_matches(second_match_df), sorted_matches(expected[0]))
+    pd.testing.assert_frame_equal(second_unmatched_officers_df, expected[1])
+    pd.testing.assert_frame_equal(second_departments_with_vacancies_df, expected[2], check_dtype=False, check_index_type=False)
+
+# Every unmatched officer ranks the same department first, so the department takes the lowest Employee IDs
+def test_gale_shapley_2_breaks_ties_by_employee_id():
+    first_unmatched_officers_df = pd.DataFrame({'Employee Name': ['C', 'A', 'B'], 'Employee ID': ['103', '101', '102'],
+                                                'Choice 1': ['D1', 'D1', 'D1'], 'Comment': ''})
+    first_departments_with_vacancies_df = pd.DataFrame({'Department': ['D1'], 'Remaining Vacancies': [2]})
+    hod_rankings = pd.DataFrame({'Postings': ['Posting D1'], 'PMS Code': ['D1'], 'Vacancies': [2]})
+    expected = baseline.gale_shapley_2(first_unmatched_officers_df.copy(), first_departments_with_vacancies_df, hod_rankings)
+    second_match_df, second_unmatched_officers_df, _ = Match_Algo.gale_shapley_2(first_unmatched_officers_df.copy(), first_departments_with_vacancies_df, hod_rankings)
+
+    assert sorted(second_match_df['Employee ID']) == sorted(expected[0]['Employee ID']) == ['101', '102']
+    assert second_unmatched_officers_df['Employee ID'].tolist() == expected[1]['Employee ID'].tolist() == ['103']
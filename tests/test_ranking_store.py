@@ -0,0 +1,59 @@
+"""
+README:
+Checks that RankingStore.updated writes department rankings the way they were written over the Match columns of the
+consolidated rankings before the store, including updates without any department rankings.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Ranking_Store
+
+# Consolidated rankings with the given Match rows, blank cells as NaN
+def consolidated_rankings(rows):
+    n_positions = max([len(ranking) for ranking in rows.values()] + [1])
+    hod_rankings = pd.DataFrame({'PMS Code': list(rows), 'Vacancies': 1})
+    for position in range(n_positions):
+        hod_rankings[f'Match {position + 1}'] = [ranking[position] if position < len(ranking) else np.nan for ranking in rows.values()]
+    return hod_rankings
+
+# The department rankings written over the Match cells row by row, as HOD_Rank_Compiler did before the store
+def write_over_match_columns(hod_rankings, department_rankings):
+    hod_rankings = hod_rankings.astype({col: object for col in hod_rankings.columns if 'Match' in col})
+    for index, row in hod_rankings.iterrows():
+        if row['PMS Code'] in department_rankings:
+            matches = {f'Match {i+1}': employee_id for i, employee_id in enumerate(department_rankings[row['PMS Code']])}
+            hod_rankings.loc[index, list(matches)] = list(matches.values())
+    return hod_rankings
+
+def sorted_entries(rankings):
+    return rankings.entries().sort_values(['PMS Code', 'Position']).reset_index(drop=True)
+
+rows = {'A': ['1', '2', '3'], 'B': ['4'], 'C': []}
+cases = [
+    {},
+    {'A': ['9']},
+    {'A': ['9', '8', '7', '6'], 'B': []},
+    {'C': ['5', '6'], 'D': ['7']},
+]
+
+@pytest.mark.parametrize('department_rankings', cases)
+def test_updated_matches_writing_over_match_columns(department_rankings):
+    hod_rankings = consolidated_rankings(rows)
+    store = Ranking_Store.store_from_wide(hod_rankings)
+    expected = Ranking_Store.store_from_wide(write_over_match_columns(hod_rankings, {code: ranking for code, ranking in department_rankings.items() if code in rows}))
+    updated = store.updated({code: ranking for code, ranking in department_rankings.items() if code in rows})
+    pd.testing.assert_frame_equal(sorted_entries(updated), sorted_entries(expected))
+
+def test_updated_without_rankings_keeps_the_store():
+    store = Ranking_Store.store_from_wide(consolidated_rankings(rows))
+    pd.testing.assert_frame_equal(sorted_entries(store.updated({})), sorted_entries(store))
+    empty = Ranking_Store.store_from_rankings({})
+    assert len(empty.updated({})) == 0
+    assert sorted_entries(empty.updated({'A': ['1']}))['Employee ID'].tolist() == ['1']
@@ -0,0 +1,86 @@
+"""
+README:
+Randomized check that Match_Engine.rematch_rounds gives the matches of a full match_rounds run on the changed inputs,
+over chains of withdrawals (of matched and unmatched officers), vacancy changes and blacklisted pairs.
+Run from the repository folder with: python -m pytest tests
+"""
+
+# import necessary libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Match_Algo
+import Match_Engine
+
+# Random HOD rankings and officer choices, with short rankings and few seats so officers compete for departments
+def random_inputs(rng, n_officers, n_departments, n_choices=6):
+    officer_ids = [f"E{i:03d}" for i in range(n_officers)]
+    department_codes = [f"D{j}" for j in range(n_departments)]
+    rankings = [rng.choice(officer_ids, size=int(rng.integers(0, n_officers + 1)), replace=False).tolist() for _ in department_codes]
+    hod_rankings = pd.DataFrame({'Postings': [f"Posting {code}" for code in department_codes], 'PMS Code': department_codes,
+                                 'Vacancies': rng.integers(0, 4, n_departments)})
+    for position in range(max(len(ranking) for ranking in rankings)):
+        hod_rankings[f'Match {position + 1}'] = [ranking[position] if position < len(ranking) else '' for ranking in rankings]
+
+    officer_choices = pd.DataFrame({'Employee ID': officer_ids})
+    for choice in range(n_choices):
+        officer_choices[f'{choice + 1} choice'] = [department_codes[department] if rng.random() < 0.85 else np.nan
+                                                   for department in rng.integers(0, n_departments, n_officers)]
+    return hod_rankings, officer_choices
+
+def preference_columns(officer_choices):
+    return [col for col in officer_choices.columns if 'choice' in col.lower()]
+
+def full_run(hod_rankings, officer_choices):
+    departments, rankings = Match_Algo.prepare_hod_rankings(hod_rankings.copy())
+    return Match_Engine.match_rounds(departments, rankings, officer_choices.copy(), preference_columns(officer_choices))
+
+def outcome(rounds):
+    return rounds.final_matches(), rounds.unmatched_officers()
+
+# Apply a change to the inputs the way a user would before a full run
+def change_inputs(hod_rankings, officer_choices, removed_officers, vacancy_changes, blacklisted_pairs):
+    hod_rankings = hod_rankings.copy()
+    for department, vacancies in vacancy_changes.items():
+        hod_rankings.loc[hod_rankings['PMS Code'] == department, 'Vacancies'] = vacancies
+    officer_choices = officer_choices[~officer_choices['Employee ID'].isin(removed_officers)].copy()
+    for officer, department in blacklisted_pairs:
+        for col in preference_columns(officer_choices):
+            officer_choices.loc[(officer_choices['Employee ID'] == officer) & (officer_choices[col] == department), col] = 'Blacklisted'
+    return hod_rankings, officer_choices
+
+# Random change, withdrawing at least one unmatched officer whenever there is one
+def random_change(rng, rounds, hod_rankings, officer_choices):
+    officer_ids = officer_choices['Employee ID'].tolist()
+    unmatched = rounds.unmatched_officers()
+    removed = set(rng.choice(officer_ids, size=min(len(officer_ids), int(rng.integers(0, 3))), replace=False).tolist())
+    if unmatched:
+        removed.add(unmatched[int(rng.integers(0, len(unmatched)))])
+
+    department_codes = hod_rankings['PMS Code'].tolist()
+    vacancy_changes = {department: int(rng.integers(0, 5)) for department in rng.choice(department_codes, size=int(rng.integers(0, 3)), replace=False).tolist()}
+
+    blacklisted_pairs = []
+    for officer in rng.choice(officer_ids, size=min(len(officer_ids), int(rng.integers(0, 4))), replace=False).tolist():
+        choices = officer_choices.loc[officer_choices['Employee ID'] == officer, preference_columns(officer_choices)].iloc[0]
+        choices = [choice for choice in choices if choice in department_codes]
+        if choices and officer not in removed:
+            blacklisted_pairs.append((officer, choices[int(rng.integers(0, len(choices)))]))
+    return sorted(removed), vacancy_changes, blacklisted_pairs
+
+@pytest.mark.parametrize('seed', range(300))
+def test_rematch_matches_full_run(seed):
+    rng = np.random.default_rng(seed)
+    hod_rankings, officer_choices = random_inputs(rng, int(rng.integers(10, 70)), int(rng.integers(2, 10)))
+    rounds = full_run(hod_rankings, officer_choices)
+
+    # Chain a few changes, each rematched from the previous rematch
+    for step in range(3):
+        removed, vacancy_changes, blacklisted_pairs = random_change(rng, rounds, hod_rankings, officer_choices)
+        hod_rankings, officer_choices = change_inputs(hod_rankings, officer_choices, removed, vacancy_changes, blacklisted_pairs)
+        rounds = Match_Engine.rematch_rounds(rounds, removed, vacancy_changes, blacklisted_pairs)
+        assert outcome(rounds) == outcome(full_run(hod_rankings, officer_choices)), (step, removed, vacancy_changes, blacklisted_pairs)